@@ -0,0 +1,265 @@
+'''Benchmarks of dockerman operations against a local fake Docker daemon.
+
+Usage::
+
+    python benchmarks/bench.py [-n 1,100,1000] [-l 0.001] [-L create=0.02]
+                               [-o results.json] [-c baseline.json]
+                               [-p 10] [-t trace.json]
+
+Each operation is timed per container (or once per batch, for bulk
+operations).  Results, including latency percentiles and throughput, are
+written as JSON; pass a previous results file with -c to compare.
+'''
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import socket
+import platform
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dockerman import Container, ClientPool, refresh_status, wait_ready, \
+    run_all, remove_all
+from dockerman.container import CC, RA
+from dockerman.testing import FakeDaemon, API_VERSION
+from dockerman.tracing import Tracer
+import docker
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+IMAGE = 'mbodenhamer/alpine-data'
+
+#-------------------------------------------------------------------------------
+# Statistics
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+def summarize(op, n, samples, count=None):
+    '''Summarize samples (seconds) of op over n containers.  count is the
+    number of container operations the samples cover (default: one per
+    sample).
+    '''
+    total = sum(samples)
+    count = len(samples) if count is None else count
+    return dict(op=op, n=n, samples=len(samples), total=total,
+                throughput=count / total if total else None,
+                mean=total / len(samples),
+                min=min(samples),
+                p50=percentile(samples, 50),
+                p90=percentile(samples, 90),
+                p99=percentile(samples, 99),
+                max=max(samples))
+
+def timed(func, *args, **kwargs):
+    start = time.time()
+    func(*args, **kwargs)
+    return time.time() - start
+
+#-------------------------------------------------------------------------------
+# Benchmarks
+
+def listen():
+    '''Return a local port that accepts (and immediately closes) connections.
+    '''
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(128)
+
+    def serve():
+        while True:
+            conn, _ = listener.accept()
+            conn.close()
+
+    thread = threading.Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+    return listener.getsockname()[1]
+
+def serve(path, latency, ready, done):
+    with FakeDaemon(path=path, latency=latency):
+        ready.set()
+        done.wait()
+
+def bench(n, client, port):
+    results = []
+
+    def each(op, containers, func):
+        results.append(summarize(op, n, [timed(func, c) for c in containers]))
+
+    def once(op, func, *args, **kwargs):
+        results.append(summarize(op, n, [timed(func, *args, **kwargs)],
+                                 count=n))
+
+    samples = []
+    for _ in range(n):
+        start = time.time()
+        Container(IMAGE, 'sleep 1000', detach=True)
+        samples.append(time.time() - start)
+    results.append(summarize('construct', n, samples))
+
+    cs = [Container(IMAGE, 'sleep 1000', detach=True, ports=[port],
+                    environment=dict(A='1', B='2'), labels=dict(x='y'))
+          for _ in range(n)]
+    each('marshal', cs, lambda c: (c.marshal_args(CC), c.marshal_args(RA)))
+    each('marshal_cached', cs, lambda c: c.marshal_args(CC))
+
+    each('run', cs, lambda c: c.run(client=client))
+    each('status', cs, lambda c: c.refresh(client=client))
+    once('refresh_status', refresh_status, cs, client=client)
+    each('poll', cs, lambda c: c.poll(port, client=client, timeout=5))
+    once('wait_ready', wait_ready, [(c, port) for c in cs], timeout=5,
+         client=client)
+    each('pause', cs, lambda c: c.pause(client=client))
+    each('unpause', cs, lambda c: c.unpause(client=client))
+    each('stop', cs, lambda c: c.stop(client=client))
+    each('remove', cs, lambda c: c.remove(client=client))
+
+    cs = [Container(IMAGE, 'sleep 1000', detach=True) for _ in range(n)]
+    once('run_all', lambda: run_all(cs, client=client).raise_for_errors())
+    once('remove_all', lambda: remove_all(cs, client=client)
+         .raise_for_errors())
+    return results
+
+#-------------------------------------------------------------------------------
+# Reporting
+
+def metadata(args, latency):
+    try:
+        with open(os.path.join(ROOT, 'version.txt')) as f:
+            version = f.read().strip()
+    except IOError:
+        version = None
+
+    try:
+        with open(os.devnull, 'w') as devnull:
+            revision = subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                stderr=devnull).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+
+    return dict(version=version, revision=revision,
+                python=platform.python_version(),
+                platform=platform.platform(),
+                timestamp=datetime.utcnow().isoformat() + 'Z',
+                sizes=args.sizes, latency=latency,
+                in_process=args.in_process, pool_size=args.pool_size)
+
+def report(results, baseline=None):
+    base = {}
+    if baseline is not None:
+        base = {(r['op'], r['n']): r for r in baseline['results']}
+
+    header = '{:<16}{:>6}{:>12}{:>12}{:>12}{:>14}'.format(
+        'op', 'n', 'p50 (ms)', 'p90 (ms)', 'p99 (ms)', 'ops/s')
+    if base:
+        header += '{:>12}'.format('p50 ratio')
+    print(header)
+
+    for r in results:
+        line = '{:<16}{:>6}{:>12.3f}{:>12.3f}{:>12.3f}{:>14.1f}'.format(
+            r['op'], r['n'], r['p50'] * 1e3, r['p90'] * 1e3, r['p99'] * 1e3,
+            r['throughput'] or 0)
+        old = base.get((r['op'], r['n']))
+        if old is not None and old['p50']:
+            line += '{:>12.2f}'.format(r['p50'] / old['p50'])
+        print(line)
+
+#-------------------------------------------------------------------------------
+# Main
+
+def make_client(base_url, pool_size):
+    if pool_size:
+        return ClientPool(size=pool_size, base_url=base_url,
+                          version=API_VERSION)
+    return docker.APIClient(base_url=base_url, version=API_VERSION)
+
+def parse_latency(spec):
+    op, _, seconds = spec.partition('=')
+    return op, float(seconds)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark dockerman '
+                                     'against a fake Docker daemon')
+    parser.add_argument('-n', '--sizes', default='1,100,1000',
+                        type=lambda s: [int(x) for x in s.split(',')],
+                        help='Comma-separated numbers of containers')
+    parser.add_argument('-l', '--latency', type=float, default=0,
+                        help='Latency (seconds) added to every request')
+    parser.add_argument('-L', '--endpoint-latency', type=parse_latency,
+                        action='append', default=[], metavar='ENDPOINT=SECS',
+                        help='Latency added to a single endpoint')
+    parser.add_argument('-i', '--in-process', action='store_true',
+                        help='Run the fake daemon in the benchmark process '
+                        '(default: in a child process)')
+    parser.add_argument('-p', '--pool-size', type=int, default=0,
+                        help='Use a ClientPool of this size (default: a '
+                        'single APIClient)')
+    parser.add_argument('-o', '--output', default='bench.json',
+                        help='File to write results to')
+    parser.add_argument('-c', '--compare', metavar='FILE',
+                        help='Previous results to compare against')
+    parser.add_argument('-t', '--trace', metavar='FILE',
+                        help='Write a Chrome trace of the run to FILE')
+    args = parser.parse_args(argv)
+
+    latency = {'*': args.latency}
+    latency.update(dict(args.endpoint_latency))
+
+    port = listen()
+    results = []
+    tracer = Tracer().start() if args.trace else None
+    if args.in_process:
+        with FakeDaemon(latency=latency) as daemon:
+            client = make_client(daemon.base_url, args.pool_size)
+            for n in args.sizes:
+                results.extend(bench(n, client, port))
+    else:
+        tmpdir = tempfile.mkdtemp(prefix='dockerman-bench-')
+        path = os.path.join(tmpdir, 'docker.sock')
+        ready, done = multiprocessing.Event(), multiprocessing.Event()
+        proc = multiprocessing.Process(target=serve,
+                                       args=(path, latency, ready, done))
+        proc.start()
+        try:
+            ready.wait()
+            client = make_client('unix://' + path, args.pool_size)
+            for n in args.sizes:
+                results.extend(bench(n, client, port))
+        finally:
+            done.set()
+            proc.join()
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    if tracer is not None:
+        tracer.stop()
+        tracer.dump(args.trace)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    report(results, baseline)
+    with open(args.output, 'w') as f:
+        json.dump(dict(metadata(args, latency), results=results), f,
+                  indent=2, sort_keys=True)
+
+if __name__ == '__main__': # pragma: no cover
+    main()
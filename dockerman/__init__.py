@@ -1 +1,11 @@
+from .base import *
 from .container import *
+from .fleet import *
+from .group import *
+from .image import *
+from .pool import *
+from .reconcile import *
+from .readiness import *
+from .scheduler import *
+from .stack import *
+from .tracker import *
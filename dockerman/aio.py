@@ -0,0 +1,150 @@
+'''Asyncio interface to containers (Python 3 only).
+
+Daemon calls are run in an executor so that they do not block the event
+loop; port probing uses non-blocking connects.
+'''
+import time
+import asyncio
+from functools import partial
+
+from .container import Container
+from .readiness import Probe
+from .utils import UNREACHABLE
+
+#-------------------------------------------------------------------------------
+# Network utilities
+
+async def scan_port(addr, port, timeout=1):
+    '''Return True if port accepts connections, or False if connecting times
+    out or fails with one of the errors in utils.UNREACHABLE.  Other errors
+    (local faults) are raised.
+    '''
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(addr, port),
+                                           timeout)
+    except asyncio.TimeoutError:
+        return False
+    except OSError as e:
+        if e.errno in UNREACHABLE:
+            return False
+        raise
+    writer.close()
+    return True
+
+#-------------------------------------------------------------------------------
+# AsyncContainer
+
+
+class AsyncContainer(object):
+    '''Awaitable counterpart of Container.
+
+    Accepts the same arguments as Container, plus optional ``loop`` and
+    ``executor`` keyword arguments.  Container attributes (name, image, etc.)
+    are available directly on the AsyncContainer.
+    '''
+    def __init__(self, *args, **kwargs):
+        self.loop = kwargs.pop('loop', None)
+        self.executor = kwargs.pop('executor', None)
+        self.container = Container(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        if attr == 'container':
+            raise AttributeError(attr)
+        return getattr(self.container, attr)
+
+    async def _call(self, func, **kwargs):
+        loop = self.loop or asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor,
+                                          partial(func, **kwargs))
+
+    async def status(self):
+        c = self.container
+        if c._status.expired(c.status_ttl):
+            await self.refresh()
+        return c._status
+
+    async def is_port_live(self, port, timeout=1):
+        status = await self.status()
+        if status.paused or not status.running:
+            return False
+        return await scan_port(status.ip_addr, port, timeout)
+
+    async def pause(self, **kwargs):
+        return await self._call(self.container.pause, **kwargs)
+
+    async def poll(self, probe, **kwargs):
+        '''Wait until the container is ready according to probe, a port
+        number or a readiness.Probe.  Ports are probed on the event loop;
+        Probes are synchronous, so they are waited on in the executor (see
+        Container.poll()).
+        '''
+        if isinstance(probe, Probe):
+            return await self._call(self.container.poll, probe=probe,
+                                    **kwargs)
+
+        port = probe
+        wait = kwargs.get('wait', 0.1)
+        timeout = kwargs.get('timeout', float('inf')) # No timeout by default
+
+        status = await self.status()
+        if not status.running:
+            raise RuntimeError('Container must be running to poll')
+        if status.paused:
+            raise RuntimeError('Cannot poll paused container')
+
+        start_time = time.time()
+        while True:
+            remaining = timeout - (time.time() - start_time)
+            if await self.is_port_live(port, min(1, max(remaining, 0))):
+                break
+            if (time.time() - start_time) >= timeout:
+                raise RuntimeError('Timeout on poll()')
+            await asyncio.sleep(wait)
+
+    async def refresh(self, **kwargs):
+        return await self._call(self.container.refresh, **kwargs)
+
+    async def remove(self, **kwargs):
+        return await self._call(self.container.remove, **kwargs)
+
+    async def run(self, **kwargs):
+        return await self._call(self.container.run, **kwargs)
+
+    async def start(self, **kwargs):
+        return await self._call(self.container.start, **kwargs)
+
+    async def stop(self, **kwargs):
+        return await self._call(self.container.stop, **kwargs)
+
+    async def unpause(self, **kwargs):
+        return await self._call(self.container.unpause, **kwargs)
+
+#-------------------------------------------------------------------------------
+# Container context manager
+
+
+class container(object):
+    '''Asynchronous context manager analogous to dockerman.container().
+
+    Usage::
+
+        async with container('ubuntu', 'sleep 10') as c:
+            await c.poll(80)
+    '''
+    def __init__(self, image, command='', **kwargs):
+        kwargs['detach'] = kwargs.get('detach', True)
+        self.obj = AsyncContainer(image, command, **kwargs)
+
+    async def __aenter__(self):
+        await self.obj.run()
+        return self.obj
+
+    async def __aexit__(self, *args):
+        await self.obj.remove()
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('AsyncContainer', 'container', 'scan_port')
+
+#-------------------------------------------------------------------------------
@@ -0,0 +1,188 @@
+'''Streaming file copy into and out of containers.
+
+Files are sent to the daemon as a tar archive generated on the fly: each
+file is read in chunks as the request body is sent, so memory use does not
+depend on the size of the files.  Archives received from the daemon are
+extracted as they are read.
+'''
+import os
+import stat
+import tarfile
+from six import string_types
+
+from .base import checkout
+from .metrics import measure
+
+CHUNK_SIZE = 65536
+BLOCK_SIZE = tarfile.BLOCKSIZE
+
+#-------------------------------------------------------------------------------
+# Errors
+
+
+class ArchiveError(RuntimeError):
+    pass
+
+#-------------------------------------------------------------------------------
+# Archive creation
+
+def walk(path, arcname=None):
+    '''Generate (path, arcname) pairs for path and, if it is a directory,
+    everything below it, in sorted order.  Symbolic links are not followed.
+    '''
+    if arcname is None:
+        arcname = os.path.basename(os.path.normpath(path))
+    yield path, arcname
+    if os.path.isdir(path) and not os.path.islink(path):
+        for name in sorted(os.listdir(path)):
+            for item in walk(os.path.join(path, name),
+                             arcname + '/' + name if arcname else name):
+                yield item
+
+def tarinfo(path, arcname):
+    '''Return a TarInfo for path, or None if it is not a regular file,
+    directory or symbolic link.  Ownership is not recorded.
+    '''
+    st = os.lstat(path)
+    info = tarfile.TarInfo(arcname)
+    info.mode = stat.S_IMODE(st.st_mode)
+    info.mtime = int(st.st_mtime)
+    if stat.S_ISREG(st.st_mode):
+        info.type = tarfile.REGTYPE
+        info.size = st.st_size
+    elif stat.S_ISDIR(st.st_mode):
+        info.type = tarfile.DIRTYPE
+    elif stat.S_ISLNK(st.st_mode):
+        info.type = tarfile.SYMTYPE
+        info.linkname = os.readlink(path)
+    else:
+        return None
+    return info
+
+def _pieces(entries, chunk_size):
+    for path, arcname in entries:
+        info = tarinfo(path, arcname)
+        if info is None:
+            continue
+        yield info.tobuf(tarfile.PAX_FORMAT)
+        if not info.isreg():
+            continue
+
+        remaining = info.size
+        with open(path, 'rb') as f:
+            while remaining:
+                data = f.read(min(chunk_size, remaining))
+                if not data:
+                    raise ArchiveError('File shrank while being archived: '
+                                       '{}'.format(path))
+                remaining -= len(data)
+                yield data
+        pad = -info.size % BLOCK_SIZE
+        if pad:
+            yield b'\0' * pad
+    yield b'\0' * (2 * BLOCK_SIZE)
+
+def tar_stream(entries, chunk_size=CHUNK_SIZE):
+    '''Generate an uncompressed tar archive of entries, an iterable of
+    (path, arcname) pairs (see walk()), in chunks of about chunk_size
+    bytes.
+    '''
+    buf = bytearray()
+    for piece in _pieces(entries, chunk_size):
+        buf += piece
+        if len(buf) >= chunk_size:
+            yield bytes(buf)
+            del buf[:]
+    if buf:
+        yield bytes(buf)
+
+#-------------------------------------------------------------------------------
+# Extraction
+
+def _within(path, root):
+    return path == root or path.startswith(root + os.sep)
+
+def _check_member(member, root):
+    # Paths are resolved, rather than only normalized, so that links
+    # extracted earlier from the same archive cannot lead outside root
+    parent = os.path.realpath(os.path.join(root,
+                                           os.path.dirname(member.name)))
+    name = os.path.join(parent, os.path.basename(member.name))
+    if os.path.isabs(member.name) or not _within(parent, root) or \
+       not _within(os.path.normpath(name), root) or \
+       (not member.issym() and
+        not _within(os.path.realpath(name), root)):
+        raise ArchiveError('Refusing to extract {}'.format(member.name))
+    if member.issym() or member.islnk():
+        base = root if member.islnk() else parent
+        target = os.path.realpath(os.path.join(base, member.linkname))
+        if os.path.isabs(member.linkname) or not _within(target, root):
+            raise ArchiveError('Refusing to extract link {} -> {}'.format(
+                member.name, member.linkname))
+    elif not (member.isreg() or member.isdir()):
+        return False
+    return True
+
+def extract(fileobj, dest):
+    '''Extract the tar archive read from fileobj into directory dest as it
+    is read.  Members with absolute paths, paths leading outside dest
+    (including through links extracted earlier) or links pointing outside
+    dest raise ArchiveError; device files and FIFOs are skipped.
+    '''
+    dest = os.path.abspath(dest)
+    if not os.path.isdir(dest):
+        os.makedirs(dest)
+    root = os.path.realpath(dest)
+
+    tar = tarfile.open(fileobj=fileobj, mode='r|')
+    try:
+        for member in tar:
+            if _check_member(member, root):
+                tar.extract(member, root)
+    finally:
+        tar.close()
+
+#-------------------------------------------------------------------------------
+# Container file copy
+
+def put_files(container, src, dest, **kwargs):
+    '''Copy src (a path, or a list of paths) into directory dest of the
+    container, which must exist.  Directories are copied recursively; each
+    path is placed in dest under its base name.
+    '''
+    client = container._client(kwargs)
+    paths = [src] if isinstance(src, string_types) else list(src)
+    entries = (item for path in paths for item in walk(path))
+    data = tar_stream(entries, kwargs.get('chunk_size', CHUNK_SIZE))
+    return measure('put_archive', client.put_archive, container.name, dest,
+                   data)
+
+def get_files(container, src, dest, **kwargs):
+    '''Copy path src of the container into local directory dest (created if
+    necessary), returning the daemon's stat of src.  A directory is copied
+    recursively, as dest/<base name of src>.
+    '''
+    from docker.utils import decode_json_header
+
+    # The archive endpoint is called directly, as get_archive() returns a
+    # file-like object or a chunk generator depending on the docker version
+    with checkout(container._client(kwargs)) as client:
+        url = client._url('/containers/{0}/archive', container.name)
+        res = measure('get_archive', client._get, url,
+                      params=dict(path=src), stream=True,
+                      headers={'Accept-Encoding': 'identity'})
+        try:
+            client._raise_for_status(res)
+            header = res.headers.get('X-Docker-Container-Path-Stat')
+            extract(res.raw, dest)
+        finally:
+            res.close()
+    return decode_json_header(header) if header else None
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('ArchiveError', 'walk', 'tar_stream', 'extract', 'put_files',
+           'get_files')
+
+#-------------------------------------------------------------------------------
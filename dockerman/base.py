@@ -1,3 +1,269 @@
-import docker
+'''The default Docker client.
 
-CLIENT = docker.APIClient(base_url='unix://var/run/docker.sock')
+The client is created on first use rather than at import.  It is
+configured by configure(), falling back on the environment:
+
+* DOCKER_HOST: URL of the daemon (default: unix://var/run/docker.sock)
+* DOCKER_TLS_VERIFY, DOCKER_CERT_PATH: TLS settings, as for the docker CLI
+* DOCKER_API_VERSION: API version to use (default: the docker-py default).
+  The version is pinned so that no negotiation round-trip is made; 'auto'
+  negotiates it with the daemon.
+* DOCKER_CLIENT_TIMEOUT: timeout for API calls, in seconds
+
+The default client is a ClientPool, so that concurrent callers do not
+share one HTTP session.  Functions taking a ``client`` argument use the
+default client when it is None or omitted.
+'''
+import os
+import time
+import threading
+from functools import partial
+from contextlib import contextmanager
+from six.moves import queue
+
+DEFAULT_BASE_URL = 'unix://var/run/docker.sock'
+DEFAULT_POOL_SIZE = 10
+POOL_OPTIONS = ('pool_size', 'check_interval')
+SETTINGS = {}
+
+_CLIENT = None
+_LOCK = threading.Lock()
+
+#-------------------------------------------------------------------------------
+# Client construction
+
+def client_settings(environ=None):
+    '''Return the keyword arguments for the default APIClient.'''
+    from docker.utils import kwargs_from_env
+    from docker.constants import DEFAULT_DOCKER_API_VERSION, \
+        DEFAULT_TIMEOUT_SECONDS
+
+    environ = os.environ if environ is None else environ
+    ret = dict(base_url=DEFAULT_BASE_URL,
+               version=DEFAULT_DOCKER_API_VERSION,
+               timeout=DEFAULT_TIMEOUT_SECONDS)
+    ret.update(kwargs_from_env(environment=environ))
+    if environ.get('DOCKER_API_VERSION'):
+        ret['version'] = environ['DOCKER_API_VERSION']
+    if environ.get('DOCKER_CLIENT_TIMEOUT'):
+        ret['timeout'] = int(environ['DOCKER_CLIENT_TIMEOUT'])
+    ret.update((k, v) for k, v in SETTINGS.items() if k not in POOL_OPTIONS)
+    return ret
+
+def make_client(**kwargs):
+    '''Return a new APIClient, using the default settings for any keyword
+    arguments not given.
+    '''
+    import docker
+
+    settings = client_settings()
+    settings.update(kwargs)
+    return docker.APIClient(**settings)
+
+def _discard():
+    global _CLIENT
+    if _CLIENT is not None:
+        _CLIENT.close()
+        _CLIENT = None
+
+def configure(**kwargs):
+    '''Set APIClient keyword arguments (base_url, version, timeout, tls,
+    ...) for the default client, which is recreated on next use.  The
+    pool_size and check_interval keywords configure its ClientPool.
+    '''
+    with _LOCK:
+        SETTINGS.update(kwargs)
+        _discard()
+
+def reset():
+    '''Discard the configured settings and the default client.'''
+    with _LOCK:
+        SETTINGS.clear()
+        _discard()
+
+def get_client(client=None):
+    '''Return client, or the default client if client is None.'''
+    global _CLIENT
+    if client is not None:
+        return client
+    if _CLIENT is None:
+        with _LOCK:
+            if _CLIENT is None:
+                _CLIENT = ClientPool(
+                    size=SETTINGS.get('pool_size', DEFAULT_POOL_SIZE),
+                    check_interval=SETTINGS.get('check_interval', 30))
+    return _CLIENT
+
+@contextmanager
+def checkout(client=None, timeout=None):
+    '''Context manager holding a single APIClient for a sequence of calls.
+    If client (or the default client) is a ClientPool, a client is checked
+    out of it for the duration.
+    '''
+    client = get_client(client)
+    if isinstance(client, ClientPool):
+        with client.checkout(timeout) as c:
+            yield c
+    else:
+        yield client
+
+#-------------------------------------------------------------------------------
+# ClientPool
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+class ClientPool(object):
+    '''A thread-safe pool of at most ``size`` APIClients for one daemon.
+
+    A ClientPool can be used wherever a client is expected: each method call
+    checks out an idle client (creating one if the cap allows, otherwise
+    waiting for one), makes the call and checks the client back in.  Idle
+    clients keep their connections alive.  A client that has been idle for
+    more than ``check_interval`` seconds is pinged before reuse and replaced
+    if the ping fails; a client whose call fails with a connection error is
+    discarded.  Streaming results keep their own connection, so their client
+    is returned to the pool as soon as the call returns.
+
+    Any other keyword arguments are passed to make_client().
+    '''
+    def __init__(self, size=DEFAULT_POOL_SIZE, check_interval=30,
+                 **settings):
+        if size < 1:
+            raise ValueError('Pool size must be at least 1')
+        self.size = size
+        self.check_interval = check_interval
+        self.settings = settings
+        self.created = 0
+        self._lock = threading.Lock()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    def __repr__(self):
+        return '<ClientPool {}/{} idle>'.format(self._idle.qsize(),
+                                                self.created)
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+
+        import docker
+        if callable(getattr(docker.APIClient, attr, None)):
+            return partial(self.call, attr)
+        with self.checkout() as client:
+            return getattr(client, attr)
+
+    def _new(self):
+        with self._lock:
+            self.created += 1
+        return make_client(**self.settings)
+
+    def _healthy(self, client):
+        try:
+            return client.ping() in (True, 'OK')
+        except Exception:
+            return False
+
+    def acquire(self, timeout=None):
+        '''Check out a client, waiting up to timeout seconds for one to
+        become available.
+        '''
+        if self._closed:
+            raise RuntimeError('Pool is closed')
+        if timeout is None:
+            self._slots.acquire()
+        elif not _acquire(self._slots, timeout):
+            raise PoolTimeout('No client available after {}s'.format(timeout))
+
+        try:
+            while True:
+                try:
+                    client, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._new()
+                if time.time() - last_used < self.check_interval or \
+                   self._healthy(client):
+                    return client
+                client.close()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, client, discard=False):
+        '''Check a client back in, or close it if discard is True.'''
+        if discard or self._closed:
+            client.close()
+        else:
+            self._idle.put((client, time.time()))
+        self._slots.release()
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        client = self.acquire(timeout)
+        # Interrupted calls (KeyboardInterrupt, GeneratorExit, ...) may
+        # leave a response half-read, so the client is discarded then
+        discard = True
+        try:
+            yield client
+            discard = False
+        except Exception as e:
+            discard = _is_connection_error(e)
+            raise
+        finally:
+            self.release(client, discard)
+
+    def call(self, method, *args, **kwargs):
+        with self.checkout() as client:
+            return getattr(client, method)(*args, **kwargs)
+
+    def close(self):
+        '''Close the idle clients; clients in use are closed on release.'''
+        self._closed = True
+        while True:
+            try:
+                client, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            client.close()
+
+
+def _acquire(sem, timeout):
+    try:
+        return sem.acquire(timeout=timeout)
+    except TypeError: # pragma: no cover
+        # Python 2 semaphores do not take a timeout
+        deadline = time.time() + timeout
+        while not sem.acquire(False):
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+def _is_connection_error(e):
+    from requests.exceptions import ConnectionError
+    return isinstance(e, ConnectionError)
+
+#-------------------------------------------------------------------------------
+# Default client proxy
+
+
+class LazyClient(object):
+    '''Stands in for the default client, creating it on first use.'''
+    def __getattr__(self, attr):
+        return getattr(get_client(), attr)
+
+    def __repr__(self):
+        return '<LazyClient {}>'.format(_CLIENT)
+
+CLIENT = LazyClient()
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('CLIENT', 'configure', 'get_client', 'make_client', 'checkout',
+           'ClientPool', 'PoolTimeout')
+
+#-------------------------------------------------------------------------------
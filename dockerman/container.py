@@ -4,15 +4,19 @@ import time
 from uuid import uuid4
 from functools import partial
 from contextlib import contextmanager
-from syn.five import STR
-from syn.base import Base, Attr
-from syn.utils.cmdargs import (Positional, Option, BinaryOption, arglist, 
-                               render_args)
+from syn.five import STR, NUM
+from syn.base import Base, Attr, create_hook
+from syn.utils.cmdargs import Positional, Option, BinaryOption, arglist
 from syn.type import List, Dict
-from .utils import join, split, dictify_strings, call, scan_port
+from .utils import join, split, dictify_strings, scan_port
+from .readiness import Probe, TCPProbe
+from . import archive
+from .metrics import measure
+from .tracing import traced
+from .streams import LogStream, LogTail, ExecResult, MAX_LINE, timestamp
 
-from docker.errors import NotFound
-from .base import CLIENT
+from .base import get_client, checkout
+from .image import pull_image
 
 OAttr = partial(Attr, optional=True)
 comma_split = partial(split, sep=',')
@@ -23,15 +27,77 @@ Single = partial(Option, interleave=False)
 # Status
 
 
-class ContainerStatus(Base):
+class StatusMixin(object):
+    '''Status behaviour shared by ContainerStatus and the slots-based
+    spec.CompactStatus.  Only the projected fields are stored, except for
+    ContainerStatus.dict, which holds the last inspect document.
+    '''
+    __slots__ = ()
+
+    def clear(self):
+        '''Set to the status of a nonexistent container.'''
+        tracked = self.tracked
+        self.reset()
+        self.tracked = tracked
+        self.timestamp = time.time()
+
+    def expired(self, ttl):
+        if self.tracked and self.timestamp:
+            return False
+        return (time.time() - self.timestamp) >= ttl
+
+    def invalidate(self):
+        self.timestamp = 0.0
+
+    def update(self, dct):
+        '''Update from an inspect document.'''
+        self.exists = True
+        self.running = dct['State']['Running']
+        self.paused = dct['State']['Paused']
+        self.ip_addr = dct['NetworkSettings']['IPAddress']
+        self.id = dct['Id']
+        self.timestamp = time.time()
+
+    def update_summary(self, dct):
+        '''Update from an entry of the container list endpoint.'''
+        state = dct['State']
+        networks = dct['NetworkSettings']['Networks'] or {}
+        bridge = networks.get('bridge', {})
+
+        self.exists = True
+        self.running = state in ('running', 'paused', 'restarting')
+        self.paused = state == 'paused'
+        self.ip_addr = bridge.get('IPAddress', '') if self.running else ''
+        self.id = dct['Id']
+        self.timestamp = time.time()
+
+
+class ContainerStatus(StatusMixin, Base):
     _attrs = dict(id = OAttr(STR),
                   ip_addr = Attr(STR, ''),
                   exists = Attr(bool, False),
                   running = Attr(bool, False),
                   paused = Attr(bool, False),
-                  dict = Attr(dict, init=lambda self: dict()))
+                  dict = Attr(dict, init=lambda self: dict()),
+                  timestamp = Attr(float, 0.0, 'Time of the last refresh',
+                                   groups=('eq_exclude', 'repr_exclude',
+                                           'str_exclude')),
+                  tracked = Attr(bool, False, 'Kept current by a tracker',
+                                 groups=('eq_exclude', 'repr_exclude',
+                                         'str_exclude')))
     _opts = dict(optional_none = True)
-        
+
+    def update(self, dct):
+        super(ContainerStatus, self).update(dct)
+        self.dict = dct
+
+    def update_summary(self, dct):
+        '''Update from an entry of the container list endpoint, which
+        lacks the full inspect document (dict is emptied).
+        '''
+        super(ContainerStatus, self).update_summary(dct)
+        self.dict = {}
+
     # TODO: integrate into syn.base as mixin
     def reset(self):
         attrs = self._attrs
@@ -66,37 +132,43 @@ dict(_status = Attr(ContainerStatus, init=lambda self: ContainerStatus()),
      stdin_open = Attr(bool, False, 'Keep STDIN open even if not attached',
                        groups=(RA, CC)),
      tty = Attr(bool, False, 'Allocate a pseudo-TTY', groups=(RA, CC)),
-     mem_limit = OAttr((float, STR), doc="Memory limit", groups=(RA, CC)),
+     mem_limit = OAttr((float, STR), doc="Memory limit", groups=(RA, HC)),
      ports = OAttr(List(int), doc="A list of port numbers", groups=(CC,)),
      environment = OAttr(Dict(STR), call=dictify_eqstrings, groups=(RA, CC),
                          doc='Environment variables to set in the container'),
      dns = OAttr(List(STR), call=comma_split, doc='DNS name servers',
-                 groups=(RA, CC)),
+                 groups=(RA, HC)),
      volumes = OAttr(List(STR), call=comma_split, doc='Volume names', 
                      groups=(RA, CC)),
      volumes_from = OAttr(List(STR), doc="List of container names or Ids to "
                           "get volumes from", call=comma_split, 
-                          groups=(RA, CC)),
+                          groups=(RA, HC)),
      network_disabled = Attr(bool, False, "Disable networking", groups=(CC,)),
      name = Attr(STR, doc='A name for the container', groups=(RA, CC),
                  init=lambda self: 'default-'+uuid4().hex),
      entrypoint = OAttr(STR, call=join, doc='Container entrypoint',
                         groups=(RA, CC)),
      cpu_shares = OAttr(int, doc='CPU shares (relative weight)', 
-                        groups=(RA, CC)),
+                        groups=(RA, HC)),
      working_dir = OAttr(STR, doc='Path to working directory', groups=(RA, CC)),
      domainname = OAttr(STR, call=split, doc='Custom DNS search domains', 
                         groups=(CC,)),
-     memswap_limit = OAttr(int, groups=(RA, CC)),
+     memswap_limit = OAttr(int, groups=(RA, HC)),
      mac_address = OAttr(STR, doc='MAC address to assign to the container', 
                          groups=(RA, CC)),
      labels = OAttr(Dict(STR), call=dictify_strings, groups=(RA, CC),
                     doc='A dictionary of name-value labels'),
      volume_driver = OAttr(STR, doc='The name of a volume driver/plugin', 
-                           groups=(RA, CC)),
+                           groups=(RA, HC)),
      stop_signal = OAttr(STR, doc='The signal used to stop the container', 
                          groups=(RA, CC)),
      id = OAttr(STR, doc='The id of the running container', internal=True),
+     status_ttl = Attr(NUM, 1.0, internal=True,
+                       doc='Seconds for which a retrieved status is reused'),
+     client = OAttr(object, internal=True,
+                    groups=('eq_exclude', 'repr_exclude', 'str_exclude'),
+                    doc='Docker client used when none is passed to a method '
+                    '(default: base.get_client())'),
     )
 
 #-------------------------------------------------------------------------------
@@ -139,103 +211,336 @@ class Container(Base):
                  init_validate = True,
                  optional_none = True)
     
+    def __setattr__(self, attr, value):
+        super(Container, self).__setattr__(attr, value)
+        if attr in self._marshal_attrs:
+            self.__dict__.pop('_marshalled', None)
+
+    @classmethod
+    @create_hook
+    def _compile_marshal_plans(cls):
+        order = {id(arg): k for k, arg in enumerate(RUN_ARGS)}
+        ra = [(attr, RUN_ARGD[attr]) for attr in cls._groups[RA]]
+        ra.sort(key=lambda item: order[id(item[1])])
+
+        cls._marshal_plans = {RA: tuple(ra),
+                              CC: tuple(sorted(cls._groups[CC])),
+                              HC: tuple(sorted(cls._groups[HC]))}
+        cls._marshal_attrs = frozenset(cls._groups[RA] | cls._groups[CC] |
+                                       cls._groups[HC])
+
+    def _client(self, kwargs):
+        client = kwargs.get('client')
+        return get_client(self.client if client is None else client)
+
     @property
-    def status(self, **kwargs):
-        client = kwargs.get('client', CLIENT)
-        try:
-            dct = client.inspect_container(self.name)
-        except NotFound:
-            self._status.reset()
-            return self._status
+    def status(self):
+        if self._status.expired(self.status_ttl):
+            self.refresh()
+        return self._status
 
-        self._status.dict = dct
-        self._status.exists = True
-        self._status.running = dct['State']['Running']
-        self._status.paused = dct['State']['Paused']
-        self._status.ip_addr = dct['NetworkSettings']['IPAddress']
-        self._status.id = dct['Id']
+    @traced('create')
+    def create(self, **kwargs):
+        from docker.errors import ImageNotFound
 
-        return self._status
+        client = self._client(kwargs)
+        dct = self.marshal_args(CC)
+        dct['host_config'] = client.create_host_config(**dct['host_config'])
 
-    def is_port_live(self, port):
-        if self.status.paused or not self.status.running:
+        try:
+            res = measure('create_container', client.create_container, **dct)
+        except ImageNotFound:
+            # Concurrent creates share a single pull
+            pull_image(self.image, client)
+            res = measure('create_container', client.create_container, **dct)
+
+        self.id = res['Id']
+        self._status.invalidate()
+        return self.id
+
+    @traced('execute')
+    def execute(self, cmd, stream=False, **kwargs):
+        '''Run cmd (a string or list) in the running container, returning
+        an ExecResult.
+
+        If stream is True, the result yields output as it is produced (split
+        into lines unless lines=False); otherwise the output is collected
+        into its stdout and stderr before returning.  If check is True, a
+        non-zero exit code raises docker.errors.ContainerError.  The user,
+        environment, privileged and tty keyword arguments are passed to the
+        daemon.
+        '''
+        from docker.errors import ContainerError
+
+        client = self._client(kwargs)
+        tty = kwargs.get('tty', False)
+        res = measure('exec_create', client.exec_create, self.name, cmd,
+                      user=kwargs.get('user', ''),
+                      environment=kwargs.get('environment'),
+                      privileged=kwargs.get('privileged', False), tty=tty)
+        exec_id = res['Id']
+
+        # Without an Upgrade header the daemon replies with a plain response
+        # streamed until the command exits
+        with checkout(client) as cl:
+            url = cl._url('/exec/{0}/start', exec_id)
+            res = measure('exec_start', cl._post_json, url, stream=True,
+                          data=dict(Tty=tty, Detach=False))
+            try:
+                cl._raise_for_status(res)
+            except Exception:
+                res.close()
+                raise
+
+        output = LogStream(res, tty=tty, lines=kwargs.get('lines', stream),
+                           follow=True)
+        ret = ExecResult(client, exec_id, output)
+        if not stream:
+            ret.collect()
+        if kwargs.get('check', False) and ret.exit_code != 0:
+            raise ContainerError(self.name, ret.exit_code, cmd, self.image,
+                                 ret.stderr)
+        return ret
+
+    @traced('get_files')
+    def get_files(self, src, dest, **kwargs):
+        '''Copy path src of the container into local directory dest (see
+        archive.get_files()).
+        '''
+        return archive.get_files(self, src, dest, **kwargs)
+
+    @traced('inspect')
+    def inspect(self, **kwargs):
+        '''Return the full inspect document, updating the status from it.
+        '''
+        client = self._client(kwargs)
+        dct = measure('inspect_container', client.inspect_container,
+                      self.name)
+        self._status.update(dct)
+        return dct
+
+    def logs(self, stdout=True, stderr=True, follow=False, since=None,
+             tail='all', timestamps=False, lines=True, **kwargs):
+        '''Return a LogStream of the container's output, as (stream, data)
+        pairs where stream is streams.STDOUT or streams.STDERR.
+
+        If follow is True, new output is read as it is written until the
+        container stops or the LogStream is closed.  since (a datetime or
+        Unix time) and tail (a number of lines, or 'all') restrict the
+        output already written.  With lines=True, data is split into lines;
+        otherwise it is yielded as the daemon sends it.
+        '''
+        params = dict(stdout=stdout and 1 or 0, stderr=stderr and 1 or 0,
+                      follow=follow and 1 or 0,
+                      timestamps=timestamps and 1 or 0, tail=tail)
+        if since is not None:
+            params['since'] = timestamp(since)
+
+        with checkout(self._client(kwargs)) as client:
+            url = client._url('/containers/{0}/logs', self.name)
+            res = measure('logs', client._get, url, params=params,
+                          stream=True)
+            try:
+                client._raise_for_status(res)
+            except Exception:
+                res.close()
+                raise
+        return LogStream(res, tty=self.tty, lines=lines,
+                         max_line=kwargs.get('max_line', MAX_LINE),
+                         follow=follow)
+
+    def tail(self, n=100, **kwargs):
+        '''Follow the container's output on a background thread, keeping
+        the last n lines (see streams.LogTail).  Keyword arguments are
+        passed to logs().
+        '''
+        kwargs.setdefault('tail', n)
+        return LogTail(self.logs(follow=True, **kwargs), n)
+
+    def is_port_live(self, port, **kwargs):
+        status = self._status
+        if status.expired(self.status_ttl):
+            status = self.refresh(**kwargs)
+        if status.paused or not status.running:
             return False
-        return scan_port(self.status.ip_addr, port)
+        return scan_port(status.ip_addr, port)
+
+    @traced('marshal')
+    def _marshal(self, group):
+        plan = self._marshal_plans[group]
 
-    # TODO: rename to marshal_run_args
-    def marshal_args(self, group):
         if group == RA:
-            values = {RUN_ARGD[attr].name: val for attr, val 
-                      in self.to_dict(include=[group]).items() 
-                      if val is not None}
-            return render_args(RUN_ARGS, values)
+            out = ''
+            for attr, arg in plan:
+                val = getattr(self, attr)
+                if val is not None:
+                    rendered = arg.render(val)
+                    if rendered:
+                        out += ' ' + rendered
+            return out
+
+        dct = {}
+        for attr in plan:
+            val = getattr(self, attr)
+            if val is not None:
+                dct[attr] = val
 
         if group == HC:
-            dct = {attr:val for attr, val in
-                   self.to_dict(include=[group]).items() if val is not None}
-            return dct
+            binds = [vol for vol in self.volumes or () if ':' in vol]
+            if binds:
+                dct['binds'] = binds
 
         if group == CC:
-            hc = self.marshal_args(HC)
-            dct = {attr: val for attr, val in 
-                   self.to_dict(include=[group]).items() if val is not None}
-            dct['host_config'] = hc
-            return dct
+            if 'volumes' in dct:
+                dct['volumes'] = [vol.split(':')[1] if ':' in vol else vol
+                                  for vol in dct['volumes']]
+            dct['host_config'] = self._marshal(HC)
+        return dct
+
+    # TODO: rename to marshal_run_args
+    def marshal_args(self, group):
+        '''Marshal the attributes of group into run arguments (RA) or API
+        keyword arguments (CC, HC).
 
-        raise ValueError('Invalid group: {}'.format(group))
+        Results are cached until an attribute is reassigned; mutating a list
+        or dict attribute in place does not invalidate the cache.
+        '''
+        if group not in self._marshal_plans:
+            raise ValueError('Invalid group: {}'.format(group))
 
-    def pause(self, **kwargs):
-        cmd = 'docker pause ' + self.name
-        call(cmd)
+        cache = self.__dict__.setdefault('_marshalled', {})
+        if group not in cache:
+            cache[group] = self._marshal(group)
 
-    def poll(self, port, **kwargs):
-        wait = kwargs.get('wait', 0.1)
-        timeout = kwargs.get('timeout', float('inf')) # No timeout by default
+        ret = cache[group]
+        if group == CC:
+            return dict(ret, host_config=dict(ret['host_config']))
+        if group == HC:
+            return dict(ret)
+        return ret
 
-        if not self.status.running:
+    @traced('pause')
+    def pause(self, **kwargs):
+        client = self._client(kwargs)
+        measure('pause', client.pause, self.name)
+        self._status.invalidate()
+
+    @traced('poll')
+    def poll(self, probe, **kwargs):
+        '''Block until the container is ready according to probe, which is
+        either a port number or a readiness.Probe.
+        '''
+        status = self._status
+        if status.expired(self.status_ttl):
+            status = self.refresh(**kwargs)
+        if not status.running:
             raise RuntimeError('Container must be running to poll')
-        if self.status.paused:
+        if status.paused:
             raise RuntimeError('Cannot poll paused container')
 
-        start_time = time.time()
-        while True:
-            if not self.is_port_live(port):
-                ctime = time.time()
-                if (ctime - start_time) >= timeout:
-                    raise RuntimeError('Timeout on poll()')
-                else:
-                    time.sleep(wait)
-            else:
-                break
-
-    # TODO: add options
+        if not isinstance(probe, Probe):
+            probe = TCPProbe(probe, interval=kwargs.pop('wait', 0.1),
+                             connect_timeout=kwargs.pop('connect_timeout', 1))
+        measure('poll', probe.wait, self, **kwargs)
+
+    def refresh(self, **kwargs):
+        from docker.errors import NotFound
+
+        try:
+            self.inspect(**kwargs)
+        except NotFound:
+            self._status.clear()
+        return self._status
+
+    @traced('put_files')
+    def put_files(self, src, dest, **kwargs):
+        '''Copy local paths src into directory dest of the container (see
+        archive.put_files()).
+        '''
+        return archive.put_files(self, src, dest, **kwargs)
+
+    @traced('remove')
     def remove(self, **kwargs):
-        cmd = 'docker rm -f -v ' + self.name
-        call(cmd)
+        client = self._client(kwargs)
+        measure('remove_container', client.remove_container, self.name,
+                v=kwargs.get('v', True), force=kwargs.get('force', True))
+        self._status.invalidate()
 
+    @traced('run')
     def run(self, **kwargs):
-        cmd = 'docker run'
-        cmd += self.marshal_args(RA)
-        call(cmd)
-
+        '''Create and start the container, returning its id.  If not
+        detached, waits for the container to exit and raises
+        docker.errors.ContainerError on a non-zero exit status.
+        '''
+        from docker.errors import ContainerError
+
+        client = self._client(kwargs)
+        self.create(client=client)
+        measure('start', client.start, self.id)
+        self._status.invalidate()
+
+        if not self.detach:
+            res = measure('wait', client.wait, self.id)
+            code = res['StatusCode'] if isinstance(res, dict) else res
+            if code != 0:
+                err = measure('logs', client.logs, self.id, stdout=False,
+                              stderr=True)
+                raise ContainerError(self.name, code, self.command, 
+                                     self.image, err)
+        return self.id
+
+    @traced('start')
     def start(self, **kwargs):
-        cmd = 'docker start ' + self.name
-        call(cmd)
+        client = self._client(kwargs)
+        measure('start', client.start, self.name)
+        self._status.invalidate()
 
+    @traced('stop')
     def stop(self, **kwargs):
-        cmd = 'docker stop ' + self.name
-        call(cmd)
+        client = self._client(kwargs)
+        measure('stop', client.stop, self.name,
+                timeout=kwargs.get('timeout', 10))
+        self._status.invalidate()
 
+    @traced('unpause')
     def unpause(self, **kwargs):
-        cmd = 'docker unpause ' + self.name
-        call(cmd)
+        client = self._client(kwargs)
+        measure('unpause', client.unpause, self.name)
+        self._status.invalidate()
+
 
+# exec is a keyword in Python 2
+setattr(Container, 'exec', Container.execute)
 
 #-------------------------------------------------------------------------------
 # Container context manager
 
 @contextmanager
 def container(image, command='', **kwargs):
+    '''Context manager running a detached container, which is removed on
+    exit.
+
+    If pool is True, the container is taken from the shared pool for its
+    spec (see pool.get_pool()); if pool is a ContainerPool, it must hold
+    containers of the given spec.  Pooled containers are released to their
+    pool on exit.
+    '''
+    pool = kwargs.pop('pool', None)
+    if pool is not None:
+        from .pool import get_pool
+
+        if pool is True:
+            pool = get_pool(image, command, **kwargs)
+        elif not pool.matches(image, command, **kwargs):
+            raise ValueError('Pool does not hold containers of the '
+                             'requested spec')
+        c = pool.acquire()
+        try:
+            yield c
+        finally:
+            pool.release(c)
+        return
+
     kwargs['detach'] = kwargs.get('detach', True)
 
     c = Container(image, command, **kwargs)
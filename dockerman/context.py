@@ -0,0 +1,229 @@
+'''Build contexts: .dockerignore filtering and content hashing.
+
+The content hash of a context identifies everything that can affect a
+build: the paths, types, modes and contents of the files sent, and the
+build options.  File contents are hashed once and cached by file stat
+(size, mtime, inode, mode), so rehashing an unchanged tree only costs a
+stat per file.
+'''
+import os
+import re
+import json
+import stat
+import time
+import hashlib
+import threading
+
+from .archive import tar_stream
+
+DOCKERIGNORE = '.dockerignore'
+
+#-------------------------------------------------------------------------------
+# .dockerignore
+
+
+def _translate(pattern):
+    '''Translate a .dockerignore pattern into a regular expression, with
+    the semantics of the Docker CLI.
+    '''
+    out = ''
+    i, n = 0, len(pattern)
+    while i < n:
+        ch = pattern[i]
+        if ch == '*':
+            if i + 1 < n and pattern[i + 1] == '*':
+                i += 1
+                if i + 1 < n and pattern[i + 1] == '/':
+                    i += 1
+                out += '.*' if i + 1 == n else '(.*/)?'
+            else:
+                out += '[^/]*'
+        elif ch == '?':
+            out += '[^/]'
+        elif ch == '\\' and i + 1 < n:
+            i += 1
+            out += re.escape(pattern[i])
+        elif ch == '[' and pattern.find(']', i + 1) > i:
+            end = pattern.find(']', i + 1)
+            out += pattern[i:end + 1]
+            i = end
+        else:
+            out += re.escape(ch)
+        i += 1
+    return re.compile('^' + out + '$')
+
+
+class DockerIgnore(object):
+    '''Path matcher for the patterns of a .dockerignore file.
+
+    As with the Docker CLI, the last matching pattern decides; patterns
+    starting with ! re-include paths, and a pattern also matches the paths
+    below those it matches.
+    '''
+    def __init__(self, patterns=()):
+        self.patterns = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith('#'):
+                continue
+            exclusion = pattern.startswith('!')
+            if exclusion:
+                pattern = pattern[1:].strip()
+            pattern = os.path.normpath(pattern).replace(os.sep, '/')
+            if len(pattern) > 1 and pattern.startswith('/'):
+                pattern = pattern[1:]
+            self.patterns.append((_translate(pattern), exclusion))
+        self.exclusions = any(exclusion for _, exclusion in self.patterns)
+
+    @classmethod
+    def from_file(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls(f.read().splitlines())
+
+    def __bool__(self):
+        return bool(self.patterns)
+    __nonzero__ = __bool__
+
+    def matches(self, path):
+        '''Whether the relative path (with / separators) is excluded.'''
+        parts = path.split('/')
+        parents = ['/'.join(parts[:k]) for k in range(1, len(parts))]
+        matched = False
+        for regex, exclusion in self.patterns:
+            if regex.match(path) or any(regex.match(parent)
+                                        for parent in parents):
+                matched = not exclusion
+        return matched
+
+#-------------------------------------------------------------------------------
+# StatCache
+
+
+class StatCache(object):
+    '''File content hashes, keyed by path and valid while the file's stat
+    is unchanged.  If path is given, the cache is loaded from and saved to
+    that JSON file.
+
+    Files modified within the last ``min_age`` seconds are not cached, as
+    a change within the same mtime tick would go unnoticed.
+    '''
+    def __init__(self, path=None, min_age=2.0):
+        self.path = path
+        self.min_age = min_age
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.entries = {k: tuple(v) for k, v in json.load(f).items()}
+
+    @staticmethod
+    def _key(st):
+        return [st.st_size, st.st_mtime, st.st_ino, st.st_mode]
+
+    def digest(self, path, st=None, chunk_size=65536):
+        '''Return the SHA-256 hex digest of the contents of file path.'''
+        st = os.stat(path) if st is None else st
+        key = self._key(st)
+        entry = self.entries.get(path)
+        if entry is not None and list(entry[:-1]) == key:
+            self.hits += 1
+            return entry[-1]
+
+        self.misses += 1
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for data in iter(lambda: f.read(chunk_size), b''):
+                h.update(data)
+        digest = h.hexdigest()
+
+        if time.time() - st.st_mtime >= self.min_age:
+            with self._lock:
+                self.entries[path] = tuple(key + [digest])
+        return digest
+
+    def save(self):
+        if self.path is not None:
+            with self._lock:
+                data = dict(self.entries)
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.rename(tmp, self.path)
+
+CACHE = StatCache()
+
+#-------------------------------------------------------------------------------
+# BuildContext
+
+
+class BuildContext(object):
+    '''The files of directory path that are sent to the daemon for a build,
+    honouring path/.dockerignore.  The Dockerfile and .dockerignore are
+    always included.
+    '''
+    def __init__(self, path, dockerfile='Dockerfile', cache=None):
+        self.path = os.path.abspath(path)
+        self.dockerfile = dockerfile
+        self.cache = CACHE if cache is None else cache
+        self.ignore = DockerIgnore.from_file(os.path.join(self.path,
+                                                          DOCKERIGNORE))
+        self._entries = None
+
+    def _walk(self, path, prefix):
+        for name in sorted(os.listdir(path)):
+            full = os.path.join(path, name)
+            arcname = prefix + name
+            st = os.lstat(full)
+            isdir = stat.S_ISDIR(st.st_mode)
+            excluded = self.ignore.matches(arcname) and \
+                       arcname not in (self.dockerfile, DOCKERIGNORE)
+            if not excluded:
+                yield full, arcname, st
+            if isdir and (not excluded or self.ignore.exclusions):
+                for item in self._walk(full, arcname + '/'):
+                    yield item
+
+    @property
+    def entries(self):
+        '''(path, arcname, stat) of each file, directory and link sent.'''
+        if self._entries is None:
+            self._entries = list(self._walk(self.path, ''))
+        return self._entries
+
+    def digest(self, **options):
+        '''Return the SHA-256 hex digest of the context's contents and the
+        given build options (e.g. buildargs, target).
+        '''
+        h = hashlib.sha256()
+        h.update(json.dumps(dict(options, dockerfile=self.dockerfile),
+                            sort_keys=True).encode('utf-8'))
+        for path, arcname, st in self.entries:
+            mode = st.st_mode
+            if stat.S_ISREG(mode):
+                kind, data = 'f', self.cache.digest(path, st)
+            elif stat.S_ISDIR(mode):
+                kind, data = 'd', ''
+            elif stat.S_ISLNK(mode):
+                kind, data = 'l', os.readlink(path)
+            else:
+                continue
+            line = '{}\0{}\0{:o}\0{}\n'.format(arcname, kind,
+                                               stat.S_IMODE(mode), data)
+            h.update(line.encode('utf-8', 'surrogateescape'))
+        return h.hexdigest()
+
+    def stream(self, chunk_size=65536):
+        '''Generate the context as an uncompressed tar archive.'''
+        return tar_stream(((path, arcname)
+                           for path, arcname, _ in self.entries), chunk_size)
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('DockerIgnore', 'StatCache', 'BuildContext')
+
+#-------------------------------------------------------------------------------
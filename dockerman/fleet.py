@@ -0,0 +1,293 @@
+'''Parallel lifecycle operations on many containers.
+'''
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, ALL_COMPLETED, \
+    FIRST_EXCEPTION
+from syn.base import Base, Attr
+
+from .base import get_client
+from .image import ensure_image, normalize
+from .tracing import span
+
+#-------------------------------------------------------------------------------
+# FleetResult
+
+
+class FleetResult(Base):
+    _attrs = dict(results = Attr(dict, init=lambda self: dict(),
+                                 doc='Return values, keyed by container name'),
+                  errors = Attr(dict, init=lambda self: dict(),
+                                doc='Exceptions raised, keyed by container '
+                                'name'),
+                  cancelled = Attr(list, init=lambda self: list(),
+                                   doc='Names of containers on which the '
+                                   'operation was never attempted'))
+
+    @property
+    def ok(self):
+        return not self.errors and not self.cancelled
+
+    def raise_for_errors(self):
+        if not self.ok:
+            raise FleetError(self)
+
+
+class FleetError(Exception):
+    def __init__(self, result):
+        self.result = result
+        msg = '{} failed, {} cancelled: {}'.format(
+            len(result.errors), len(result.cancelled),
+            ', '.join(sorted(result.errors)))
+        super(FleetError, self).__init__(msg)
+
+#-------------------------------------------------------------------------------
+# Operations
+
+def apply_all(containers, op, **kwargs):
+    '''Apply op to each container on a pool of at most max_workers threads.
+
+    op is either the name of a Container method or a callable taking the
+    container.  Any remaining keyword arguments are passed to op.  If
+    fail_fast is True, pending operations are cancelled at the first error
+    and FleetError is raised; otherwise every operation is attempted and the
+    errors are reported in the returned FleetResult.
+
+    If prefetch is True, the missing images of the containers are pulled in
+    parallel first (see prefetch(), which takes the max_pulls and progress
+    keyword arguments), and op is applied to each container as soon as its
+    image is available.  Containers whose image cannot be pulled are
+    reported with the pull error.  With fail_fast, the first error cancels
+    both the pending operations and the pulls not yet started.
+    '''
+    max_workers = kwargs.pop('max_workers', 10)
+    fail_fast = kwargs.pop('fail_fast', False)
+    if kwargs.pop('prefetch', False):
+        opts = {k: kwargs.pop(k) for k in ('max_pulls', 'progress')
+                if k in kwargs}
+        return _apply_prefetched(containers, op, max_workers, fail_fast,
+                                 opts, kwargs)
+
+    func = op
+    if not callable(op):
+        func = lambda c, **kw: getattr(c, op)(**kw)
+
+    result = FleetResult()
+    containers = list(containers)
+    if not containers:
+        return result
+
+    name = op if not callable(op) else getattr(op, '__name__', 'op')
+    with span('apply_all', 'fleet', op=name, containers=len(containers)), \
+         ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(func, c, **kwargs): c for c in containers}
+        when = FIRST_EXCEPTION if fail_fast else ALL_COMPLETED
+        _, pending = wait(futures, return_when=when)
+        for future in pending:
+            future.cancel()
+
+    for future, c in futures.items():
+        if future.cancelled():
+            result.cancelled.append(c.name)
+        elif future.exception() is not None:
+            result.errors[c.name] = future.exception()
+        else:
+            result.results[c.name] = future.result()
+
+    if fail_fast:
+        result.raise_for_errors()
+    return result
+
+def _apply_prefetched(containers, op, max_workers, fail_fast, prefetch_opts,
+                      kwargs):
+    func = op
+    if not callable(op):
+        func = lambda c, **kw: getattr(c, op)(**kw)
+
+    result = FleetResult()
+    containers = list(containers)
+    futures = {}
+    lock = threading.RLock()
+    cancel = threading.Event()
+
+    def stop():
+        # Called with the lock held
+        cancel.set()
+        for future in futures:
+            future.cancel()
+
+    def on_done(future):
+        if fail_fast and not future.cancelled() and \
+           future.exception() is not None:
+            with lock:
+                stop()
+
+    name = op if not callable(op) else getattr(op, '__name__', 'op')
+    with span('apply_all', 'fleet', op=name, containers=len(containers),
+              prefetch=True), \
+         ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def on_ready(ref, cs):
+            with lock:
+                for c in cs:
+                    if cancel.is_set():
+                        break
+                    future = executor.submit(func, c, **kwargs)
+                    futures[future] = c
+                    future.add_done_callback(on_done)
+
+        def on_error(ref, cs, error):
+            with lock:
+                for c in cs:
+                    result.errors[c.name] = error
+                if fail_fast:
+                    stop()
+
+        prefetch(containers, on_ready=on_ready, on_error=on_error,
+                 cancel=cancel, client=kwargs.get('client'), **prefetch_opts)
+        wait(list(futures))
+
+    for future, c in futures.items():
+        if future.cancelled():
+            continue
+        elif future.exception() is not None:
+            result.errors[c.name] = future.exception()
+        else:
+            result.results[c.name] = future.result()
+    result.cancelled.extend(c.name for c in containers
+                            if c.name not in result.results
+                            and c.name not in result.errors)
+
+    if fail_fast:
+        result.raise_for_errors()
+    return result
+
+def run_all(containers, **kwargs):
+    return apply_all(containers, 'run', **kwargs)
+
+def start_all(containers, **kwargs):
+    return apply_all(containers, 'start', **kwargs)
+
+def stop_all(containers, **kwargs):
+    return apply_all(containers, 'stop', **kwargs)
+
+def remove_all(containers, **kwargs):
+    return apply_all(containers, 'remove', **kwargs)
+
+def exec_all(containers, cmd, **kwargs):
+    '''Run cmd in each container, returning a FleetResult whose results
+    are the ExecResults (see Container.execute()), with output collected.
+    With check=True, non-zero exit codes are reported as errors.
+    '''
+    kwargs['stream'] = False
+    return apply_all(containers, 'execute', cmd=cmd, **kwargs)
+
+#-------------------------------------------------------------------------------
+# Image prefetch
+
+
+_CANCELLED = object()
+
+
+class PrefetchResult(FleetResult):
+    _attrs = dict(containers = Attr(dict, init=lambda self: dict(),
+                                    doc='Containers using each image, keyed '
+                                    'by image reference'))
+
+
+def prefetch(containers, **kwargs):
+    '''Pull the distinct images of containers that are missing, in
+    parallel on at most max_pulls threads (default 4).  Each image is
+    looked up in the image index of the client of the containers using it
+    (or client, if given), and pulled at most once per client.
+
+    progress, if given, is called as progress(ref, status) with each status
+    message of the pulls, and with a status of the form {'status': 'Ready',
+    'Failed' or 'Cancelled', 'done': k, 'total': n} as each image becomes
+    available, fails or is skipped.  on_ready and on_error, if given, are
+    called as on_ready(ref, containers) as soon as image ref is available,
+    and as on_error(ref, containers, error) if it cannot be pulled, with
+    the containers using ref through the same client.  Pulls not yet
+    started once the threading.Event cancel, if given, is set are skipped.
+
+    Return a PrefetchResult keyed by image reference, whose results are
+    True for pulled images and False for those already present.  An image
+    used through several clients is reported as failed if any of its pulls
+    failed, and as cancelled if any was skipped.
+    '''
+    max_pulls = kwargs.get('max_pulls', 4)
+    progress = kwargs.get('progress')
+    on_ready = kwargs.get('on_ready')
+    on_error = kwargs.get('on_error')
+    cancel = kwargs.get('cancel') or threading.Event()
+    client = kwargs.get('client')
+
+    groups = OrderedDict() # (id(client), ref) -> (client, ref, containers)
+    for c in containers:
+        cl = get_client(client if client is not None else c.client)
+        ref = normalize(c.image)
+        groups.setdefault((id(cl), ref), (cl, ref, []))[2].append(c)
+
+    result = PrefetchResult()
+    total = len(groups)
+    done = [0]
+    lock = threading.Lock()
+
+    def report(ref, status, **extra):
+        if progress is not None:
+            with lock:
+                done[0] += 1
+                extra.update(status=status, done=done[0], total=total)
+            progress(ref, extra)
+
+    def fetch(cl, ref, cs):
+        if cancel.is_set():
+            report(ref, 'Cancelled')
+            return _CANCELLED
+        try:
+            ret = ensure_image(ref, cl, progress)
+        except Exception as e:
+            report(ref, 'Failed', error=str(e))
+            if on_error is not None:
+                on_error(ref, cs, e)
+            raise
+        report(ref, 'Ready')
+        if on_ready is not None:
+            on_ready(ref, cs)
+        return ret
+
+    if not groups:
+        return result
+
+    with span('prefetch', 'fleet', images=total), \
+         ThreadPoolExecutor(max_workers=max_pulls) as executor:
+        futures = {executor.submit(fetch, *group): group
+                   for group in groups.values()}
+        wait(futures)
+
+    cancelled = set()
+    for future, (_, ref, cs) in futures.items():
+        result.containers.setdefault(ref, []).extend(cs)
+        if future.exception() is not None:
+            result.errors[ref] = future.exception()
+        elif future.result() is _CANCELLED:
+            cancelled.add(ref)
+        else:
+            result.results[ref] = result.results.get(ref, False) or \
+                future.result()
+
+    for ref in result.containers:
+        if ref in result.errors:
+            result.results.pop(ref, None)
+        elif ref in cancelled:
+            result.results.pop(ref, None)
+            result.cancelled.append(ref)
+    return result
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('FleetResult', 'FleetError', 'apply_all',
+           'run_all', 'start_all', 'stop_all', 'remove_all', 'exec_all',
+           'PrefetchResult', 'prefetch')
+
+#-------------------------------------------------------------------------------
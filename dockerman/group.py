@@ -0,0 +1,107 @@
+'''Operations on groups of containers.
+'''
+from syn.base import Base, Attr
+
+from .base import get_client
+from .fleet import apply_all, exec_all
+from .metrics import measure
+
+#-------------------------------------------------------------------------------
+# Status refresh
+
+
+def _has_summary_fields(dct):
+    return 'State' in dct and 'Networks' in dct.get('NetworkSettings', {})
+
+def refresh_status(containers, **kwargs):
+    '''Refresh the status of each container using a single list call.
+
+    Containers whose list entry lacks the required fields (e.g. when talking
+    to an older daemon) fall back to an individual inspect.  If no client is
+    given, each container is refreshed through its own client, with one
+    list call per client.
+    '''
+    client = kwargs.get('client')
+    containers = list(containers)
+    if not containers:
+        return containers
+
+    if client is None:
+        clients = {}
+        for c in containers:
+            cl = get_client(getattr(c, 'client', None))
+            clients.setdefault(id(cl), (cl, []))[1].append(c)
+        if len(clients) > 1:
+            for cl, cs in clients.values():
+                refresh_status(cs, client=cl)
+            return containers
+        client = cl
+
+    names = [c.name for c in containers]
+    entries = measure('containers', client.containers, all=True,
+                      filters=dict(name=names))
+
+    by_name = {}
+    for entry in entries:
+        for name in entry.get('Names') or ():
+            by_name[name.lstrip('/')] = entry
+
+    for c in containers:
+        entry = by_name.get(c.name)
+        if entry is None:
+            c._status.clear()
+        elif _has_summary_fields(entry):
+            c._status.update_summary(entry)
+        else:
+            c.refresh(client=client)
+
+    return containers
+
+#-------------------------------------------------------------------------------
+# ContainerGroup
+
+
+class ContainerGroup(Base):
+    _attrs = dict(containers = Attr(list, init=lambda self: list(),
+                                    doc='The member containers'))
+    _opts = dict(args = ('containers',))
+
+    def __iter__(self):
+        return iter(self.containers)
+
+    def __len__(self):
+        return len(self.containers)
+
+    def add(self, container):
+        self.containers.append(container)
+
+    def apply(self, op, **kwargs):
+        return apply_all(self.containers, op, **kwargs)
+
+    def execute(self, cmd, **kwargs):
+        return exec_all(self.containers, cmd, **kwargs)
+
+    def refresh(self, **kwargs):
+        refresh_status(self.containers, **kwargs)
+        return [c._status for c in self.containers]
+
+    def remove(self, **kwargs):
+        return self.apply('remove', **kwargs)
+
+    def run(self, **kwargs):
+        return self.apply('run', **kwargs)
+
+    def start(self, **kwargs):
+        return self.apply('start', **kwargs)
+
+    def stop(self, **kwargs):
+        return self.apply('stop', **kwargs)
+
+setattr(ContainerGroup, 'exec', ContainerGroup.execute)
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('ContainerGroup', 'refresh_status')
+
+#-------------------------------------------------------------------------------
@@ -0,0 +1,335 @@
+'''Docker images: a cached index of local images, single-flight pulls and
+content-hashed builds.
+
+Concurrent pulls of the same reference through the same client are merged
+into one download, whose result (or error) every caller shares.  A fleet
+of containers using a missing image thus causes one pull, however many
+of them are created at once.
+
+Built images are labelled with the content hash of their build context
+(see context.BuildContext), so that unchanged contexts are not rebuilt.
+'''
+import time
+import weakref
+import threading
+from functools import partial
+from syn.five import STR
+from syn.base import Base, Attr
+
+from .base import get_client
+from .context import BuildContext
+from .metrics import measure
+
+OAttr = partial(Attr, optional=True)
+
+#-------------------------------------------------------------------------------
+# Utilities
+
+def normalize(ref):
+    '''Return ref as repository:tag (tag defaulting to latest), or
+    repository@digest.
+    '''
+    from docker.utils import parse_repository_tag
+
+    repo, tag = parse_repository_tag(ref)
+    if tag is not None and ':' in tag:
+        return repo + '@' + tag
+    return repo + ':' + (tag or 'latest')
+
+
+class PullError(RuntimeError):
+    pass
+
+#-------------------------------------------------------------------------------
+# ImageIndex
+
+
+class ImageIndex(object):
+    '''The local images of one daemon, refreshed from a single list call at
+    most every ``ttl`` seconds.  Images pulled or removed through dockerman
+    are added or discarded without a refresh.
+    '''
+    def __init__(self, client=None, ttl=30):
+        self.client = get_client(client)
+        self.ttl = ttl
+        self.refs = frozenset()
+        self.timestamp = 0.0
+        self._lock = threading.Lock()
+
+    def __contains__(self, ref):
+        if self.expired:
+            self.refresh()
+        return normalize(ref) in self.refs or ref in self.refs
+
+    def __len__(self):
+        return len(self.refs)
+
+    @property
+    def expired(self):
+        return time.time() - self.timestamp >= self.ttl
+
+    def refresh(self):
+        with self._lock:
+            entries = measure('images', self.client.images)
+            refs = set()
+            for entry in entries:
+                refs.add(entry['Id'])
+                refs.update(entry.get('RepoTags') or ())
+                refs.update(entry.get('RepoDigests') or ())
+            refs.discard('<none>:<none>')
+            refs.discard('<none>@<none>')
+            self.refs = frozenset(refs)
+            self.timestamp = time.time()
+
+    def invalidate(self):
+        self.timestamp = 0.0
+
+    def add(self, ref):
+        with self._lock:
+            self.refs = self.refs | set([normalize(ref)])
+
+    def discard(self, ref):
+        with self._lock:
+            self.refs = self.refs - set([normalize(ref), ref])
+
+# The caches below are keyed weakly by client, so that they are dropped
+# with their client
+INDEXES = weakref.WeakKeyDictionary() # client -> ImageIndex
+_INDEXES_LOCK = threading.Lock()
+
+def get_index(client=None):
+    '''Return the shared ImageIndex of client (or the default client).'''
+    client = get_client(client)
+    with _INDEXES_LOCK:
+        index = INDEXES.get(client)
+        if index is None:
+            # A strong reference would keep the client alive
+            index = INDEXES[client] = ImageIndex(weakref.proxy(client))
+        return index
+
+#-------------------------------------------------------------------------------
+# Pulls
+
+
+class _Flight(object):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+FLIGHTS = weakref.WeakKeyDictionary() # client -> {ref: _Flight}
+_FLIGHTS_LOCK = threading.Lock()
+
+def _pull(client, ref, progress):
+    from docker.utils import parse_repository_tag
+
+    repo, tag = parse_repository_tag(ref)
+    ret = None
+    for event in client.pull(repo, tag=tag or 'latest', stream=True,
+                             decode=True):
+        if 'error' in event:
+            raise PullError('Pulling {} failed: {}'.format(ref,
+                                                           event['error']))
+        if progress is not None:
+            progress(ref, event)
+        ret = event
+    return ret
+
+def pull_image(ref, client=None, progress=None):
+    '''Pull image ref, returning the last status message of the pull.
+
+    If a pull of ref through the same client is already in progress, waits
+    for it and shares its result instead of pulling again.  progress, if
+    given, is called as progress(ref, status) for each status message of a
+    pull made by this call.
+    '''
+    client = get_client(client)
+    key = normalize(ref)
+    with _FLIGHTS_LOCK:
+        flights = FLIGHTS.setdefault(client, {})
+        flight = flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = flights[key] = _Flight()
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = measure('pull', _pull, client, ref, progress)
+        get_index(client).add(ref)
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _FLIGHTS_LOCK:
+            del flights[key]
+            if not flights:
+                del FLIGHTS[client]
+        flight.done.set()
+    return flight.result
+
+def ensure_image(ref, client=None, progress=None):
+    '''Pull image ref unless the image index lists it (see pull_image()).
+    Return True if the image was pulled.
+    '''
+    if ref in get_index(client):
+        return False
+    pull_image(ref, client, progress)
+    return True
+
+#-------------------------------------------------------------------------------
+# Builds
+
+CONTEXT_LABEL = 'dockerman.context'
+BUILDS = weakref.WeakKeyDictionary() # client -> {ref: context digest}
+_BUILDS_LOCK = threading.Lock()
+
+def _builds(client):
+    with _BUILDS_LOCK:
+        return BUILDS.setdefault(client, {})
+
+def _build(client, ref, context, options, progress):
+    import docker
+    from docker.errors import BuildError
+
+    # docker < 3 only streams the build output if asked to, and its
+    # BuildError takes no build log; later versions always stream
+    legacy = int(docker.__version__.split('.')[0]) < 3
+    if legacy:
+        options = dict(options, stream=True)
+
+    log = []
+    for event in client.build(fileobj=context.stream(), custom_context=True,
+                              tag=ref, decode=True, **options):
+        log.append(event)
+        if 'error' in event:
+            msg = 'Building {} failed: {}'.format(ref,
+                                                  event['error'].strip())
+            raise BuildError(msg) if legacy else BuildError(msg, log)
+        if progress is not None:
+            progress(ref, event)
+    return log[-1] if log else None
+
+#-------------------------------------------------------------------------------
+# Image
+
+
+class Image(Base):
+    _attrs = dict(name = Attr(STR, doc='Image reference (repository[:tag] or '
+                              'repository@digest)'),
+                  client = OAttr(object, internal=True,
+                                 groups=('eq_exclude', 'repr_exclude',
+                                         'str_exclude'),
+                                 doc='Docker client used when none is passed '
+                                 'to a method (default: base.get_client())'))
+    _opts = dict(args = ('name',),
+                 init_validate = True,
+                 optional_none = True)
+
+    def _client(self, kwargs):
+        client = kwargs.get('client')
+        return get_client(self.client if client is None else client)
+
+    @property
+    def ref(self):
+        return normalize(self.name)
+
+    @property
+    def repository(self):
+        from docker.utils import parse_repository_tag
+        return parse_repository_tag(self.name)[0]
+
+    @property
+    def tag(self):
+        return self.ref.rsplit(':', 1)[1] if '@' not in self.ref else None
+
+    def build(self, path, **kwargs):
+        '''Build the image from directory path, unless it was built from
+        the same context before; return True if a build was made.
+
+        The context (see context.BuildContext) is streamed to the daemon as
+        a tar archive and its content hash is stored in the image's
+        dockerman.context label.  If the hash matches that of the last
+        build of the image by this process (and the image index still lists
+        the image), the build is skipped without contacting the daemon;
+        otherwise it is skipped if it matches the label of the existing
+        image.  force=True always builds.
+
+        Keyword arguments: dockerfile, buildargs, target, labels, pull,
+        nocache, rm (default True), cache (a context.StatCache) and
+        progress (called as progress(ref, status) for each build message).
+        '''
+        from docker.errors import NotFound
+
+        client = self._client(kwargs)
+        context = BuildContext(path, kwargs.get('dockerfile', 'Dockerfile'),
+                               kwargs.get('cache'))
+        buildargs = kwargs.get('buildargs') or {}
+        labels = dict(kwargs.get('labels') or {})
+        digest = context.digest(buildargs=buildargs, labels=labels,
+                                target=kwargs.get('target'))
+        context.cache.save()
+        builds = _builds(client)
+
+        if not kwargs.get('force', False):
+            if builds.get(self.ref) == digest and \
+               self.ref in get_index(client):
+                return False
+            try:
+                info = self.inspect(client=client)
+            except NotFound:
+                info = {}
+            if ((info.get('Config') or {}).get('Labels') or {}).get(
+                    CONTEXT_LABEL) == digest:
+                builds[self.ref] = digest
+                return False
+
+        labels[CONTEXT_LABEL] = digest
+        options = dict(dockerfile=context.dockerfile, labels=labels,
+                       buildargs=buildargs or None, rm=kwargs.get('rm', True),
+                       pull=kwargs.get('pull', False),
+                       nocache=kwargs.get('nocache', False))
+        if kwargs.get('target'):
+            options['target'] = kwargs['target']
+        measure('build', _build, client, self.ref, context, options,
+                kwargs.get('progress'))
+        builds[self.ref] = digest
+        get_index(client).add(self.ref)
+        return True
+
+    def ensure(self, **kwargs):
+        '''Pull the image if it is not present (see ensure_image()).'''
+        return ensure_image(self.ref, self._client(kwargs),
+                            kwargs.get('progress'))
+
+    def exists(self, **kwargs):
+        '''Whether the image is present, according to the image index.'''
+        return self.ref in get_index(self._client(kwargs))
+
+    def inspect(self, **kwargs):
+        client = self._client(kwargs)
+        return measure('inspect_image', client.inspect_image, self.ref)
+
+    def pull(self, **kwargs):
+        return pull_image(self.ref, self._client(kwargs),
+                          kwargs.get('progress'))
+
+    def remove(self, **kwargs):
+        client = self._client(kwargs)
+        measure('remove_image', client.remove_image, self.ref,
+                force=kwargs.get('force', False))
+        get_index(client).discard(self.ref)
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('Image', 'ImageIndex', 'PullError', 'get_index', 'pull_image',
+           'ensure_image')
+
+#-------------------------------------------------------------------------------
@@ -0,0 +1,210 @@
+'''Latency metrics and instrumentation hooks.
+
+Daemon calls, subprocess calls and probes made by dockerman are reported as
+operations (e.g. 'inspect_container', 'call', 'scan_port'), each ending in
+an outcome: 'ok', the name of the exception raised, or an
+operation-specific result (scan_port reports 'open', 'timeout' or
+'unreachable').
+
+Nothing is recorded until enable() is called or a hook is added; until then
+instrumented calls cost a single flag check.  Usage::
+
+    from dockerman import metrics
+    metrics.enable()
+    ...
+    print(metrics.prometheus())
+'''
+import time
+import bisect
+import threading
+from functools import wraps
+
+#-------------------------------------------------------------------------------
+# State
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, float('inf'))
+
+ENABLED = False      # True if collecting or any hook is registered
+COLLECTING = False
+PRE_HOOKS = []
+POST_HOOKS = []
+
+_LOCK = threading.Lock()
+
+def _update():
+    global ENABLED
+    ENABLED = COLLECTING or bool(PRE_HOOKS) or bool(POST_HOOKS)
+
+#-------------------------------------------------------------------------------
+# Histogram
+
+
+class Histogram(object):
+    '''Latency histogram with fixed bucket upper bounds (in seconds).'''
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative(self):
+        ret = []
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            ret.append((bound, total))
+        return ret
+
+HISTOGRAMS = {} # (op, outcome) -> Histogram
+
+#-------------------------------------------------------------------------------
+# Configuration
+
+def enable():
+    '''Start collecting counters and histograms.'''
+    global COLLECTING
+    COLLECTING = True
+    _update()
+
+def disable():
+    '''Stop collecting (hooks remain registered).'''
+    global COLLECTING
+    COLLECTING = False
+    _update()
+
+def reset():
+    '''Discard everything collected so far.'''
+    with _LOCK:
+        HISTOGRAMS.clear()
+
+def add_hook(pre=None, post=None):
+    '''Register hooks called before and after each operation, as pre(op)
+    and post(op, outcome, seconds).  Hooks run on the calling thread.
+    '''
+    if pre is not None:
+        PRE_HOOKS.append(pre)
+    if post is not None:
+        POST_HOOKS.append(post)
+    _update()
+
+def remove_hook(pre=None, post=None):
+    if pre is not None and pre in PRE_HOOKS:
+        PRE_HOOKS.remove(pre)
+    if post is not None and post in POST_HOOKS:
+        POST_HOOKS.remove(post)
+    _update()
+
+#-------------------------------------------------------------------------------
+# Instrumentation
+
+def record(op, outcome, seconds):
+    '''Record a completed operation and call the post hooks.'''
+    if COLLECTING:
+        key = (op, outcome)
+        with _LOCK:
+            hist = HISTOGRAMS.get(key)
+            if hist is None:
+                hist = HISTOGRAMS[key] = Histogram()
+            hist.observe(seconds)
+    for hook in POST_HOOKS:
+        hook(op, outcome, seconds)
+
+def _measure(op, classify, func, args, kwargs):
+    for hook in PRE_HOOKS:
+        hook(op)
+    start = time.time()
+    try:
+        ret = func(*args, **kwargs)
+    except Exception as e:
+        record(op, type(e).__name__, time.time() - start)
+        raise
+    record(op, 'ok' if classify is None else classify(ret),
+           time.time() - start)
+    return ret
+
+def measure(op, func, *args, **kwargs):
+    '''Call func(*args, **kwargs), recording it as operation op.'''
+    if not ENABLED:
+        return func(*args, **kwargs)
+    return _measure(op, None, func, args, kwargs)
+
+def instrument(op, classify=None):
+    '''Decorator recording each call of the function as operation op.  If
+    given, classify maps the return value to the outcome.
+    '''
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            return _measure(op, classify, func, args, kwargs)
+        return wrapper
+    return decorator
+
+#-------------------------------------------------------------------------------
+# Export
+
+def snapshot():
+    '''Return the collected metrics as a dict of the form
+    {op: {outcome: {'count': n, 'sum': seconds, 'buckets': [[le, n], ...]}}},
+    where bucket counts are cumulative.
+    '''
+    ret = {}
+    with _LOCK:
+        for (op, outcome), hist in HISTOGRAMS.items():
+            ret.setdefault(op, {})[outcome] = dict(
+                count=hist.count, sum=hist.sum,
+                buckets=[list(b) for b in hist.cumulative()])
+    return ret
+
+def _labels(**kwargs):
+    return ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\')
+                                     .replace('"', '\\"'))
+                    for k, v in sorted(kwargs.items()))
+
+def _float(value):
+    return '+Inf' if value == float('inf') else repr(float(value))
+
+def prometheus(prefix='dockerman'):
+    '''Return the collected metrics in the Prometheus text format.'''
+    snap = snapshot()
+    keys = sorted((op, outcome) for op in snap for outcome in snap[op])
+
+    name = prefix + '_operations_total'
+    lines = ['# HELP {} Operations performed, by outcome.'.format(name),
+             '# TYPE {} counter'.format(name)]
+    for op, outcome in keys:
+        lines.append('{}{{{}}} {}'.format(name, _labels(op=op,
+                                                        outcome=outcome),
+                                          snap[op][outcome]['count']))
+
+    name = prefix + '_operation_duration_seconds'
+    lines += ['# HELP {} Operation latency, by outcome.'.format(name),
+              '# TYPE {} histogram'.format(name)]
+    for op, outcome in keys:
+        data = snap[op][outcome]
+        for le, count in data['buckets']:
+            lines.append('{}_bucket{{{}}} {}'.format(
+                name, _labels(op=op, outcome=outcome, le=_float(le)), count))
+        labels = _labels(op=op, outcome=outcome)
+        lines.append('{}_sum{{{}}} {}'.format(name, labels,
+                                              _float(data['sum'])))
+        lines.append('{}_count{{{}}} {}'.format(name, labels, data['count']))
+    return '\n'.join(lines) + '\n'
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('enable', 'disable', 'reset', 'add_hook', 'remove_hook',
+           'record', 'measure', 'instrument', 'snapshot', 'prometheus',
+           'Histogram')
+
+#-------------------------------------------------------------------------------
@@ -0,0 +1,223 @@
+'''Pools of pre-created containers.
+'''
+import time
+import atexit
+import threading
+from six.moves import queue
+
+from .container import Container
+
+#-------------------------------------------------------------------------------
+# Constants
+
+CREATED = 'created'
+PAUSED = 'paused'
+
+RECYCLE = 'recycle'
+DISCARD = 'discard'
+
+POOL_OPTIONS = ('size', 'mode', 'policy', 'client')
+
+#-------------------------------------------------------------------------------
+# ContainerPool
+
+
+class ContainerPool(object):
+    '''Keeps up to ``size`` containers of a single spec ready for use.
+
+    Idle containers are either created but not started (mode='created'),
+    or started and then paused (mode='paused').  acquire() hands out a
+    running container; release() either recycles it (pausing it and
+    returning it to the pool, if there is room) or discards it, according to
+    ``policy``.  A background thread keeps the pool filled.
+    '''
+    def __init__(self, image, command='', **kwargs):
+        self.size = kwargs.pop('size', 2)
+        self.mode = kwargs.pop('mode', PAUSED)
+        self.policy = kwargs.pop('policy', DISCARD)
+        self.client = kwargs.pop('client', None)
+        self.error = None
+
+        if self.mode not in (CREATED, PAUSED):
+            raise ValueError('Invalid mode: {}'.format(self.mode))
+        if self.policy not in (RECYCLE, DISCARD):
+            raise ValueError('Invalid policy: {}'.format(self.policy))
+        if 'name' in kwargs:
+            raise ValueError('Pooled containers cannot share a name')
+
+        kwargs['detach'] = True
+        self.image = image
+        self.command = command
+        self.spec = kwargs
+
+        self._idle = queue.Queue()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._fill)
+        self._thread.daemon = True
+        self._thread.start()
+        self._wakeup.set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def idle(self):
+        return self._idle.qsize()
+
+    def matches(self, image, command='', **kwargs):
+        '''Whether the pool holds containers of the given spec (pool options
+        such as size and client are ignored).
+        '''
+        kwargs = {k: v for k, v in kwargs.items() if k not in POOL_OPTIONS}
+        kwargs.setdefault('detach', True)
+        return spec_key(image, command, **kwargs) == \
+            spec_key(self.image, self.command, **self.spec)
+
+    def _make(self):
+        c = Container(self.image, self.command, **self.spec)
+        if self.mode == CREATED:
+            c.create(client=self.client)
+            return c, CREATED
+
+        try:
+            c.run(client=self.client)
+            c.pause(client=self.client)
+        except Exception:
+            # The container is neither pooled nor handed out; don't leak it
+            if c.id is not None:
+                try:
+                    c.remove(client=self.client, force=True)
+                except Exception:
+                    pass
+            raise
+        return c, PAUSED
+
+    def _fill(self):
+        while not self._closed.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+
+            while not self._closed.is_set():
+                with self._lock:
+                    if self._idle.qsize() + self._pending >= self.size:
+                        break
+                    self._pending += 1
+                try:
+                    self._idle.put(self._make())
+                    self.error = None
+                except Exception as e:
+                    self.error = e
+                    self._closed.wait(1)
+                finally:
+                    with self._lock:
+                        self._pending -= 1
+
+    def acquire(self, **kwargs):
+        '''Return a running container, waiting up to ``timeout`` seconds for
+        an idle one before running a new one directly.
+        '''
+        timeout = kwargs.get('timeout', 0)
+        try:
+            c, state = self._idle.get(bool(timeout), timeout or None)
+        except queue.Empty:
+            c, state = Container(self.image, self.command, **self.spec), None
+        self._wakeup.set()
+
+        if state == CREATED:
+            c.start(client=self.client)
+        elif state == PAUSED:
+            c.unpause(client=self.client)
+        else:
+            c.run(client=self.client)
+        return c
+
+    def release(self, c):
+        if self.policy == RECYCLE and not self._closed.is_set():
+            with self._lock:
+                room = self._idle.qsize() + self._pending < self.size
+            status = c.refresh(client=self.client)
+            if room and status.running:
+                if not status.paused:
+                    c.pause(client=self.client)
+                self._idle.put((c, PAUSED))
+                return
+
+        c.remove(client=self.client)
+        self._wakeup.set()
+
+    def close(self):
+        '''Stop refilling and remove all idle containers.'''
+        self._closed.set()
+        self._wakeup.set()
+        self._thread.join()
+        while True:
+            try:
+                c, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            c.remove(client=self.client)
+
+    def wait_filled(self, timeout=None):
+        '''Block until the pool holds ``size`` idle containers.'''
+        deadline = None if timeout is None else time.time() + timeout
+        while self._idle.qsize() < self.size:
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+#-------------------------------------------------------------------------------
+# Pool registry
+
+POOLS = {} # (client, spec key) -> ContainerPool
+_POOLS_LOCK = threading.Lock()
+
+def spec_key(image, command='', **kwargs):
+    return (image, command, tuple(sorted((k, repr(v))
+                                         for k, v in kwargs.items())))
+
+def get_pool(image, command='', **kwargs):
+    '''Return the shared pool for this container spec and client, creating
+    it if necessary.  The other pool options (size, mode, policy) only take
+    effect on creation.  Shared pools are closed at exit (see
+    close_pools()).
+    '''
+    opts = {k: kwargs.pop(k) for k in POOL_OPTIONS if k in kwargs}
+    key = (opts.get('client'), spec_key(image, command, **kwargs))
+    with _POOLS_LOCK:
+        if key not in POOLS:
+            kwargs.update(opts)
+            POOLS[key] = ContainerPool(image, command, **kwargs)
+        return POOLS[key]
+
+@atexit.register
+def close_pools():
+    '''Close all shared pools, removing their idle containers.  Called
+    automatically at exit; later get_pool() calls create new pools.
+    '''
+    with _POOLS_LOCK:
+        pools = list(POOLS.values())
+        POOLS.clear()
+
+    error = None
+    for pool in pools:
+        try:
+            pool.close()
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        raise error
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('ContainerPool', 'get_pool', 'close_pools', 'CREATED', 'PAUSED',
+           'RECYCLE', 'DISCARD')
+
+#-------------------------------------------------------------------------------
@@ -0,0 +1,407 @@
+'''Readiness probing of containers.
+
+Port probes run as non-blocking connects on a single selector loop, so
+waiting for many services takes about as long as the slowest one.  Probes
+that need more than a TCP accept (HTTP, log output, exec) are provided as
+Probe subclasses.
+'''
+import re
+import time
+import errno
+import socket
+import threading
+from six.moves.http_client import HTTPConnection, HTTPException
+from syn.base import Base, Attr, init_hook
+from syn.five import STR, NUM
+from syn.type import List
+
+try:
+    import selectors
+except ImportError: # pragma: no cover
+    import selectors34 as selectors
+
+from .utils import UNREACHABLE, port_state
+from .group import refresh_status
+from .metrics import measure
+from .tracing import span, record
+
+INPROGRESS = frozenset([errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY])
+
+#-------------------------------------------------------------------------------
+# Target
+
+
+class Target(object):
+    '''A (container, port) pair being probed.'''
+    def __init__(self, container, port):
+        self.container = container
+        self.port = port
+        self.ready = False
+        self.attempts = 0
+        self.elapsed = None
+        self.error = None
+
+    def __repr__(self):
+        return '<Target {}:{} ready={}>'.format(self.container.name,
+                                                self.port, self.ready)
+
+    @property
+    def label(self):
+        return '{}:{}'.format(self.container.name, self.port)
+
+
+class ReadinessTimeout(RuntimeError):
+    def __init__(self, targets):
+        self.targets = targets
+        pending = [t.label for t in targets if not t.ready]
+        super(ReadinessTimeout, self).__init__('Timeout waiting for: ' +
+                                               ', '.join(pending))
+
+#-------------------------------------------------------------------------------
+# Probe loop
+
+
+class _Probe(object):
+    def __init__(self, target, deadline, delay):
+        self.target = target
+        self.deadline = deadline
+        self.delay = delay
+        self.next_time = 0.0
+        self.sock = None
+        self.connect_deadline = None
+        self.attempt_start = None
+
+    def close(self, selector):
+        if self.sock is not None:
+            selector.unregister(self.sock)
+            self.sock.close()
+            self.sock = None
+
+
+def _is_up(status):
+    return status.exists and status.running and not status.paused
+
+def _addr(status):
+    if _is_up(status) and status.ip_addr:
+        return status.ip_addr
+
+
+def wait_ready(targets, **kwargs):
+    '''Wait until every (container, port) target accepts TCP connections.
+
+    Keyword arguments:
+
+    * timeout: seconds each target is given to become ready (default: no
+      timeout)
+    * delay: initial delay between attempts on a target (default 0.05)
+    * max_delay: cap on the exponentially growing delay (default 1.0)
+    * backoff: delay growth factor (default 2)
+    * connect_timeout: seconds a single connect may take (default 1.0)
+    * on_ready: called with each Target as soon as it becomes ready
+    * raise_on_timeout: raise ReadinessTimeout if any target times out
+      (default True)
+    * client: passed through to status refreshes
+
+    Returns the list of Targets.
+    '''
+    timeout = kwargs.get('timeout', float('inf'))
+    delay = kwargs.get('delay', 0.05)
+    max_delay = kwargs.get('max_delay', 1.0)
+    backoff = kwargs.get('backoff', 2)
+    connect_timeout = kwargs.get('connect_timeout', 1.0)
+    on_ready = kwargs.get('on_ready', None)
+    raise_on_timeout = kwargs.get('raise_on_timeout', True)
+    client_kw = {k: kwargs[k] for k in ('client',) if k in kwargs}
+
+    targets = [t if isinstance(t, Target) else Target(*t) for t in targets]
+    start = time.time()
+    probes = [_Probe(t, start + timeout, delay) for t in targets]
+    active = set(probes)
+    selector = selectors.DefaultSelector()
+
+    def attempted(probe, now, outcome):
+        if probe.attempt_start is not None:
+            t = probe.target
+            record('connect', probe.attempt_start, now, 'probe',
+                   track=t.label, container=t.container.name, port=t.port,
+                   attempt=t.attempts, outcome=outcome)
+            probe.attempt_start = None
+
+    def retry(probe, now, error=None):
+        attempted(probe, now, 'retry' if error is None else
+                  errno.errorcode.get(error.errno, 'timeout'))
+        probe.close(selector)
+        probe.target.error = error
+        probe.next_time = now + probe.delay
+        probe.delay = min(probe.delay * backoff, max_delay)
+
+    def finish(probe, now):
+        attempted(probe, now, 'ready')
+        probe.close(selector)
+        probe.target.ready = True
+        probe.target.elapsed = now - start
+        active.discard(probe)
+        if on_ready is not None:
+            on_ready(probe.target)
+
+    try:
+        while active:
+            now = time.time()
+            for probe in list(active):
+                if probe.sock is None and now >= probe.deadline:
+                    active.discard(probe)
+                elif probe.sock is not None and now >= probe.connect_deadline:
+                    retry(probe, now, socket.timeout('connect timed out'))
+
+            due = [p for p in active
+                   if p.sock is None and now >= p.next_time]
+            stale = {p.target.container.name: p.target.container for p in due
+                     if p.target.container._status.expired(
+                             p.target.container.status_ttl)
+                     or not _addr(p.target.container._status)}
+            if stale:
+                refresh_status(list(stale.values()), **client_kw)
+                now = time.time()
+
+            for probe in due:
+                probe.target.attempts += 1
+                addr = _addr(probe.target.container._status)
+                if addr is None:
+                    # Not running (yet); force a fresh status next time
+                    probe.target.container._status.invalidate()
+                    retry(probe, now)
+                    continue
+
+                sock = socket.socket()
+                sock.setblocking(False)
+                probe.attempt_start = now
+                err = sock.connect_ex((addr, probe.target.port))
+                if err == 0:
+                    sock.close()
+                    finish(probe, now)
+                elif err in INPROGRESS:
+                    probe.sock = sock
+                    probe.connect_deadline = min(now + connect_timeout,
+                                                 probe.deadline)
+                    selector.register(sock, selectors.EVENT_WRITE, probe)
+                elif err in UNREACHABLE:
+                    sock.close()
+                    retry(probe, now, socket.error(err,
+                                                   errno.errorcode.get(err)))
+                else:
+                    sock.close()
+                    raise socket.error(err, errno.errorcode.get(err))
+
+            if not active:
+                break
+
+            now = time.time()
+            wake = min(p.connect_deadline if p.sock is not None
+                       else min(p.next_time, p.deadline) for p in active)
+            if selector.get_map():
+                events = selector.select(max(wake - now, 0))
+            else:
+                events = []
+                time.sleep(max(wake - now, 0))
+
+            now = time.time()
+            for key, _ in events:
+                probe = key.data
+                err = probe.sock.getsockopt(socket.SOL_SOCKET,
+                                            socket.SO_ERROR)
+                if err == 0:
+                    finish(probe, now)
+                elif err in UNREACHABLE:
+                    retry(probe, now, socket.error(err,
+                                                   errno.errorcode.get(err)))
+                else:
+                    raise socket.error(err, errno.errorcode.get(err))
+
+    finally:
+        for probe in probes:
+            probe.close(selector)
+        selector.close()
+
+    if raise_on_timeout and not all(t.ready for t in targets):
+        raise ReadinessTimeout(targets)
+    return targets
+
+#-------------------------------------------------------------------------------
+# Probes
+
+
+class Probe(Base):
+    '''Base class for readiness probes.  Subclasses implement check(),
+    a single attempt returning True once the container is ready.
+    '''
+    _attrs = dict(interval = Attr(NUM, 0.1, 'Seconds between attempts'),
+                  timeout = Attr(NUM, float('inf'), 
+                                 'Seconds before giving up'))
+    _opts = dict(init_validate = True,
+                 optional_none = True)
+
+    def check(self, container, **kwargs):
+        raise NotImplementedError
+
+    def wait(self, container, **kwargs):
+        timeout = min(self.timeout, kwargs.pop('timeout', float('inf')))
+        deadline = time.time() + timeout
+        attempt = 0
+        while True:
+            attempt += 1
+            with span('check', 'probe', container=container.name,
+                      probe=type(self).__name__, attempt=attempt):
+                if self.check(container, **kwargs):
+                    break
+            if time.time() + self.interval >= deadline:
+                raise ReadinessTimeout([Target(container, self)])
+            time.sleep(self.interval)
+
+
+class TCPProbe(Probe):
+    '''Ready once the port accepts connections.'''
+    _attrs = dict(port = Attr(int, doc='Port to connect to'),
+                  connect_timeout = Attr(NUM, 1.0, 'Timeout for a single '
+                                         'connection attempt'))
+    _opts = dict(args = ('port',))
+
+    def check(self, container, **kwargs):
+        addr = _addr(container.status)
+        if addr is None:
+            return False
+        return port_state(addr, self.port, self.connect_timeout) == 'open'
+
+    def wait(self, container, **kwargs):
+        timeout = min(self.timeout, kwargs.pop('timeout', float('inf')))
+        wait_ready([(container, self.port)], timeout=timeout, 
+                   delay=self.interval, 
+                   max_delay=max(self.interval, kwargs.pop('max_delay', 1.0)),
+                   connect_timeout=self.connect_timeout, **kwargs)
+
+
+class HTTPProbe(Probe):
+    '''Ready once a GET request returns one of the expected statuses.'''
+    _attrs = dict(port = Attr(int, doc='Port of the HTTP server'),
+                  path = Attr(STR, '/', 'Path to request'),
+                  status = Attr(List(int), [200], 'Acceptable status codes'),
+                  request_timeout = Attr(NUM, 1.0, 'Timeout for a single '
+                                         'request'))
+    _opts = dict(args = ('port', 'path'))
+
+    def check(self, container, **kwargs):
+        addr = _addr(container.status)
+        if addr is None:
+            return False
+
+        conn = HTTPConnection(addr, self.port, timeout=self.request_timeout)
+        try:
+            conn.request('GET', self.path)
+            return conn.getresponse().status in self.status
+        except (socket.error, HTTPException):
+            return False
+        finally:
+            conn.close()
+
+
+class LogProbe(Probe):
+    '''Ready once a line of container output matches the pattern.
+
+    The log stream is followed in a background thread, started on the first
+    check and closed when wait() returns or times out (or by close()).
+    '''
+    _attrs = dict(pattern = Attr(STR, doc='Regular expression to search for'),
+                  stdout = Attr(bool, True, 'Search stdout'),
+                  stderr = Attr(bool, True, 'Search stderr'))
+    _opts = dict(args = ('pattern',))
+
+    @init_hook
+    def _init_followers(self):
+        self._followers = {}
+        self._lock = threading.Lock()
+
+    def _follow(self, stream, matched):
+        regex = re.compile(self.pattern)
+        try:
+            for _, line in stream:
+                if regex.search(line.rstrip(b'\n').decode('utf-8',
+                                                          'replace')):
+                    matched.set()
+                    return
+        except Exception:
+            pass # The stream failed or was closed; check() follows again
+        finally:
+            stream.close()
+
+    def check(self, container, **kwargs):
+        client = container._client(kwargs)
+        key = (container.name, id(client))
+
+        with self._lock:
+            if key not in self._followers:
+                matched = threading.Event()
+                stream = container.logs(stdout=self.stdout,
+                                        stderr=self.stderr, follow=True,
+                                        client=client)
+                thread = threading.Thread(target=self._follow,
+                                          args=(stream, matched))
+                thread.daemon = True
+                thread.start()
+                self._followers[key] = (thread, matched, stream)
+            thread, matched, _ = self._followers[key]
+
+            if matched.is_set():
+                return True
+            if not thread.is_alive():
+                # Stream ended (e.g. container restarted); follow again
+                # next time
+                del self._followers[key]
+        return False
+
+    def close(self, container=None):
+        '''Close the log streams followed for container (default: all).
+        Matches already found are kept.
+        '''
+        with self._lock:
+            followers = []
+            for key in list(self._followers):
+                if container is None or key[0] == container.name:
+                    followers.append(self._followers[key])
+                    if not self._followers[key][1].is_set():
+                        del self._followers[key]
+        for thread, _, stream in followers:
+            stream.close()
+            thread.join(1.0)
+
+    def wait(self, container, **kwargs):
+        try:
+            super(LogProbe, self).wait(container, **kwargs)
+        finally:
+            self.close(container)
+
+
+class ExecProbe(Probe):
+    '''Ready once the command exits with the expected code when executed
+    in the container.
+    '''
+    _attrs = dict(cmd = Attr((STR, List(STR)), doc='Command to execute'),
+                  exit_code = Attr(int, 0, 'Expected exit code'))
+    _opts = dict(args = ('cmd',))
+
+    def check(self, container, **kwargs):
+        client = container._client(kwargs)
+        if not _is_up(container.status):
+            return False
+
+        exec_id = measure('exec_create', client.exec_create, container.name,
+                          self.cmd)
+        measure('exec_start', client.exec_start, exec_id)
+        info = measure('exec_inspect', client.exec_inspect, exec_id)
+        return info['ExitCode'] == self.exit_code
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('Target', 'ReadinessTimeout', 'wait_ready',
+           'Probe', 'TCPProbe', 'HTTPProbe', 'LogProbe', 'ExecProbe')
+
+#-------------------------------------------------------------------------------
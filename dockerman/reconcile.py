@@ -0,0 +1,231 @@
+'''Desired-state reconciliation of containers.
+
+Containers deployed through a Reconciler are labelled with the scope they
+belong to and a hash of their spec.  Reconciling a set of containers then
+needs a single label-filtered list call to find what exists, and only
+touches the containers that are missing, stopped, changed or no longer
+wanted.  Usage::
+
+    reconciler = Reconciler('myenv')
+    res = reconciler.apply(containers)
+    res.raise_for_errors()
+    print(res.plan.changes)
+'''
+import copy
+import json
+import hashlib
+from syn.base import Base, Attr
+
+from .base import get_client
+from .container import Container, CC
+from .fleet import FleetResult, apply_all
+from .metrics import measure
+from .tracing import span
+
+SCOPE_LABEL = 'dockerman.scope'
+SPEC_LABEL = 'dockerman.spec'
+
+CREATE = 'create'
+RECREATE = 'recreate'
+START = 'start'
+REMOVE = 'remove'
+
+#-------------------------------------------------------------------------------
+# Utilities
+
+def spec_hash(container):
+    '''Return the SHA-256 hex digest of the API arguments of container (a
+    Container or spec.ContainerSpec), excluding the reconciliation labels.
+
+    The image is compared by reference: rebuilding or pulling a new image
+    under the same tag does not change the hash.
+    '''
+    dct = container.marshal_args(CC)
+    labels = {k: v for k, v in (dct.get('labels') or {}).items()
+              if k not in (SCOPE_LABEL, SPEC_LABEL)}
+    dct.pop('labels', None)
+    if labels:
+        dct['labels'] = labels
+    data = json.dumps(dct, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+#-------------------------------------------------------------------------------
+# Plan
+
+
+class Plan(Base):
+    _attrs = dict(create = Attr(list, init=lambda self: list(),
+                                doc='Names of containers to create'),
+                  recreate = Attr(list, init=lambda self: list(),
+                                  doc='Names of containers whose spec '
+                                  'changed'),
+                  start = Attr(list, init=lambda self: list(),
+                               doc='Names of unchanged, stopped containers'),
+                  remove = Attr(list, init=lambda self: list(),
+                                doc='Names of containers of the scope that '
+                                'are no longer wanted'),
+                  unchanged = Attr(list, init=lambda self: list(),
+                                   doc='Names of containers left as they '
+                                   'are'))
+
+    @property
+    def changes(self):
+        '''Dict mapping the name of each container to act on to the action.
+        '''
+        ret = {}
+        for action in (CREATE, RECREATE, START, REMOVE):
+            ret.update((name, action) for name in getattr(self, action))
+        return ret
+
+    @property
+    def empty(self):
+        return not self.changes
+
+
+class ReconcileResult(FleetResult):
+    _attrs = dict(plan = Attr(Plan, init=lambda self: Plan(),
+                              doc='The plan that was applied'))
+
+#-------------------------------------------------------------------------------
+# Reconciler
+
+
+class Reconciler(object):
+    '''Brings the containers labelled with scope on a daemon in line with a
+    set of desired containers.
+    '''
+    def __init__(self, scope, client=None):
+        self.scope = scope
+        self.client = client
+
+    def actual(self, **kwargs):
+        '''Return a dict mapping the name of each container of the scope to
+        its container list entry.
+        '''
+        client = get_client(kwargs.get('client', self.client))
+        entries = measure('containers', client.containers, all=True,
+                          filters=dict(label='{}={}'.format(SCOPE_LABEL,
+                                                            self.scope)))
+        ret = {}
+        for entry in entries:
+            for name in entry.get('Names') or ():
+                ret[name.lstrip('/')] = entry
+        return ret
+
+    def plan(self, containers, **kwargs):
+        '''Compare containers (Containers or spec.ContainerSpecs) with the
+        containers of the scope, and return the Plan that reconciles them.
+        Containers must be detached: ValueError is raised otherwise.
+        '''
+        return self._plan(containers, self.actual(**kwargs))
+
+    def _plan(self, containers, actual):
+        ret = Plan()
+        names = set()
+        for c in containers:
+            if c.name in names:
+                raise ValueError('Duplicate container name: {}'.format(
+                    c.name))
+            if not c.detach:
+                # run() would block until the container exits
+                raise ValueError('Container {} is not detached'.format(
+                    c.name))
+            names.add(c.name)
+
+            entry = actual.get(c.name)
+            if entry is None:
+                ret.create.append(c.name)
+            elif (entry.get('Labels') or {}).get(SPEC_LABEL) != \
+                 spec_hash(c):
+                ret.recreate.append(c.name)
+            elif entry.get('State') not in ('running', 'paused',
+                                            'restarting'):
+                ret.start.append(c.name)
+            else:
+                ret.unchanged.append(c.name)
+
+        ret.remove.extend(sorted(name for name in actual
+                                 if name not in names))
+        return ret
+
+    def label(self, container):
+        '''Return a Container equivalent to container, labelled for this
+        scope.  container itself is left unchanged; if it is a Container,
+        the copy returned shares its status.
+        '''
+        if isinstance(container, Container):
+            ret = copy.copy(container)
+        else:
+            ret = container.container()
+        labels = dict(ret.labels or {})
+        labels[SCOPE_LABEL] = self.scope
+        labels[SPEC_LABEL] = spec_hash(ret)
+        ret.labels = labels
+        return ret
+
+    def apply(self, containers, **kwargs):
+        '''Reconcile the containers of the scope with containers, applying
+        the plan in parallel (see fleet.apply_all() for the max_workers and
+        fail_fast keyword arguments).  Changed containers are removed and
+        run again; orphans are removed.
+
+        Return a ReconcileResult whose results map the name of each
+        container acted on to the action taken, and whose plan is the plan
+        applied.
+
+        Containers with a client of their own are run through it; the
+        others, and orphans, through client (default: the reconciler's).
+        The scope is listed through client only, so it should not span
+        several daemons.
+        '''
+        client = get_client(kwargs.pop('client', self.client))
+        containers = list(containers)
+        actual = self.actual(client=client)
+        plan = self._plan(containers, actual)
+        changes = plan.changes
+        by_name = {c.name: c for c in containers}
+        targets = [self.label(by_name[name]) for name in
+                   plan.create + plan.recreate + plan.start]
+        for c in targets:
+            if c.client is None:
+                c.client = client
+        targets.extend(Container(actual[name]['Image'], name=name,
+                                 client=client)
+                       for name in plan.remove)
+
+        def reconcile(c):
+            action = changes[c.name]
+            if action in (RECREATE, REMOVE):
+                c.remove(force=True)
+            if action in (CREATE, RECREATE):
+                c.run()
+            elif action == START:
+                c.start()
+            return action
+
+        result = ReconcileResult(plan=plan)
+        if not targets:
+            return result
+        with span('reconcile', 'fleet', scope=self.scope,
+                  containers=len(containers), changes=len(changes)):
+            res = apply_all(targets, reconcile, **kwargs)
+        result.results.update(res.results)
+        result.errors.update(res.errors)
+        result.cancelled.extend(res.cancelled)
+        return result
+
+
+def reconcile(containers, scope, **kwargs):
+    '''Reconcile the containers labelled with scope with containers (see
+    Reconciler.apply()).
+    '''
+    return Reconciler(scope, kwargs.pop('client', None)).apply(containers,
+                                                              **kwargs)
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('Plan', 'ReconcileResult', 'Reconciler', 'reconcile',
+           'spec_hash')
+
+#-------------------------------------------------------------------------------
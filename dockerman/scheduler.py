@@ -0,0 +1,235 @@
+'''Placement of containers across several Docker hosts.
+
+Hosts are registered with a HostRegistry, each with optional capacity
+limits.  A Scheduler assigns each container to the least loaded host that
+can hold it and sets the container's client to that host's, so that every
+later operation on the container goes to the same daemon.  Usage::
+
+    hosts = HostRegistry()
+    hosts.register('a', 'tcp://10.0.0.1:2375', memory='16g')
+    hosts.register('b', 'tcp://10.0.0.2:2375', memory='16g')
+    scheduler = Scheduler(hosts)
+    apply_all(containers, scheduler.run)
+'''
+import threading
+
+from .base import ClientPool, DEFAULT_POOL_SIZE
+from .fleet import apply_all
+from .metrics import measure
+
+#-------------------------------------------------------------------------------
+# Utilities
+
+def _bytes(value):
+    from docker.utils import parse_bytes
+
+    if value is None:
+        return None
+    return int(parse_bytes(value))
+
+
+class SchedulingError(RuntimeError):
+    pass
+
+#-------------------------------------------------------------------------------
+# Host
+
+
+class Host(object):
+    '''A Docker daemon that containers can be placed on.
+
+    Capacity limits (each optional): max_containers, memory (bytes, or a
+    string such as '16g') and cpu_shares.  Containers without a mem_limit
+    or cpu_shares reserve none of that resource.
+    '''
+    def __init__(self, name, base_url=None, **kwargs):
+        self.name = name
+        self.base_url = base_url
+        self.client = kwargs.pop('client', None)
+        if self.client is None:
+            # Without a base_url, the configured default settings apply
+            settings = {} if base_url is None else dict(base_url=base_url)
+            self.client = ClientPool(size=kwargs.pop('pool_size',
+                                                     DEFAULT_POOL_SIZE),
+                                     **settings)
+        self.max_containers = kwargs.pop('max_containers', None)
+        self.memory = _bytes(kwargs.pop('memory', None))
+        self.cpu_shares = kwargs.pop('cpu_shares', None)
+        if kwargs:
+            raise TypeError('Invalid keyword arguments: {}'.format(
+                ', '.join(sorted(kwargs))))
+
+        self.placed = {}   # container name -> (memory, cpu_shares)
+        self.external = 0  # running containers not placed by dockerman
+
+    def __repr__(self):
+        return '<Host {} {}>'.format(self.name, self.base_url)
+
+    @property
+    def count(self):
+        return self.external + len(self.placed)
+
+    @property
+    def reserved_memory(self):
+        return sum(mem for mem, _ in self.placed.values())
+
+    @property
+    def reserved_cpu_shares(self):
+        return sum(cpu for _, cpu in self.placed.values())
+
+    def fits(self, memory=0, cpu_shares=0):
+        if self.max_containers is not None and \
+           self.count + 1 > self.max_containers:
+            return False
+        if self.memory is not None and \
+           self.reserved_memory + memory > self.memory:
+            return False
+        if self.cpu_shares is not None and \
+           self.reserved_cpu_shares + cpu_shares > self.cpu_shares:
+            return False
+        return True
+
+    def load(self, memory=0, cpu_shares=0):
+        '''The largest fraction of any limited resource that would be in use
+        after adding a container with the given reservations (0 if the host
+        has no limits).
+        '''
+        ratios = [0.0]
+        if self.max_containers:
+            ratios.append((self.count + 1) / float(self.max_containers))
+        if self.memory:
+            ratios.append((self.reserved_memory + memory) /
+                          float(self.memory))
+        if self.cpu_shares:
+            ratios.append((self.reserved_cpu_shares + cpu_shares) /
+                          float(self.cpu_shares))
+        return max(ratios)
+
+    def sync(self):
+        '''Count the running containers on the daemon that were not placed
+        here, so that they contribute to the load.
+        '''
+        running = measure('containers', self.client.containers)
+        names = set(name.lstrip('/') for entry in running
+                    for name in entry.get('Names') or ())
+        self.external = len(names - set(self.placed))
+
+#-------------------------------------------------------------------------------
+# HostRegistry
+
+
+class HostRegistry(object):
+    '''The set of hosts available for placement.'''
+    def __init__(self, hosts=()):
+        self.hosts = {}
+        self.lock = threading.RLock()
+        for host in hosts:
+            self.add(host)
+
+    def __iter__(self):
+        with self.lock:
+            return iter(sorted(self.hosts.values(), key=lambda h: h.name))
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def __getitem__(self, name):
+        return self.hosts[name]
+
+    def add(self, host):
+        with self.lock:
+            if host.name in self.hosts:
+                raise ValueError('Host already registered: {}'.format(
+                    host.name))
+            self.hosts[host.name] = host
+        return host
+
+    def register(self, name, base_url=None, **kwargs):
+        '''Create and add a Host (see Host for the keyword arguments).'''
+        return self.add(Host(name, base_url, **kwargs))
+
+    def unregister(self, name):
+        with self.lock:
+            host = self.hosts.pop(name)
+        if isinstance(host.client, ClientPool):
+            host.client.close()
+        return host
+
+    def sync(self):
+        '''Update the external container counts of all hosts.'''
+        apply_all(list(self), lambda host: host.sync()).raise_for_errors()
+
+#-------------------------------------------------------------------------------
+# Scheduler
+
+
+class Scheduler(object):
+    '''Places containers on the hosts of a registry by load.
+
+    A container is placed on the host with the lowest load() after
+    placement (ties broken by container count, then name) among those with
+    room for it.
+    '''
+    def __init__(self, registry):
+        self.registry = registry
+        self.placements = {} # container name -> Host
+
+    def _reservation(self, container):
+        return (_bytes(container.mem_limit) or 0,
+                container.cpu_shares or 0)
+
+    def host_of(self, container):
+        return self.placements.get(container.name)
+
+    def place(self, container):
+        '''Assign container to a host, returning the host.  Containers that
+        are already placed keep their host.
+        '''
+        with self.registry.lock:
+            host = self.placements.get(container.name)
+            if host is None:
+                memory, cpu_shares = self._reservation(container)
+                candidates = [h for h in self.registry
+                              if h.fits(memory, cpu_shares)]
+                if not candidates:
+                    raise SchedulingError('No host can hold {}'.format(
+                        container.name))
+
+                host = min(candidates, key=lambda h: (
+                    h.load(memory, cpu_shares), h.count, h.name))
+                host.placed[container.name] = (memory, cpu_shares)
+                self.placements[container.name] = host
+
+        container.client = host.client
+        return host
+
+    def release(self, container):
+        '''Free the container's reservation on its host.'''
+        with self.registry.lock:
+            host = self.placements.pop(container.name, None)
+            if host is not None:
+                host.placed.pop(container.name, None)
+        return host
+
+    def run(self, container, **kwargs):
+        '''Place and run container; if the run fails, the placement is
+        released.
+        '''
+        self.place(container)
+        try:
+            return container.run(**kwargs)
+        except Exception:
+            self.release(container)
+            raise
+
+    def remove(self, container, **kwargs):
+        '''Remove container and release its placement.'''
+        container.remove(**kwargs)
+        self.release(container)
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('Host', 'HostRegistry', 'Scheduler', 'SchedulingError')
+
+#-------------------------------------------------------------------------------
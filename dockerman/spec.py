@@ -0,0 +1,184 @@
+'''Lightweight container specs and statuses for large fleets.
+
+A ContainerTemplate is validated once, as a full Container.  ContainerSpecs
+derived from it store only their overrides (which are validated
+individually) and marshal to the same output as an equivalent Container.
+'''
+from uuid import uuid4
+from six import get_unbound_function
+
+from .container import Container, StatusMixin, CC, HC
+from .metrics import measure
+
+#-------------------------------------------------------------------------------
+# CompactStatus
+
+
+class CompactStatus(StatusMixin):
+    __slots__ = ('id', 'ip_addr', 'exists', 'running', 'paused', 'timestamp',
+                 'tracked')
+
+    def __init__(self):
+        self.tracked = False
+        self.reset()
+
+    def __eq__(self, other):
+        return all(getattr(self, attr) == getattr(other, attr)
+                   for attr in ('id', 'ip_addr', 'exists', 'running',
+                                'paused'))
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    __hash__ = None
+
+    def reset(self):
+        self.id = None
+        self.ip_addr = ''
+        self.exists = False
+        self.running = False
+        self.paused = False
+        self.timestamp = 0.0
+        self.tracked = False
+
+#-------------------------------------------------------------------------------
+# ContainerTemplate
+
+
+class ContainerTemplate(object):
+    '''Validated defaults shared by many ContainerSpecs.'''
+    __slots__ = ('values',)
+
+    def __init__(self, image, command=None, **kwargs):
+        c = Container(image, command, **kwargs)
+        self.values = {attr: getattr(c, attr) for attr in
+                       Container._marshal_attrs | {'status_ttl', 'client'}}
+        if 'name' not in kwargs:
+            del self.values['name']
+
+    def spec(self, **kwargs):
+        return ContainerSpec(self, **kwargs)
+
+#-------------------------------------------------------------------------------
+# ContainerSpec
+
+
+def _validate(attr, value):
+    attrs = Container._attrs
+    if attr not in attrs.types:
+        raise TypeError('Invalid attribute: {}'.format(attr))
+    if value is None and attr in attrs.optional:
+        return value
+
+    typ = attrs.types[attr]
+    if not typ.query(value):
+        value = typ.coerce(value)
+    if attr in attrs.call:
+        value = attrs.call[attr](value)
+
+    res, e = typ.query_exception(value)
+    if not res:
+        raise TypeError('Validation error for attribute {}: {}'.
+                        format(attr, e))
+    return value
+
+
+class ContainerSpec(object):
+    '''A container spec storing only its overrides of a ContainerTemplate.
+
+    Supports marshal_args(), status and refresh() like Container, as well as
+    bulk refreshes through group.refresh_status().  Use container() to obtain
+    a full Container for lifecycle operations.  Like that of a Container,
+    the client of a spec (default: that of its template) is used when none
+    is passed to a method.
+    '''
+    __slots__ = ('template', 'overrides', 'client', '_status', '_marshalled')
+    _marshal_plans = Container._marshal_plans
+    _marshal = get_unbound_function(Container._marshal)
+    _client = get_unbound_function(Container._client)
+
+    def __init__(self, template, **kwargs):
+        if 'name' not in kwargs and 'name' not in template.values:
+            kwargs['name'] = 'default-' + uuid4().hex
+
+        self.client = kwargs.pop('client', template.values['client'])
+        self.template = template
+        self.overrides = {attr: _validate(attr, value)
+                          for attr, value in kwargs.items()}
+        self._status = CompactStatus()
+        self._marshalled = {}
+
+    def __getattr__(self, attr):
+        if attr in ContainerSpec.__slots__:
+            raise AttributeError(attr)
+        if attr in self.overrides:
+            return self.overrides[attr]
+        try:
+            return self.template.values[attr]
+        except KeyError:
+            raise AttributeError(attr)
+
+    def __repr__(self):
+        return '<ContainerSpec {}>'.format(self.name)
+
+    def container(self):
+        '''Return an equivalent full Container.'''
+        kwargs = dict(self.template.values)
+        kwargs.update(self.overrides)
+        kwargs['client'] = self.client
+        kwargs = {attr: val for attr, val in kwargs.items()
+                  if val is not None}
+        c = Container(**kwargs)
+        for attr in CompactStatus.__slots__:
+            setattr(c._status, attr, getattr(self._status, attr))
+        return c
+
+    def evolve(self, **kwargs):
+        '''Return a new spec with additional overrides.'''
+        overrides = dict(self.overrides, client=self.client)
+        overrides.update(kwargs)
+        return ContainerSpec(self.template, **overrides)
+
+    def inspect(self, **kwargs):
+        client = self._client(kwargs)
+        dct = measure('inspect_container', client.inspect_container,
+                      self.name)
+        self._status.update(dct)
+        return dct
+
+    def marshal_args(self, group):
+        if group not in self._marshal_plans:
+            raise ValueError('Invalid group: {}'.format(group))
+
+        cache = self._marshalled
+        if group not in cache:
+            cache[group] = self._marshal(group)
+
+        ret = cache[group]
+        if group == CC:
+            return dict(ret, host_config=dict(ret['host_config']))
+        if group == HC:
+            return dict(ret)
+        return ret
+
+    def refresh(self, **kwargs):
+        from docker.errors import NotFound
+
+        try:
+            self.inspect(**kwargs)
+        except NotFound:
+            self._status.clear()
+        return self._status
+
+    @property
+    def status(self):
+        if self._status.expired(self.status_ttl):
+            self.refresh()
+        return self._status
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('CompactStatus', 'ContainerTemplate', 'ContainerSpec')
+
+#-------------------------------------------------------------------------------
@@ -0,0 +1,238 @@
+'''Dependency-ordered bring-up and teardown of groups of containers.
+
+A Stack knows which of its containers need which others: a container
+depends on the stack members it takes volumes from, and on any given
+explicitly.  Each container is started as soon as everything it depends on
+is up and ready (according to an optional readiness probe), so bringing up
+a stack takes about as long as its slowest chain of dependencies.
+Teardown runs in the reverse order.  Usage::
+
+    stack = Stack()
+    stack.add(Container('postgres', name='db'), ready=5432)
+    stack.add(Container('myapp', name='app'), depends_on=['db'],
+              ready=HTTPProbe(8080, '/health'))
+    stack.run().raise_for_errors()
+    ...
+    stack.remove()
+'''
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .fleet import FleetResult
+from .tracing import span
+
+#-------------------------------------------------------------------------------
+# Utilities
+
+
+class StackError(RuntimeError):
+    pass
+
+
+def _schedule(names, deps, func, **kwargs):
+    '''Call func(name) for each name on a thread pool, each once all of
+    deps[name] have succeeded.  Names whose dependencies fail (or, with
+    fail_fast, that are not yet started at the first error) are reported
+    as cancelled.
+    '''
+    max_workers = kwargs.get('max_workers', 10)
+    fail_fast = kwargs.get('fail_fast', False)
+
+    result = FleetResult()
+    remaining = {name: set(deps[name]) for name in names}
+    dependents = {name: [] for name in names}
+    for name in names:
+        for dep in deps[name]:
+            dependents[dep].append(name)
+
+    ready = [name for name in names if not remaining[name]]
+    futures = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while ready or futures:
+            for name in ready:
+                futures[executor.submit(func, name)] = name
+            ready = []
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures.pop(future)
+                if future.exception() is not None:
+                    result.errors[name] = future.exception()
+                    continue
+                result.results[name] = future.result()
+                for dependent in dependents[name]:
+                    remaining[dependent].discard(name)
+                    if not remaining[dependent]:
+                        ready.append(dependent)
+
+            if fail_fast and result.errors:
+                ready = []
+
+    result.cancelled.extend(name for name in names
+                            if name not in result.results
+                            and name not in result.errors)
+    if fail_fast:
+        result.raise_for_errors()
+    return result
+
+#-------------------------------------------------------------------------------
+# Stack
+
+
+class Stack(object):
+    '''Containers, keyed by name, with the dependencies between them.'''
+    def __init__(self, containers=()):
+        self.containers = OrderedDict()
+        self.depends_on = {} # name -> explicit dependencies
+        self.ready = {}      # name -> port or readiness.Probe
+        for container in containers:
+            self.add(container)
+
+    def __contains__(self, name):
+        return name in self.containers
+
+    def __getitem__(self, name):
+        return self.containers[name]
+
+    def __iter__(self):
+        return iter(self.containers.values())
+
+    def __len__(self):
+        return len(self.containers)
+
+    def add(self, container, depends_on=(), ready=None):
+        '''Add container, which additionally depends on the stack members
+        named in depends_on.  If ready (a port number or a readiness.Probe)
+        is given, dependents are only started once the container is ready.
+        '''
+        if container.name in self.containers:
+            raise StackError('Duplicate container name: {}'.format(
+                container.name))
+        self.containers[container.name] = container
+        self.depends_on[container.name] = list(depends_on)
+        if ready is not None:
+            self.ready[container.name] = ready
+        return container
+
+    def dependencies(self, name):
+        '''Names of the stack members that container name depends on.
+        volumes_from entries naming containers outside the stack are
+        assumed to exist already.
+        '''
+        container = self.containers[name]
+        deps = set()
+        for source in container.volumes_from or ():
+            source = source.split(':')[0]
+            if source in self.containers:
+                deps.add(source)
+        for dep in self.depends_on[name]:
+            if dep not in self.containers:
+                raise StackError('{} depends on unknown container {}'.format(
+                    name, dep))
+            deps.add(dep)
+        return deps
+
+    def graph(self):
+        '''Return a dict mapping each name to its set of dependencies.'''
+        return OrderedDict((name, self.dependencies(name))
+                           for name in self.containers)
+
+    def waves(self):
+        '''Return the names in topological waves: each wave only depends on
+        earlier ones.  Raises StackError if the dependencies have a cycle.
+        '''
+        graph = self.graph()
+        done = set()
+        ret = []
+        while len(done) < len(graph):
+            wave = [name for name, deps in graph.items()
+                    if name not in done and deps <= done]
+            if not wave:
+                raise StackError('Dependency cycle among: {}'.format(
+                    ', '.join(name for name in graph if name not in done)))
+            ret.append(wave)
+            done.update(wave)
+        return ret
+
+    def _reversed_graph(self):
+        graph = self.graph()
+        ret = OrderedDict((name, set()) for name in reversed(graph))
+        for name, deps in graph.items():
+            for dep in deps:
+                ret[dep].add(name)
+        return ret
+
+    def _bring_up(self, op, **kwargs):
+        self.waves() # Check for cycles
+        opts = {k: kwargs.pop(k) for k in ('max_workers', 'fail_fast')
+                if k in kwargs}
+        timeout = kwargs.pop('timeout', None)
+        poll_kw = {k: kwargs[k] for k in ('client',) if k in kwargs}
+        if timeout is not None:
+            poll_kw['timeout'] = timeout
+
+        def bring_up(name):
+            container = self.containers[name]
+            ret = getattr(container, op)(**kwargs)
+            probe = self.ready.get(name)
+            if probe is not None and container.detach:
+                container.poll(probe, **poll_kw)
+            return ret
+
+        with span('stack_' + op, 'stack', containers=len(self)):
+            return _schedule(list(self.containers), self.graph(), bring_up,
+                             **opts)
+
+    def _tear_down(self, op, **kwargs):
+        from docker.errors import NotFound
+
+        opts = {k: kwargs.pop(k) for k in ('max_workers', 'fail_fast')
+                if k in kwargs}
+
+        def tear_down(name):
+            try:
+                return getattr(self.containers[name], op)(**kwargs)
+            except NotFound:
+                return None
+
+        graph = self._reversed_graph()
+        with span('stack_' + op, 'stack', containers=len(self)):
+            return _schedule(list(graph), graph, tear_down, **opts)
+
+    def run(self, **kwargs):
+        '''Run the containers in dependency order, in parallel on at most
+        max_workers threads (default 10), returning a FleetResult.
+
+        Each container is run as soon as its dependencies have run and are
+        ready; the dependents of a container that fails are not run, and
+        are reported as cancelled.  timeout bounds each readiness wait.
+        Non-detached containers (e.g. one-off setup jobs) count as ready
+        once they exit successfully.  With fail_fast=True, nothing more is
+        started after the first error, and FleetError is raised.
+        '''
+        return self._bring_up('run', **kwargs)
+
+    def start(self, **kwargs):
+        '''Start the (existing) containers in dependency order (see run()).
+        '''
+        return self._bring_up('start', **kwargs)
+
+    def stop(self, **kwargs):
+        '''Stop the containers in reverse dependency order: each container
+        is stopped once all of its dependents have been.  The dependencies
+        of a container that fails to stop are left running.
+        '''
+        return self._tear_down('stop', **kwargs)
+
+    def remove(self, **kwargs):
+        '''Remove the containers in reverse dependency order (see stop()).
+        Containers that do not exist are skipped.
+        '''
+        return self._tear_down('remove', **kwargs)
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('Stack', 'StackError')
+
+#-------------------------------------------------------------------------------
@@ -0,0 +1,302 @@
+'''Streaming of container output.
+
+The daemon multiplexes stdout and stderr of non-TTY containers into frames
+of an 8-byte header (stream id, 3 padding bytes, big-endian payload length)
+followed by the payload.  Frames are parsed in place from a single
+reusable buffer; only payloads are copied out.  Memory use is bounded by
+the largest frame and ``max_line`` (for line splitting), however long the
+stream runs.
+'''
+import time
+import socket
+import struct
+import calendar
+import threading
+from datetime import datetime
+from collections import deque
+
+from .metrics import measure
+
+STDIN = 0
+STDOUT = 1
+STDERR = 2
+
+HEADER = struct.Struct('>BxxxL')
+CHUNK_SIZE = 8192
+MAX_LINE = 65536
+
+#-------------------------------------------------------------------------------
+# Parsing
+
+def demux(chunks):
+    '''Generate (stream, payload) pairs from the raw bytes of a multiplexed
+    stream, given as an iterable of chunks of any size.
+    '''
+    buf = bytearray()
+    pos = 0
+    for chunk in chunks:
+        buf += chunk
+        view = memoryview(buf)
+        try:
+            while len(buf) - pos >= HEADER.size:
+                stream, length = HEADER.unpack_from(buf, pos)
+                end = pos + HEADER.size + length
+                if len(buf) < end:
+                    break
+                yield stream, view[pos + HEADER.size:end].tobytes()
+                pos = end
+        finally:
+            view.release()
+
+        # Drop consumed bytes once they make up most of the buffer
+        if pos and pos >= len(buf) // 2:
+            del buf[:pos]
+            pos = 0
+
+def raw(chunks, stream=STDOUT):
+    '''Generate (stream, chunk) pairs from a TTY (non-multiplexed) stream.'''
+    for chunk in chunks:
+        if chunk:
+            yield stream, chunk
+
+def split_lines(frames, max_line=MAX_LINE):
+    '''Generate (stream, line) pairs from (stream, data) pairs, keeping
+    partial lines of each stream separately.  Lines keep their trailing
+    newline; lines longer than max_line are emitted in pieces.
+    '''
+    partial = {}
+    for stream, data in frames:
+        buf = partial.get(stream, b'') + data
+        start = 0
+        while True:
+            end = buf.find(b'\n', start)
+            if end < 0:
+                break
+            yield stream, buf[start:end + 1]
+            start = end + 1
+
+        rest = buf[start:]
+        while len(rest) >= max_line:
+            yield stream, rest[:max_line]
+            rest = rest[max_line:]
+        partial[stream] = rest
+
+    for stream in sorted(partial):
+        if partial[stream]:
+            yield stream, partial[stream]
+
+def timestamp(since):
+    '''Convert a datetime (naive ones are taken as UTC) or number to Unix
+    time.
+    '''
+    if isinstance(since, datetime):
+        if since.tzinfo is not None:
+            since = since.replace(tzinfo=None) - since.utcoffset()
+        return calendar.timegm(since.timetuple()) + \
+            since.microsecond / 1e6
+    return since
+
+#-------------------------------------------------------------------------------
+# LogStream
+
+
+class LogStream(object):
+    '''Iterable of (stream, data) pairs read from a logs (or exec)
+    response.  close() may be called from another thread to stop a
+    following reader.
+
+    If follow is True, the socket timeout is disabled, as output may be
+    arbitrarily far apart.
+    '''
+    def __init__(self, response, tty=False, lines=True, max_line=MAX_LINE,
+                 chunk_size=CHUNK_SIZE, follow=False):
+        self.response = response
+        if follow:
+            sock = _socket(response)
+            if sock is not None:
+                sock.settimeout(None)
+        self.tty = tty
+        self.lines = lines
+        self.max_line = max_line
+        self.chunk_size = chunk_size
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _chunks(self):
+        try:
+            for chunk in self.response.raw.stream(self.chunk_size,
+                                                  decode_content=False):
+                yield chunk
+        except Exception:
+            if not self.closed:
+                raise
+
+    def __iter__(self):
+        frames = raw(self._chunks()) if self.tty else demux(self._chunks())
+        if self.lines:
+            frames = split_lines(frames, self.max_line)
+        try:
+            for item in frames:
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            # Closing the response alone does not wake a reader blocked in
+            # another thread
+            sock = _socket(self.response)
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+            self.response.close()
+
+
+def _socket(response):
+    fp = getattr(response.raw, '_fp', None)
+    fp = getattr(fp, 'fp', None)
+    for obj in (getattr(fp, 'raw', None), fp):
+        sock = getattr(obj, '_sock', None)
+        if sock is not None:
+            return sock
+    return None
+
+#-------------------------------------------------------------------------------
+# ExecResult
+
+
+class ExecResult(object):
+    '''The output and exit code of a command run by Container.execute().
+
+    Iterating yields the (stream, data) pairs of the output as they are
+    produced.  Output that has not been iterated over when collect() is
+    called (or exit_code is accessed) is accumulated in stdout and stderr.
+    '''
+    def __init__(self, client, exec_id, output):
+        self.client = client
+        self.exec_id = exec_id
+        self.output = output
+        self.stdout = b''
+        self.stderr = b''
+        self._iter = iter(output)
+        self._exit_code = None
+
+    def __repr__(self):
+        return '<ExecResult {} exit_code={}>'.format(self.exec_id[:12],
+                                                     self._exit_code)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iter)
+    next = __next__
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def collect(self):
+        '''Read the remaining output into stdout and stderr.'''
+        out, err = [self.stdout], [self.stderr]
+        for stream, data in self._iter:
+            (err if stream == STDERR else out).append(data)
+        self.stdout = b''.join(out)
+        self.stderr = b''.join(err)
+        return self
+
+    @property
+    def exit_code(self):
+        '''The exit code, waiting for the command to finish.'''
+        if self._exit_code is None:
+            self.collect()
+            info = measure('exec_inspect', self.client.exec_inspect,
+                           self.exec_id)
+            self._exit_code = info['ExitCode']
+        return self._exit_code
+
+    def close(self):
+        '''Stop reading the output (the command keeps running).'''
+        self.output.close()
+
+#-------------------------------------------------------------------------------
+# LogTail
+
+
+class LogTail(object):
+    '''Follows a container's output on a background thread, keeping only
+    the last ``n`` lines.
+
+    stream is a LogStream (see Container.tail()).  lines() returns a
+    snapshot of the buffered (stream, line) pairs without blocking.
+    '''
+    def __init__(self, stream, n=100):
+        self.stream = stream
+        self.buffer = deque(maxlen=n)
+        self.count = 0
+        self.error = None
+        self._thread = threading.Thread(target=self._follow)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _follow(self):
+        try:
+            for item in self.stream:
+                self.buffer.append(item)
+                self.count += 1
+        except Exception as e:
+            self.error = e
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def lines(self, stream=None):
+        '''Return the buffered lines, optionally only those of one stream.'''
+        items = list(self.buffer)
+        if stream is None:
+            return items
+        return [item for item in items if item[0] == stream]
+
+    def text(self, stream=None, encoding='utf-8'):
+        return b''.join(line for _, line in self.lines(stream)).decode(
+            encoding, 'replace')
+
+    def wait(self, count, timeout=None):
+        '''Block until at least count lines have been read in total, or the
+        stream ends; return whether count was reached.
+        '''
+        deadline = None if timeout is None else time.time() + timeout
+        while self.count < count and self.running:
+            if deadline is not None and time.time() >= deadline:
+                break
+            time.sleep(0.01)
+        return self.count >= count
+
+    def stop(self, timeout=None):
+        self.stream.close()
+        self._thread.join(timeout)
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('STDOUT', 'STDERR', 'demux', 'split_lines', 'LogStream',
+           'ExecResult', 'LogTail')
+
+#-------------------------------------------------------------------------------
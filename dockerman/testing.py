@@ -0,0 +1,737 @@
+'''A local stand-in for the Docker daemon, for tests and benchmarks.
+
+FakeDaemon serves the subset of the Docker Engine API used by dockerman
+over a unix socket, keeping containers, images and execs in memory.
+Latency can be added per endpoint to approximate a real (or remote)
+daemon.  Usage::
+
+    with FakeDaemon(latency=dict(create=0.01)) as daemon:
+        c = Container('ubuntu', 'sleep 10', detach=True)
+        c.run(client=daemon.client())
+'''
+import io
+import os
+import re
+import copy
+import json
+import time
+import base64
+import shutil
+import socket
+import struct
+import tarfile
+import tempfile
+import threading
+import posixpath
+from uuid import uuid4
+from six import string_types
+from six.moves import socketserver, BaseHTTPServer
+from six.moves.urllib.parse import urlparse, parse_qs
+
+import docker
+
+#-------------------------------------------------------------------------------
+# Routes
+
+# (method, path regex, endpoint name)
+ROUTES = [('GET', r'/_ping$', 'ping'),
+          ('GET', r'/version$', 'version'),
+          ('GET', r'/events$', 'events'),
+          ('GET', r'/containers/json$', 'list'),
+          ('POST', r'/containers/create$', 'create'),
+          ('GET', r'/containers/(?P<id>[^/]+)/json$', 'inspect'),
+          ('GET', r'/containers/(?P<id>[^/]+)/logs$', 'logs'),
+          ('POST', r'/containers/(?P<id>[^/]+)/start$', 'start'),
+          ('POST', r'/containers/(?P<id>[^/]+)/stop$', 'stop'),
+          ('POST', r'/containers/(?P<id>[^/]+)/restart$', 'restart'),
+          ('POST', r'/containers/(?P<id>[^/]+)/kill$', 'kill'),
+          ('POST', r'/containers/(?P<id>[^/]+)/pause$', 'pause'),
+          ('POST', r'/containers/(?P<id>[^/]+)/unpause$', 'unpause'),
+          ('POST', r'/containers/(?P<id>[^/]+)/wait$', 'wait'),
+          ('POST', r'/containers/(?P<id>[^/]+)/exec$', 'exec_create'),
+          ('DELETE', r'/containers/(?P<id>[^/]+)$', 'remove'),
+          ('GET', r'/containers/(?P<id>[^/]+)/archive$', 'get_archive'),
+          ('PUT', r'/containers/(?P<id>[^/]+)/archive$', 'put_archive'),
+          ('POST', r'/exec/(?P<id>[^/]+)/start$', 'exec_start'),
+          ('GET', r'/exec/(?P<id>[^/]+)/json$', 'exec_inspect'),
+          ('POST', r'/build$', 'build'),
+          ('GET', r'/images/json$', 'images'),
+          ('POST', r'/images/create$', 'pull'),
+          ('GET', r'/images/(?P<id>.+)/json$', 'inspect_image'),
+          ('DELETE', r'/images/(?P<id>.+)$', 'remove_image')]
+ROUTES = [(method, re.compile(regex), name) for method, regex, name in ROUTES]
+VERSION_PREFIX = re.compile(r'^/v[0-9.]+')
+
+API_VERSION = docker.constants.DEFAULT_DOCKER_API_VERSION
+
+#-------------------------------------------------------------------------------
+# Errors
+
+
+class APIError(Exception):
+    def __init__(self, code, message):
+        super(APIError, self).__init__(message)
+        self.code = code
+        self.message = message
+
+def _not_found(kind, name):
+    return APIError(404, 'No such {}: {}'.format(kind, name))
+
+def _image_key(image):
+    if ':' in image.rsplit('/', 1)[-1] or '@' in image:
+        return image
+    return image + ':latest'
+
+def _frame(stream, data):
+    return struct.pack('>BxxxL', stream, len(data)) + data
+
+def _dir_info(path):
+    info = tarfile.TarInfo(path)
+    info.type = tarfile.DIRTYPE
+    info.mode = 0o755
+    info.mtime = int(time.time())
+    return info
+
+#-------------------------------------------------------------------------------
+# Request handler
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections.add(self.connection)
+
+    def finish(self):
+        self.server.connections.discard(self.connection)
+        BaseHTTPServer.BaseHTTPRequestHandler.finish(self)
+
+    def log_message(self, *args):
+        pass
+
+    def address_string(self):
+        return 'unix'
+
+    def _route(self, method):
+        url = urlparse(self.path)
+        path = VERSION_PREFIX.sub('', url.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        for meth, regex, name in ROUTES:
+            match = regex.match(path)
+            if meth == method and match:
+                return name, match.groupdict(), query
+        return None, {}, query
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        data = self.rfile.read(length) if length else b''
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            data = b''
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if not size:
+                    self.rfile.readline()
+                    break
+                data += self.rfile.read(size)
+                self.rfile.readline()
+        if data and 'json' in (self.headers.get('Content-Type') or ''):
+            return json.loads(data.decode('utf-8'))
+        return data
+
+    def _send(self, code, body=None, content_type='application/json',
+              headers=None):
+        if body is None:
+            data = b''
+        elif isinstance(body, bytes):
+            data = body
+        else:
+            data = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        if data:
+            self.send_header('Content-Type', content_type)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, chunks, content_type='application/json',
+                     headers=None):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for chunk in chunks:
+            if not isinstance(chunk, bytes):
+                chunk = (json.dumps(chunk) + '\n').encode('utf-8')
+            if chunk:
+                self.wfile.write('{:x}\r\n'.format(len(chunk)).encode('ascii')
+                                 + chunk + b'\r\n')
+                self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _send_chunks(self, *args):
+        try:
+            self._send_stream(*args)
+        except socket.error:
+            # The client went away, e.g. by closing a followed log stream
+            self.close_connection = True
+
+    def _handle(self, method):
+        daemon = self.server.daemon
+        name, params, query = self._route(method)
+        body = self._body()
+        if name is None:
+            self._send(404, {'message': 'page not found'})
+            return
+
+        daemon.requests.append((name, method, self.path))
+        delay = daemon.latency.get(name, daemon.latency.get('*', 0))
+        if delay:
+            time.sleep(delay)
+
+        try:
+            result = getattr(daemon, 'api_' + name)(body=body, query=query,
+                                                    **params)
+        except APIError as e:
+            self._send(e.code, {'message': e.message})
+            return
+
+        code, payload = result[:2]
+        if code == 'stream':
+            self._send_chunks(payload, *result[2:])
+        else:
+            self._send(code, payload, *result[2:])
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, *args, **kwargs):
+        socketserver.UnixStreamServer.__init__(self, *args, **kwargs)
+        self.connections = set()
+
+    def close_connections(self):
+        for conn in list(self.connections):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+#-------------------------------------------------------------------------------
+# FakeDaemon
+
+
+class FakeDaemon(object):
+    '''An in-memory Docker daemon listening on a unix socket.
+
+    Keyword arguments:
+
+    * latency: dict mapping endpoint names (see ROUTES) to seconds of delay
+      added to each request; the key '*' sets a default
+    * images: images that exist locally; others are "pulled" on request
+      (default: any image exists)
+    * registry: images that can be pulled; pulling others fails with 404
+      (default: any image can be pulled)
+    * ip_addr: address reported for every running container (default
+      127.0.0.1, so that readiness probes can target local listeners)
+    * exit_code: exit code reported by wait() and exec inspection
+    * logs: list of (stream, bytes) pairs with which each container's
+      output starts, where stream is 1 (stdout) or 2 (stderr); more can be
+      added with write_log()
+    * execs: callable run for each exec as execs(container_name, cmd),
+      returning (exit_code, output) where output is a list of (stream,
+      bytes) pairs (default: exit_code and logs)
+    * path: path of the unix socket (default: in a new temporary directory)
+    '''
+    def __init__(self, **kwargs):
+        self.path = kwargs.get('path', None)
+        self.latency = dict(kwargs.get('latency', {}))
+        images = kwargs.get('images', None)
+        self.images = None if images is None else \
+                      set(_image_key(i) for i in images)
+        registry = kwargs.get('registry', None)
+        self.registry = None if registry is None else \
+                        set(_image_key(i) for i in registry)
+        self.ip_addr = kwargs.get('ip_addr', '127.0.0.1')
+        self.exit_code = kwargs.get('exit_code', 0)
+        self.log_chunks = list(kwargs.get('logs', []))
+        self.exec_handler = kwargs.get('execs', None)
+
+        self.containers = {}
+        self.execs = {}
+        self.events = []
+        self.requests = []
+        self.output = {} # container id -> [(stream, bytes, time)]
+        self.files = {} # container id -> {path: (TarInfo, bytes)}
+        self.labels = {} # image -> labels
+        self.builds = []
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+
+        self._dir = None
+        self._server = None
+        self._thread = None
+        self._stopping = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def base_url(self):
+        return 'unix://' + self.path
+
+    def client(self, **kwargs):
+        '''Return an APIClient connected to this daemon.'''
+        kwargs.setdefault('version', API_VERSION)
+        return docker.APIClient(base_url=self.base_url, **kwargs)
+
+    def start(self):
+        if self.path is None:
+            self._dir = tempfile.mkdtemp(prefix='dockerman-')
+            self.path = os.path.join(self._dir, 'docker.sock')
+        self._server = Server(self.path, Handler)
+        self._server.daemon = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs=dict(poll_interval=0.05))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            with self.lock:
+                self._stopping = True
+                self.changed.notify_all()
+            self._server.shutdown()
+            self._server.server_close()
+            self._server.close_connections()
+            self._thread.join()
+            if self._dir is not None:
+                shutil.rmtree(self._dir, ignore_errors=True)
+                self._dir = self.path = None
+            else:
+                os.remove(self.path)
+            self._server = None
+            self._stopping = False
+
+    def count(self, name):
+        '''Number of requests served for endpoint name.'''
+        return sum(1 for req in list(self.requests) if req[0] == name)
+
+    def write_log(self, ident, stream, data):
+        '''Append data to the output of a container, as if written to stream
+        (1 or 2), waking any followers.
+        '''
+        with self.lock:
+            c = self._lookup(ident)
+            self.output[c['Id']].append((stream, data, time.time()))
+            self.changed.notify_all()
+
+    # Container state
+
+    def _lookup(self, ident):
+        with self.lock:
+            ident = ident.lstrip('/')
+            for c in self.containers.values():
+                if c['Name'] == '/' + ident:
+                    return c
+            if ident in self.containers:
+                return self.containers[ident]
+            for cid, c in self.containers.items():
+                if cid.startswith(ident):
+                    return c
+        raise _not_found('container', ident)
+
+    def _event(self, c, action):
+        now = time.time()
+        self.events.append(dict(Type='container', Action=action,
+                                status=action, id=c['Id'],
+                                **{'from': c['Config']['Image'],
+                                   'time': int(now),
+                                   'timeNano': int(now * 1e9),
+                                   'Actor': dict(ID=c['Id'], Attributes=dict(
+                                       name=c['Name'][1:],
+                                       image=c['Config']['Image']))}))
+
+    def _set_state(self, c, status, **kwargs):
+        state = c['State']
+        state.update(Status=status, Running=status in ('running', 'paused'),
+                     Paused=status == 'paused', **kwargs)
+        ip_addr = self.ip_addr if state['Running'] else ''
+        net = c['NetworkSettings']
+        net['IPAddress'] = ip_addr
+        net['Networks']['bridge']['IPAddress'] = ip_addr
+        self.changed.notify_all()
+
+    def _summary(self, c):
+        net = c['NetworkSettings']
+        return dict(Id=c['Id'], Names=[c['Name']], Image=c['Config']['Image'],
+                    Command=' '.join(c['Config']['Cmd'] or []),
+                    Labels=c['Config']['Labels'], State=c['State']['Status'],
+                    Status=c['State']['Status'],
+                    NetworkSettings=dict(Networks=dict(bridge=dict(
+                        IPAddress=net['Networks']['bridge']['IPAddress']))))
+
+    def _filters(self, query):
+        filters = json.loads(query.get('filters', '{}'))
+        for key, values in list(filters.items()):
+            if isinstance(values, dict):
+                filters[key] = values = [v for v, on in values.items() if on]
+            if key == 'name':
+                filters[key] = re.compile('|'.join('(?:{})'.format(v)
+                                                   for v in values))
+        return filters
+
+    def _matches(self, c, filters):
+        for key, values in filters.items():
+            if key == 'name':
+                ok = values.search(c['Name'])
+            elif key == 'id':
+                ok = any(c['Id'].startswith(v) for v in values)
+            elif key == 'status':
+                ok = c['State']['Status'] in values
+            elif key == 'label':
+                labels = c['Config']['Labels']
+                ok = all(labels.get(k) == v if sep else k in labels
+                         for k, sep, v in (l.partition('=') for l in values))
+            elif key == 'ancestor':
+                ok = c['Config']['Image'] in values
+            else:
+                ok = True
+            if not ok:
+                return False
+        return True
+
+    # Endpoints
+
+    def api_ping(self, **kwargs):
+        return 200, b'OK', 'text/plain'
+
+    def api_version(self, **kwargs):
+        return 200, dict(ApiVersion=API_VERSION, Version='fake',
+                         MinAPIVersion='1.12', Os='linux')
+
+    def api_events(self, query, **kwargs):
+        since = float(query.get('since', 0))
+        until = float(query.get('until', 0)) or None
+        if until is not None:
+            time.sleep(max(min(until - time.time(), 1.0), 0))
+        types = self._filters(query).get('type', None)
+        with self.lock:
+            events = [e for e in self.events if e['time'] >= since and
+                      (until is None or e['time'] <= until) and
+                      (not types or e['Type'] in types)]
+        return 'stream', events
+
+    def api_list(self, query, **kwargs):
+        show_all = query.get('all', '0') not in ('0', 'false', 'False')
+        filters = self._filters(query)
+        with self.lock:
+            return 200, [self._summary(c) for c in self.containers.values()
+                         if (show_all or c['State']['Running'])
+                         and self._matches(c, filters)]
+
+    def api_create(self, body, query, **kwargs):
+        image = body['Image']
+        if self.images is not None and _image_key(image) not in self.images:
+            raise _not_found('image', image)
+
+        name = query.get('name', None) or uuid4().hex[:12]
+        cmd = body.get('Cmd', None)
+        if isinstance(cmd, string_types):
+            cmd = cmd.split()
+        cid = uuid4().hex + uuid4().hex
+        c = dict(Id=cid, Name='/' + name, Created=time.time(), Image=image,
+                 Config=dict(Image=image, Cmd=cmd, Tty=body.get('Tty', False),
+                             Env=body.get('Env', None),
+                             Labels=body.get('Labels', None) or {}),
+                 HostConfig=body.get('HostConfig', None) or {},
+                 State=dict(ExitCode=0),
+                 NetworkSettings=dict(IPAddress='', Networks=dict(
+                     bridge=dict(IPAddress=''))))
+        with self.lock:
+            if any(o['Name'] == c['Name'] for o in self.containers.values()):
+                raise APIError(409, 'Conflict. The container name "{}" is '
+                               'already in use'.format(c['Name']))
+            self._set_state(c, 'created')
+            self.containers[cid] = c
+            self.output[cid] = [(stream, data, c['Created'])
+                                for stream, data in self.log_chunks]
+            self.files[cid] = {path: (_dir_info(path), b'')
+                               for path in ('/', '/tmp')}
+            self._event(c, 'create')
+        return 201, dict(Id=cid, Warnings=None)
+
+    def api_inspect(self, id, **kwargs):
+        with self.lock:
+            return 200, self._lookup(id)
+
+    def api_logs(self, id, query, **kwargs):
+        c = self._lookup(id)
+        streams = set()
+        if query.get('stdout', '0') not in ('0', 'false', 'False'):
+            streams.add(1)
+        if query.get('stderr', '0') not in ('0', 'false', 'False'):
+            streams.add(2)
+        since = float(query.get('since', 0))
+        tail = query.get('tail', 'all')
+        tty = c['Config']['Tty']
+
+        def render(entries):
+            return [data if tty else _frame(stream, data)
+                    for stream, data, t in entries
+                    if stream in streams and t >= since]
+
+        with self.lock:
+            entries = self.output[c['Id']]
+            seen = len(entries)
+            chunks = render(entries)
+        if tail != 'all':
+            chunks = chunks[len(chunks) - int(tail):] if int(tail) else []
+
+        ctype = 'application/vnd.docker.raw-stream'
+        if query.get('follow', '0') in ('0', 'false', 'False'):
+            return 200, b''.join(chunks), ctype
+        return 'stream', self._follow(c, seen, chunks, render), ctype
+
+    def _follow(self, c, seen, chunks, render):
+        for chunk in chunks:
+            yield chunk
+        while True:
+            with self.lock:
+                entries = self.output.get(c['Id'], ())
+                while len(entries) == seen and c['State']['Running'] and \
+                      c['Id'] in self.containers and not self._stopping:
+                    self.changed.wait(1.0)
+                new = entries[seen:]
+                seen = len(entries)
+                done = not new
+            if done:
+                return
+            for chunk in render(new):
+                yield chunk
+
+    def _transition(self, id, allowed, status, action, **state):
+        with self.lock:
+            c = self._lookup(id)
+            if c['State']['Status'] not in allowed:
+                raise APIError(409, 'Container {} is {}'.format(
+                    id, c['State']['Status']))
+            self._set_state(c, status, **state)
+            self._event(c, action)
+        return 204, None
+
+    def api_start(self, id, **kwargs):
+        with self.lock:
+            if self._lookup(id)['State']['Status'] == 'running':
+                return 304, None
+            return self._transition(id, ('created', 'exited'), 'running',
+                                    'start', StartedAt=time.time())
+
+    def api_stop(self, id, **kwargs):
+        with self.lock:
+            c = self._lookup(id)
+            if c['State']['Status'] in ('created', 'exited'):
+                return 304, None
+            self._event(c, 'kill')
+            return self._transition(id, ('running', 'paused'), 'exited',
+                                    'die', ExitCode=self.exit_code)
+    api_kill = api_stop
+
+    def api_restart(self, id, **kwargs):
+        self.api_stop(id)
+        return self.api_start(id)
+
+    def api_pause(self, id, **kwargs):
+        return self._transition(id, ('running',), 'paused', 'pause')
+
+    def api_unpause(self, id, **kwargs):
+        return self._transition(id, ('paused',), 'running', 'unpause')
+
+    def api_wait(self, id, **kwargs):
+        with self.lock:
+            c = self._lookup(id)
+            if c['State']['Running']:
+                self._set_state(c, 'exited', ExitCode=self.exit_code)
+                self._event(c, 'die')
+            return 200, dict(StatusCode=c['State']['ExitCode'])
+
+    def api_remove(self, id, query, **kwargs):
+        force = query.get('force', '0') not in ('0', 'false', 'False')
+        with self.lock:
+            c = self._lookup(id)
+            if c['State']['Running'] and not force:
+                raise APIError(409, 'You cannot remove a running container')
+            del self.containers[c['Id']]
+            del self.output[c['Id']]
+            del self.files[c['Id']]
+            self._event(c, 'destroy')
+            self.changed.notify_all()
+        return 204, None
+
+    def api_exec_create(self, id, body, **kwargs):
+        c = self._lookup(id)
+        if not c['State']['Running']:
+            raise APIError(409, 'Container {} is not running'.format(id))
+        eid = uuid4().hex
+        with self.lock:
+            self.execs[eid] = dict(ID=eid, ContainerID=c['Id'], Running=False,
+                                   ExitCode=None, Cmd=body.get('Cmd'),
+                                   Name=c['Name'][1:])
+        return 201, dict(Id=eid)
+
+    def api_exec_start(self, id, body, **kwargs):
+        with self.lock:
+            if id not in self.execs:
+                raise _not_found('exec instance', id)
+            ex = self.execs[id]
+        if self.exec_handler is None:
+            code, output = self.exit_code, self.log_chunks
+        else:
+            code, output = self.exec_handler(ex['Name'], ex['Cmd'])
+        with self.lock:
+            ex['ExitCode'] = code
+
+        tty = (body or {}).get('Tty', False)
+        return 200, b''.join(data if tty else _frame(stream, data)
+                             for stream, data in output), \
+            'application/vnd.docker.raw-stream'
+
+    def api_exec_inspect(self, id, **kwargs):
+        with self.lock:
+            if id not in self.execs:
+                raise _not_found('exec instance', id)
+            return 200, self.execs[id]
+
+    def api_put_archive(self, id, body, query, **kwargs):
+        c = self._lookup(id)
+        path = posixpath.normpath(query['path'])
+        tar = tarfile.open(fileobj=io.BytesIO(body), mode='r:')
+        with self.lock:
+            files = self.files[c['Id']]
+            if path not in files or not files[path][0].isdir():
+                raise _not_found('directory', path)
+            for member in tar:
+                data = tar.extractfile(member).read() if member.isreg() \
+                       else b''
+                name = posixpath.normpath(posixpath.join(path, member.name))
+                files[name] = (member, data)
+        return 200, None
+
+    def api_get_archive(self, id, query, **kwargs):
+        c = self._lookup(id)
+        path = posixpath.normpath(query['path'])
+        with self.lock:
+            files = self.files[c['Id']]
+            if path not in files:
+                raise _not_found('file', path)
+            prefix = path.rstrip('/') + '/'
+            members = [(name, files[name]) for name in sorted(files)
+                       if name == path or name.startswith(prefix)]
+
+        buf = io.BytesIO()
+        tar = tarfile.open(fileobj=buf, mode='w')
+        for name, (info, data) in members:
+            info = copy.copy(info)
+            info.name = posixpath.relpath(name, posixpath.dirname(path))
+            tar.addfile(info, io.BytesIO(data) if info.isreg() else None)
+        tar.close()
+
+        info = members[0][1][0]
+        stat = dict(name=posixpath.basename(path), size=info.size,
+                    mode=info.mode, mtime=info.mtime,
+                    linkTarget=info.linkname)
+        headers = {'X-Docker-Container-Path-Stat': base64.b64encode(
+            json.dumps(stat).encode('utf-8')).decode('ascii')}
+        data = buf.getvalue()
+        return 'stream', [data[k:k + 65536]
+                          for k in range(0, len(data), 65536)], \
+            'application/x-tar', headers
+
+    def api_images(self, **kwargs):
+        images = sorted(self.images or ())
+        return 200, [dict(Id='sha256:' + uuid4().hex, RepoTags=[tag])
+                     for tag in images]
+
+    def api_pull(self, query, **kwargs):
+        image = query['fromImage']
+        tag = query.get('tag', None) or 'latest'
+        key = image if '@' in image else image + ':' + tag
+        if self.registry is not None and key not in self.registry:
+            raise APIError(404, 'pull access denied for {}, repository does '
+                           'not exist'.format(image))
+        with self.lock:
+            if self.images is not None:
+                self.images.add(key)
+        return 'stream', [dict(status='Pulling from ' + image, id=tag),
+                          dict(status='Downloaded newer image for ' + key)]
+
+    def api_inspect_image(self, id, **kwargs):
+        key = _image_key(id)
+        if self.images is not None and key not in self.images:
+            raise _not_found('image', id)
+        return 200, dict(Id='sha256:' + key, RepoTags=[key],
+                         Config=dict(Labels=self.labels.get(key)))
+
+    def api_build(self, body, query, **kwargs):
+        tar = tarfile.open(fileobj=io.BytesIO(body), mode='r:')
+        files = {m.name: (tar.extractfile(m).read() if m.isreg() else None)
+                 for m in tar}
+        dockerfile = query.get('dockerfile') or 'Dockerfile'
+        key = _image_key(query['t'])
+        build = dict(tag=key, files=sorted(files),
+                     labels=json.loads(query.get('labels', '{}')),
+                     buildargs=json.loads(query.get('buildargs', '{}')))
+        self.builds.append(build)
+
+        if files.get(dockerfile) is None:
+            return 'stream', [dict(error='Cannot locate specified '
+                                   'Dockerfile: ' + dockerfile)]
+        if b'FAIL' in files[dockerfile]:
+            return 'stream', [dict(stream='Step 1/1 : RUN false\n'),
+                              dict(error='The command returned a non-zero '
+                                   'code: 1')]
+        with self.lock:
+            if self.images is not None:
+                self.images.add(key)
+            self.labels[key] = build['labels']
+        return 'stream', [dict(stream='Step 1/1 : FROM scratch\n'),
+                          dict(stream='Successfully built {}\n'.format(
+                              uuid4().hex[:12])),
+                          dict(stream='Successfully tagged {}\n'.format(key))]
+
+    def api_remove_image(self, id, **kwargs):
+        key = _image_key(id)
+        with self.lock:
+            if self.images is None or key not in self.images:
+                raise _not_found('image', id)
+            self.images.discard(key)
+            self.labels.pop(key, None)
+        return 200, [dict(Untagged=key)]
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('FakeDaemon',)
+
+#-------------------------------------------------------------------------------
@@ -0,0 +1,88 @@
+import time
+from docker.errors import NotFound, ImageNotFound
+
+#-------------------------------------------------------------------------------
+# Fake client
+
+INSPECT = {'Id': 'abc123',
+           'State': {'Running': True, 'Paused': False},
+           'NetworkSettings': {'IPAddress': '172.17.0.2'}}
+
+class FakeClient(object):
+    def __init__(self, containers=None, summaries=(), events=(), 
+                 images=None, exit_code=0, logs=(b'error',)):
+        self.inspect = dict(containers or {})
+        self.summaries = list(summaries)
+        self.event_queue = list(events)
+        self.images = None if images is None else set(images)
+        self.exit_code = exit_code
+        self.log_chunks = list(logs)
+        self.calls = []
+
+    def _record(name):
+        def method(self, *args, **kwargs):
+            self.calls.append((name, args, kwargs))
+        method.__name__ = name
+        return method
+
+    pause = _record('pause')
+    remove_container = _record('remove_container')
+    start = _record('start')
+    stop = _record('stop')
+    unpause = _record('unpause')
+    del _record
+
+    def containers(self, **kwargs):
+        self.calls.append(('containers', kwargs))
+        return list(self.summaries)
+
+    def create_container(self, **kwargs):
+        self.calls.append(('create_container', kwargs))
+        if self.images is not None and kwargs['image'] not in self.images:
+            raise ImageNotFound('No such image: {}'.format(kwargs['image']))
+        return {'Id': 'abc123', 'Warnings': None}
+
+    def create_host_config(self, **kwargs):
+        return dict(kwargs)
+
+    def events(self, **kwargs):
+        self.calls.append(('events', kwargs))
+        events, self.event_queue = self.event_queue, []
+        if not events:
+            time.sleep(0.01)
+        return iter(events)
+
+    def inspect_container(self, name):
+        self.calls.append(('inspect_container', name))
+        if name in self.inspect:
+            return self.inspect[name]
+        if '*' in self.inspect:
+            return self.inspect['*']
+        raise NotFound('No such container: {}'.format(name))
+
+    def exec_create(self, container, cmd, **kwargs):
+        self.calls.append(('exec_create', container, cmd))
+        return {'Id': 'exec-' + container}
+
+    def exec_inspect(self, exec_id):
+        return {'ExitCode': self.exit_code, 'Running': False}
+
+    def exec_start(self, exec_id, **kwargs):
+        return b''
+
+    def logs(self, container, **kwargs):
+        if kwargs.get('stream'):
+            return iter(self.log_chunks)
+        return b''.join(self.log_chunks)
+
+    def pull(self, repo, tag=None, **kwargs):
+        self.calls.append(('pull', repo, tag))
+        self.images.add(repo + ':' + tag)
+        self.images.add(repo)
+        if kwargs.get('stream'):
+            return iter([dict(status='Downloaded newer image')])
+
+    def wait(self, container):
+        return self.exit_code
+
+#-------------------------------------------------------------------------------
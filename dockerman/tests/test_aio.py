@@ -0,0 +1,110 @@
+import errno
+import socket
+from unittest import SkipTest
+from syn.five import PY2
+from dockerman.tests import FakeClient, INSPECT
+
+if not PY2:
+    import asyncio
+    from dockerman.aio import AsyncContainer, container, scan_port
+from dockerman.readiness import TCPProbe
+
+#-------------------------------------------------------------------------------
+# Utilities
+
+LOCAL = dict(INSPECT, NetworkSettings={'IPAddress': '127.0.0.1'})
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+def listener():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(5)
+    return sock
+
+#-------------------------------------------------------------------------------
+# AsyncContainer
+
+def test_asynccontainer():
+    if PY2:
+        raise SkipTest
+
+    client = FakeClient({'foo': LOCAL})
+    sock = listener()
+    port = sock.getsockname()[1]
+
+    async def main():
+        c = AsyncContainer('ubuntu', name='foo', status_ttl=60)
+        assert c.image == 'ubuntu'
+        assert await c.run(client=client) == 'abc123'
+        assert (await c.refresh(client=client)).running is True
+        assert (await c.status()).ip_addr == '127.0.0.1'
+
+        assert await c.is_port_live(port)
+        await c.poll(port, timeout=1)
+        await c.poll(TCPProbe(port), timeout=1, client=client)
+
+        sock.close()
+        assert not await scan_port('127.0.0.1', port)
+
+        # Local faults are not reported as closed ports
+        async def open_connection(addr, port):
+            raise OSError(errno.EMFILE, 'Too many open files')
+
+        orig = asyncio.open_connection
+        asyncio.open_connection = open_connection
+        try:
+            await scan_port('127.0.0.1', port)
+            assert False # pragma: no cover
+        except OSError as e:
+            assert e.errno == errno.EMFILE
+        finally:
+            asyncio.open_connection = orig
+        try:
+            await c.poll(port, timeout=0.2, wait=0.05)
+            assert False # pragma: no cover
+        except RuntimeError:
+            pass
+
+        for op in ('stop', 'start', 'pause', 'unpause', 'remove'):
+            await getattr(c, op)(client=client)
+        assert [call[0] for call in client.calls][-5:] == \
+            ['stop', 'start', 'pause', 'unpause', 'remove_container']
+
+    run(main())
+
+def test_async_container():
+    if PY2:
+        raise SkipTest
+
+    client = FakeClient({'*': LOCAL})
+    sock = listener()
+    port = sock.getsockname()[1]
+
+    async def main():
+        async with container('ubuntu', 'sleep 10', client=client) as c:
+            assert isinstance(c, AsyncContainer)
+            assert c.detach is True
+
+            # The client is used for every call, not just run and remove
+            assert (await c.status()).running
+            assert client.calls[-1][0] == 'inspect_container'
+            assert await c.is_port_live(port)
+            await c.poll(port, timeout=1)
+        assert client.calls[-1][0] == 'remove_container'
+
+    try:
+        run(main())
+    finally:
+        sock.close()
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
@@ -0,0 +1,154 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+from nose.tools import assert_raises
+from docker.errors import NotFound
+from dockerman import Container
+from dockerman.archive import ArchiveError, walk, tar_stream, extract
+from dockerman.testing import FakeDaemon
+
+def make_tree(root):
+    os.makedirs(os.path.join(root, 'data', 'empty'))
+    os.makedirs(os.path.join(root, 'data', 'sub'))
+    with open(os.path.join(root, 'data', 'big.bin'), 'wb') as f:
+        f.write(os.urandom(1000003))
+    with open(os.path.join(root, 'data', 'sub', 'a.txt'), 'wb') as f:
+        f.write(b'hello\n')
+    os.chmod(os.path.join(root, 'data', 'sub', 'a.txt'), 0o600)
+    os.symlink('sub/a.txt', os.path.join(root, 'data', 'link'))
+    with open(os.path.join(root, 'single.txt'), 'wb') as f:
+        f.write(b'single\n')
+
+def read(*parts):
+    with open(os.path.join(*parts), 'rb') as f:
+        return f.read()
+
+#-------------------------------------------------------------------------------
+# Archive creation
+
+def test_tar_stream():
+    root = tempfile.mkdtemp()
+    try:
+        make_tree(root)
+        data = os.path.join(root, 'data')
+        assert [arcname for _, arcname in walk(data)] == \
+            ['data', 'data/big.bin', 'data/empty', 'data/link', 'data/sub',
+             'data/sub/a.txt']
+        assert [arcname for _, arcname in walk(data, '')][:2] == \
+            ['', 'big.bin']
+
+        chunks = list(tar_stream(walk(data), chunk_size=4096))
+        assert max(len(chunk) for chunk in chunks) < 2 * 4096
+        assert len(b''.join(chunks)) % 512 == 0
+
+        tar = tarfile.open(fileobj=io.BytesIO(b''.join(chunks)))
+        members = {m.name: m for m in tar.getmembers()}
+        assert sorted(members) == [arcname for _, arcname in walk(data)]
+        assert members['data/link'].issym()
+        assert members['data/link'].linkname == 'sub/a.txt'
+        assert members['data/sub/a.txt'].mode == 0o600
+        assert members['data/sub/a.txt'].uid == 0
+        assert tar.extractfile('data/big.bin').read() == \
+            read(data, 'big.bin')
+
+    finally:
+        shutil.rmtree(root)
+
+#-------------------------------------------------------------------------------
+# Extraction
+
+def unsafe_tar(*members):
+    '''Return a tar archive of the given (name[, linkname]) members:
+    symbolic links, or files containing b'x'.
+    '''
+    if members and not isinstance(members[0], tuple):
+        members = [members]
+    buf = io.BytesIO()
+    tar = tarfile.open(fileobj=buf, mode='w')
+    for member in members:
+        info = tarfile.TarInfo(member[0])
+        data = b'x'
+        if len(member) > 1:
+            info.type = tarfile.SYMTYPE
+            info.linkname = member[1]
+            data = b''
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    tar.close()
+    buf.seek(0)
+    return buf
+
+def test_extract():
+    root = tempfile.mkdtemp()
+    try:
+        dest = os.path.join(root, 'dest')
+        extract(unsafe_tar('a/b.txt'), dest)
+        assert read(dest, 'a', 'b.txt') == b'x'
+
+        for args in [('../evil',), ('/etc/evil',), ('a/../../evil',),
+                     ('link', '/etc'), ('link', '../..'),
+                     ('a/link', '../../x')]:
+            assert_raises(ArchiveError, extract, unsafe_tar(*args), dest)
+        assert not os.path.exists(os.path.join(root, 'evil'))
+
+        extract(unsafe_tar('a/link', '../a/b.txt'), dest)
+        assert read(dest, 'a', 'link') == b'x'
+
+        # Chained links, each pointing inside dest when taken alone
+        tar = unsafe_tar(('sub/up', '..'), ('sub/up/esc', '..'),
+                         ('sub/up/esc/PWNED',))
+        assert_raises(ArchiveError, extract, tar, dest)
+        assert not os.path.exists(os.path.join(root, 'PWNED'))
+
+        # A link that only leads outside once a later link is extracted
+        tar = unsafe_tar(('c/file', 'd/../x'), ('c/d', '..'), ('c/file',))
+        assert_raises(ArchiveError, extract, tar, dest)
+        assert not os.path.exists(os.path.join(root, 'x'))
+
+    finally:
+        shutil.rmtree(root)
+
+#-------------------------------------------------------------------------------
+# Container file copy
+
+def test_put_get_files():
+    root = tempfile.mkdtemp()
+    try:
+        make_tree(root)
+        with FakeDaemon() as daemon:
+            c = Container('foo', 'bar', name='c1', detach=True,
+                          client=daemon.client())
+            c.run()
+
+            assert c.put_files(os.path.join(root, 'data'), '/tmp',
+                               chunk_size=8192)
+            assert c.put_files([os.path.join(root, 'single.txt')], '/')
+            files = daemon.files[c.id]
+            assert files['/tmp/data/big.bin'][1] == read(root, 'data',
+                                                         'big.bin')
+            assert files['/single.txt'][1] == b'single\n'
+            assert_raises(NotFound, c.put_files, os.path.join(root, 'data'),
+                          '/nonexistent')
+
+            out = os.path.join(root, 'out')
+            stat = c.get_files('/tmp/data', out)
+            assert stat['name'] == 'data'
+            for path in ('big.bin', 'link', os.path.join('sub', 'a.txt')):
+                assert read(out, 'data', path) == read(root, 'data', path)
+            assert os.path.islink(os.path.join(out, 'data', 'link'))
+            assert os.path.isdir(os.path.join(out, 'data', 'empty'))
+
+            c.get_files('/tmp/data/sub/a.txt', out)
+            assert read(out, 'a.txt') == b'hello\n'
+            assert_raises(NotFound, c.get_files, '/nonexistent', out)
+
+    finally:
+        shutil.rmtree(root)
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
@@ -0,0 +1,151 @@
+import threading
+from nose.tools import assert_raises
+from requests.exceptions import ConnectionError
+from docker.constants import DEFAULT_DOCKER_API_VERSION
+from dockerman import base, Container, refresh_status
+from dockerman.base import CLIENT, ClientPool, PoolTimeout, configure, \
+    get_client, client_settings, checkout
+from dockerman.testing import FakeDaemon
+from dockerman.tests import FakeClient, INSPECT
+
+#-------------------------------------------------------------------------------
+# Default client
+
+def test_client_settings():
+    s = client_settings({})
+    assert s['base_url'] == base.DEFAULT_BASE_URL
+    assert s['version'] == DEFAULT_DOCKER_API_VERSION
+
+    s = client_settings(dict(DOCKER_HOST='tcp://127.0.0.1:2375',
+                             DOCKER_API_VERSION='1.24',
+                             DOCKER_CLIENT_TIMEOUT='5'))
+    assert s['base_url'] == 'tcp://127.0.0.1:2375'
+    assert s['version'] == '1.24'
+    assert s['timeout'] == 5
+
+def test_get_client():
+    try:
+        configure(base_url='tcp://127.0.0.1:2375', version='1.25', timeout=3)
+        assert base._CLIENT is None
+
+        client = get_client()
+        assert client is get_client()
+        assert isinstance(client, ClientPool)
+        assert client.size == base.DEFAULT_POOL_SIZE
+        assert client.base_url == 'http://127.0.0.1:2375'
+        assert client.api_version == '1.25'
+        assert client.timeout == 3
+        assert CLIENT.base_url == client.base_url
+
+        other = FakeClient()
+        assert get_client(other) is other
+
+        configure(version='1.26', pool_size=2)
+        assert base._CLIENT is None
+        assert get_client().api_version == '1.26'
+        assert get_client().base_url == 'http://127.0.0.1:2375'
+        assert get_client().size == 2
+
+        with checkout() as c:
+            assert not isinstance(c, ClientPool)
+            assert c.api_version == '1.26'
+        with checkout(other) as c:
+            assert c is other
+    finally:
+        base.reset()
+    assert base._CLIENT is None
+
+def test_container_client():
+    client = FakeClient({'c1': INSPECT})
+    client2 = FakeClient({'*': INSPECT})
+    c1 = Container('foo', name='c1', client=client)
+    c2 = Container('foo', name='c2', client=client2)
+    assert c1 == Container('foo', name='c1')
+
+    assert c1.status.running
+    assert client.calls == [('inspect_container', 'c1')]
+    c1.pause()
+    c1.unpause(client=client2)
+    assert client.calls[-1] == ('pause', ('c1',), {})
+    assert client2.calls[-1] == ('unpause', ('c1',), {})
+
+    refresh_status([c1, c2])
+    assert client.calls[-1][0] == 'containers'
+    assert client2.calls[-1][0] == 'containers'
+    assert client2.calls[-1][1]['filters'] == dict(name=['c2'])
+
+#-------------------------------------------------------------------------------
+# ClientPool
+
+def test_clientpool():
+    assert_raises(ValueError, ClientPool, size=0)
+
+    with FakeDaemon() as daemon:
+        pool = ClientPool(size=3, base_url=daemon.base_url)
+        cs = [Container('foo', 'sleep 10', detach=True, client=pool)
+              for _ in range(12)]
+
+        errors = []
+        def work(c):
+            try:
+                c.run()
+                assert c.status.running
+                c.remove()
+            except Exception as e: # pragma: no cover
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(c,)) for c in cs]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors
+        assert 1 <= pool.created <= 3
+        assert daemon.count('create') == 12
+        assert daemon.count('ping') == 0
+
+        # Size cap
+        held = [pool.acquire() for _ in range(3)]
+        assert_raises(PoolTimeout, pool.acquire, 0.01)
+        pool.release(held.pop())
+        c = pool.acquire(0.01)
+        pool.release(c)
+        for c in held:
+            pool.release(c)
+
+        # Health checks
+        pool.check_interval = 0
+        assert pool.ping()
+        assert daemon.count('ping') == 2
+
+        created = pool.created
+        with pool.checkout() as c:
+            pass
+        assert pool.created == created
+
+    # Clients failing their health check or a call are discarded
+    assert pool._idle.qsize() == 3
+    assert_raises(ConnectionError, pool.version)
+    assert pool.created == created + 1
+    assert pool._idle.qsize() == 0
+
+    pool.close()
+    assert pool._idle.qsize() == 0
+    assert_raises(RuntimeError, pool.acquire)
+
+    # Interrupted checkouts release their slot and discard the client
+    pool = ClientPool(size=1)
+    for _ in range(2):
+        try:
+            with pool.checkout(0.01):
+                raise KeyboardInterrupt
+        except KeyboardInterrupt:
+            pass
+    pool.release(pool.acquire(0.01))
+    assert pool.created == 3
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
@@ -1,6 +1,8 @@
 from nose.tools import assert_raises
-from dockerman import Container, ContainerStatus, RA, CC
+from docker.errors import ContainerError, NotFound
+from dockerman import Container, ContainerStatus, RA, CC, HC
 from syn.base_utils import assign
+from dockerman.tests import FakeClient, INSPECT
 
 #-------------------------------------------------------------------------------
 # Status
@@ -31,6 +33,22 @@ def test_containerstatus():
     assert s.paused is False
     assert s.dict == {}
 
+def test_containerstatus_expiry():
+    s = ContainerStatus()
+    assert s.expired(60)
+
+    s.update(INSPECT)
+    assert s.id == 'abc123'
+    assert s.running is True
+    assert s.ip_addr == '172.17.0.2'
+    assert not s.expired(60)
+    assert s.expired(0)
+    assert s == ContainerStatus(id='abc123', ip_addr='172.17.0.2', exists=True,
+                                running=True, dict=INSPECT)
+
+    s.invalidate()
+    assert s.expired(60)
+
 #-------------------------------------------------------------------------------
 # Container
 
@@ -49,6 +67,24 @@ def test_container():
     assert_raises(AttributeError, bad, c)
     assert_raises(AttributeError, bad2, c)
 
+def test_container_status_cache():
+    client = FakeClient({'foo': INSPECT})
+    c = Container('ubuntu', name='foo', status_ttl=60)
+
+    assert c.refresh(client=client).running is True
+    assert c.status.running is True
+    assert c.status.ip_addr == '172.17.0.2'
+    assert client.calls == [('inspect_container', 'foo')]
+
+    assert c.inspect(client=client) == INSPECT
+    assert len(client.calls) == 2
+
+    c = Container('ubuntu', name='bar', status_ttl=60)
+    assert_raises(NotFound, c.inspect, client=client)
+    assert c.refresh(client=client).exists is False
+    assert not c._status.expired(60)
+    assert c.status == ContainerStatus()
+
 #-------------------------------------------------------------------------------
 # run args marshalling
 
@@ -74,6 +110,59 @@ def test_container_marshal_run_args():
 
     assert_raises(ValueError, c.marshal_args, 'foo')
 
+def test_container_marshal_host_config():
+    c = Container('ubuntu', name='test', mem_limit='1g', 
+                  volumes=['/data', '/tmp:/tmp:ro'], volumes_from=['foo'])
+    assert c.marshal_args(HC) == dict(mem_limit='1g', volumes_from=['foo'],
+                                      binds=['/tmp:/tmp:ro'])
+    assert c.marshal_args(CC)['volumes'] == ['/data', '/tmp']
+    assert c.marshal_args(CC)['host_config'] == c.marshal_args(HC)
+
+def test_container_marshal_cache():
+    c = Container('ubuntu', name='test', volumes_from=['foo'])
+    ra = c.marshal_args(RA)
+    assert c.marshal_args(RA) is ra
+
+    cc = c.marshal_args(CC)
+    cc['tty'] = True
+    cc['host_config']['dns'] = ['8.8.8.8']
+    assert c.marshal_args(CC)['tty'] is False
+    assert c.marshal_args(HC) == dict(volumes_from=['foo'])
+
+    c.tty = True
+    assert c.marshal_args(RA) == ' -t --volumes-from foo --name test ubuntu'
+    assert c.marshal_args(CC)['tty'] is True
+
+    c.volumes_from = None
+    assert c.marshal_args(HC) == {}
+
+#-------------------------------------------------------------------------------
+# Lifecycle
+
+def test_container_lifecycle():
+    client = FakeClient({'foo': INSPECT}, images=['alpine'])
+    c = Container('ubuntu:16.04', name='foo', detach=True, status_ttl=60)
+    c.refresh(client=client)
+
+    assert c.run(client=client) == 'abc123'
+    assert c.id == 'abc123'
+    assert c._status.expired(60)
+    assert [call[0] for call in client.calls] == \
+        ['inspect_container', 'create_container', 'pull', 
+         'create_container', 'start']
+    assert client.calls[2] == ('pull', 'ubuntu', '16.04')
+
+    for op in ('pause', 'unpause', 'stop', 'start', 'remove'):
+        c.refresh(client=client)
+        getattr(c, op)(client=client)
+        assert c._status.expired(60)
+    assert client.calls[-1] == ('remove_container', ('foo',), 
+                                dict(v=True, force=True))
+
+    c = Container('alpine', 'false', name='bar')
+    assert_raises(ContainerError, c.run, client=FakeClient(exit_code=1))
+    assert c.run(client=FakeClient()) == 'abc123'
+
 #-------------------------------------------------------------------------------
 
 if __name__ == '__main__': # pragma: no cover
@@ -0,0 +1,143 @@
+import io
+import os
+import time
+import shutil
+import tarfile
+import tempfile
+from dockerman.context import DockerIgnore, StatCache, BuildContext
+
+def write(root, path, data=b'', age=10):
+    path = os.path.join(root, path)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as f:
+        f.write(data)
+    t = time.time() - age
+    os.utime(path, (t, t))
+
+#-------------------------------------------------------------------------------
+# DockerIgnore
+
+def test_dockerignore():
+    ig = DockerIgnore(['# comment', '', '*.pyc', '/build', 'docs/**/*.md',
+                       '**/tmp', 'data', '!data/keep*', 'f?o', 'x[0-9]',
+                       './y/../z'])
+    assert ig
+    assert ig.exclusions
+    assert not DockerIgnore()
+
+    assert ig.matches('a.pyc')
+    assert not ig.matches('src/a.pyc') # * does not cross directories
+    assert ig.matches('build')
+    assert ig.matches('build/out/a.o') # parents match
+    assert not ig.matches('src/build')
+    assert ig.matches('docs/a.md')
+    assert ig.matches('docs/x/y/a.md')
+    assert not ig.matches('docs/a.txt')
+    assert ig.matches('tmp')
+    assert ig.matches('a/b/tmp')
+    assert ig.matches('a/b/tmp/c')
+    assert ig.matches('data/x')
+    assert not ig.matches('data/keep.txt')
+    assert ig.matches('foo')
+    assert not ig.matches('fooo')
+    assert ig.matches('x1')
+    assert not ig.matches('xa')
+    assert ig.matches('z')
+
+    assert DockerIgnore(['**']).matches('a/b/c')
+    assert DockerIgnore(['a.b']).matches('a.b')
+    assert not DockerIgnore(['a.b']).matches('axb')
+
+#-------------------------------------------------------------------------------
+# StatCache
+
+def test_statcache():
+    root = tempfile.mkdtemp()
+    try:
+        write(root, 'a', b'hello')
+        write(root, 'new', b'new', age=0)
+        path = os.path.join(root, 'a')
+        cache = StatCache(os.path.join(root, 'cache.json'))
+
+        digest = cache.digest(path)
+        assert digest == '2cf24dba5fb0a30e26e83b2ac5b9e29e1b161e5c1fa7425e' \
+                         '73043362938b9824'
+        assert cache.digest(path) == digest
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # Recently modified files are rehashed
+        cache.digest(os.path.join(root, 'new'))
+        cache.digest(os.path.join(root, 'new'))
+        assert cache.misses == 3
+
+        write(root, 'a', b'world')
+        assert cache.digest(path) != digest
+        assert cache.misses == 4
+
+        cache.save()
+        cache2 = StatCache(os.path.join(root, 'cache.json'))
+        assert cache2.digest(path) == cache.digest(path)
+        assert cache2.hits == 1
+        assert cache2.misses == 0
+
+    finally:
+        shutil.rmtree(root)
+
+#-------------------------------------------------------------------------------
+# BuildContext
+
+def test_buildcontext():
+    root = tempfile.mkdtemp()
+    try:
+        write(root, 'Dockerfile', b'FROM scratch\n')
+        write(root, '.dockerignore', b'*.log\nnode_modules\nDockerfile\n'
+              b'logs\n!logs/keep.log\n')
+        write(root, 'app.py', b'print(1)\n')
+        write(root, 'debug.log', b'x')
+        write(root, 'node_modules/a/index.js', b'x' * 1000)
+        write(root, 'logs/a.log', b'x')
+        write(root, 'logs/keep.log', b'x')
+        os.symlink('app.py', os.path.join(root, 'link'))
+
+        cache = StatCache()
+        ctx = BuildContext(root, cache=cache)
+        assert [arcname for _, arcname, _ in ctx.entries] == \
+            ['.dockerignore', 'Dockerfile', 'app.py', 'link', 'logs/keep.log']
+
+        tar = tarfile.open(fileobj=io.BytesIO(b''.join(ctx.stream())))
+        assert tar.getnames() == ['.dockerignore', 'Dockerfile', 'app.py',
+                                  'link', 'logs/keep.log']
+        assert tar.extractfile('app.py').read() == b'print(1)\n'
+
+        digest = ctx.digest()
+        assert cache.misses == 4
+        assert BuildContext(root, cache=cache).digest() == digest
+        assert cache.misses == 4
+
+        # Options, ignored files and modes
+        assert ctx.digest(buildargs=dict(a='1')) != digest
+        write(root, 'other.log', b'x')
+        assert BuildContext(root, cache=cache).digest() == digest
+        os.chmod(os.path.join(root, 'app.py'), 0o755)
+        digest2 = BuildContext(root, cache=cache).digest()
+        assert digest2 != digest
+        write(root, 'app.py', b'print(2)\n')
+        assert BuildContext(root, cache=cache).digest() not in \
+            (digest, digest2)
+
+        write(root, '.dockerignore', b'node_modules\n')
+        ctx = BuildContext(root, cache=cache)
+        assert not ctx.ignore.exclusions
+        assert [arcname for _, arcname, _ in ctx.entries
+                if arcname.startswith('node_modules')] == []
+        assert 'debug.log' in [arcname for _, arcname, _ in ctx.entries]
+
+    finally:
+        shutil.rmtree(root)
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
@@ -0,0 +1,222 @@
+import time
+import threading
+from nose.tools import assert_raises
+from docker.errors import ContainerError, NotFound
+from dockerman import Container, ContainerGroup, FleetError, FleetResult, \
+    PrefetchResult, apply_all, run_all, stop_all, remove_all, exec_all, \
+    prefetch
+from dockerman.testing import FakeDaemon
+from dockerman.tests import FakeClient
+
+#-------------------------------------------------------------------------------
+# Operations
+
+def test_apply_all():
+    assert apply_all([], 'run') == FleetResult()
+
+    client = FakeClient()
+    cs = [Container('ubuntu', name='c{}'.format(k), detach=True)
+          for k in range(20)]
+    res = run_all(cs, client=client, max_workers=5)
+    assert res.ok
+    assert len(res.results) == 20
+    assert len([c for c in client.calls if c[0] == 'start']) == 20
+
+    res = stop_all(cs, client=client)
+    assert res.ok
+    assert set(res.results) == {c.name for c in cs}
+    assert remove_all(cs, client=client).ok
+
+def test_apply_all_errors():
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def op(c):
+        with lock:
+            active.append(c)
+            peak.append(len(active))
+        time.sleep(0.01)
+        with lock:
+            active.remove(c)
+        if c.name in ('c3', 'c7'):
+            raise ValueError(c.name)
+        return c.name
+
+    cs = [Container('ubuntu', name='c{}'.format(k)) for k in range(10)]
+    res = apply_all(cs, op, max_workers=3)
+    assert max(peak) <= 3
+    assert not res.ok
+    assert sorted(res.errors) == ['c3', 'c7']
+    assert len(res.results) == 8
+    assert_raises(FleetError, res.raise_for_errors)
+
+    try:
+        apply_all(cs, op, max_workers=1, fail_fast=True)
+        assert False # pragma: no cover
+    except FleetError as e:
+        assert list(e.result.errors) == ['c3']
+        assert len(e.result.cancelled) >= 5
+        assert len(e.result.cancelled) + len(e.result.results) == 9
+
+#-------------------------------------------------------------------------------
+# Image prefetch
+
+def test_prefetch():
+    registry = ['alpine', 'busybox', 'redis', 'ubuntu']
+    with FakeDaemon(images=['ubuntu'], registry=registry,
+                    latency=dict(pull=0.2)) as daemon:
+        client = daemon.client()
+        def make(image, n):
+            return [Container(image, name='{}{}'.format(image, k),
+                              detach=True, client=client) for k in range(n)]
+
+        events = []
+        pulls = []
+        def progress(ref, status):
+            events.append((ref, status))
+            if 'total' in status and ref != 'ubuntu:latest':
+                pulls.append(daemon.count('pull'))
+
+        cs = make('alpine', 5) + make('busybox', 5) + make('ubuntu', 2) + \
+             make('nope', 2)
+        res = prefetch(cs, progress=progress)
+        assert daemon.count('pull') == 3
+        assert pulls[0] == 3 # All pulls started before the first finished
+        assert res.results == {'alpine:latest': True, 'busybox:latest': True,
+                               'ubuntu:latest': False}
+        assert list(res.errors) == ['nope:latest']
+        assert isinstance(res.errors['nope:latest'], NotFound)
+        assert len(res.containers['alpine:latest']) == 5
+
+        summary = [status for _, status in events if 'total' in status]
+        assert [s['done'] for s in summary] == [1, 2, 3, 4]
+        assert sorted(s['status'] for s in summary) == \
+            ['Failed', 'Ready', 'Ready', 'Ready']
+        assert any(status['status'].startswith('Downloaded')
+                   for _, status in events)
+
+        # Containers start as soon as their own image is available
+        def run(c, **kwargs):
+            c.run(**kwargs)
+            return time.time()
+
+        cs = make('redis', 3) + [Container('alpine', name='a{}'.format(k),
+                                           detach=True, client=client)
+                                 for k in range(3)] + make('nope', 1)
+        start = time.time()
+        res = apply_all(cs, run, prefetch=True, max_pulls=2)
+        assert sorted(res.errors) == ['nope0']
+        alpine = [res.results['a{}'.format(k)] for k in range(3)]
+        redis = [res.results['redis{}'.format(k)] for k in range(3)]
+        assert max(alpine) < min(redis)
+        assert min(redis) - start >= 0.2
+        assert daemon.count('pull') == 5
+
+        assert run_all(make('busybox', 2), prefetch=True).ok
+        assert daemon.count('pull') == 5
+        assert_raises(FleetError, run_all, make('nope', 2), prefetch=True,
+                      fail_fast=True)
+
+        assert prefetch([]) == PrefetchResult()
+
+def test_prefetch_errors():
+    with FakeDaemon(registry=['alpine']) as d1, \
+         FakeDaemon(registry=[]) as d2:
+        c1, c2 = d1.client(), d2.client()
+        cs = [Container('alpine', name='a{}'.format(k), detach=True,
+                        client=cl) for k, cl in enumerate([c1, c2, c1])]
+
+        # Pull errors only concern the containers of the failing client
+        res = run_all(cs, prefetch=True)
+        assert sorted(res.results) == ['a0', 'a2']
+        assert sorted(res.errors) == ['a1']
+        assert isinstance(res.errors['a1'], NotFound)
+        assert not res.cancelled
+
+        res = prefetch(cs)
+        assert list(res.errors) == ['alpine:latest']
+        assert res.results == {}
+
+    registry = ['alpine', 'busybox']
+    with FakeDaemon(registry=registry, latency=dict(pull=0.05)) as daemon:
+        client = daemon.client()
+        cs = [Container(image, name=image, detach=True, client=client)
+              for image in ('nope', 'alpine', 'busybox')]
+
+        # With fail_fast, pulls not yet started are cancelled
+        try:
+            run_all(cs, prefetch=True, max_pulls=1, fail_fast=True)
+            assert False # pragma: no cover
+        except FleetError as e:
+            assert list(e.result.errors) == ['nope']
+            assert sorted(e.result.cancelled) == ['alpine', 'busybox']
+        assert daemon.count('pull') == 1
+
+        # ... and so are the operations not yet started
+        def op(c):
+            if c.name == 'x0':
+                raise ValueError(c.name)
+            return c.name
+
+        cs = [Container('alpine', name='x{}'.format(k), client=client)
+              for k in range(5)]
+        try:
+            apply_all(cs, op, prefetch=True, max_workers=1, fail_fast=True)
+            assert False # pragma: no cover
+        except FleetError as e:
+            assert list(e.result.errors) == ['x0']
+            assert len(e.result.cancelled) == 4
+
+#-------------------------------------------------------------------------------
+# ContainerGroup
+
+def test_containergroup_fleet():
+    client = FakeClient()
+    g = ContainerGroup([Container('ubuntu', detach=True) for k in range(3)])
+    for op in ('run', 'stop', 'start', 'remove'):
+        assert getattr(g, op)(client=client).ok
+    assert len(client.calls) == 15
+
+def test_exec_all():
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def execs(name, cmd):
+        with lock:
+            active.append(name)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.remove(name)
+        code = int(name[1:]) % 3
+        return code, [(1, name.encode('ascii') + b'\n')]
+
+    with FakeDaemon(execs=execs) as daemon:
+        client = daemon.client()
+        g = ContainerGroup([Container('ubuntu', name='c{}'.format(k),
+                                      detach=True, client=client)
+                            for k in range(20)])
+        g.run()
+
+        res = exec_all(g, 'hostname', max_workers=20)
+        assert max(peak) > 1
+        assert res.ok
+        assert res.results['c4'].stdout == b'c4\n'
+        assert res.results['c4'].exit_code == 1
+        assert daemon.count('exec_start') == 20
+
+        res = getattr(g, 'exec')(['check'], check=True)
+        assert sorted(res.errors) == sorted('c{}'.format(k) for k in range(20)
+                                            if k % 3)
+        err = res.errors['c5']
+        assert isinstance(err, ContainerError)
+        assert err.exit_status == 2
+        assert res.results['c3'].exit_code == 0
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
@@ -0,0 +1,66 @@
+from dockerman import Container, ContainerStatus, ContainerGroup, \
+    refresh_status
+from dockerman.tests import FakeClient, INSPECT
+
+#-------------------------------------------------------------------------------
+# Summaries
+
+RUNNING = {'Id': 'aaa', 'Names': ['/a'], 'State': 'running',
+           'NetworkSettings': {'Networks': 
+                               {'bridge': {'IPAddress': '172.17.0.3'}}}}
+PAUSED = {'Id': 'bbb', 'Names': ['/b', '/a/b'], 'State': 'paused',
+          'NetworkSettings': {'Networks': 
+                              {'bridge': {'IPAddress': '172.17.0.4'}}}}
+EXITED = {'Id': 'ccc', 'Names': ['/c'], 'State': 'exited',
+          'NetworkSettings': {'Networks': 
+                              {'bridge': {'IPAddress': ''}}}}
+OLD = {'Id': 'abc123', 'Names': ['/d'], 'Status': 'Up 2 minutes'}
+
+#-------------------------------------------------------------------------------
+# refresh_status
+
+def test_refresh_status():
+    client = FakeClient({'d': INSPECT}, [RUNNING, PAUSED, EXITED, OLD])
+    cs = [Container('ubuntu', name=name, status_ttl=60) 
+          for name in 'abcde']
+    a, b, c, d, e = cs
+
+    assert refresh_status([], client=client) == []
+    assert client.calls == []
+
+    assert refresh_status(cs, client=client) == cs
+    assert client.calls == [('containers', dict(all=True, filters=dict(
+                                 name=['a', 'b', 'c', 'd', 'e']))),
+                            ('inspect_container', 'd')]
+
+    assert a.status == ContainerStatus(id='aaa', exists=True, running=True,
+                                       ip_addr='172.17.0.3')
+    assert b.status == ContainerStatus(id='bbb', exists=True, running=True,
+                                       paused=True, ip_addr='172.17.0.4')
+    assert c.status == ContainerStatus(id='ccc', exists=True)
+    assert d.status.id == 'abc123'
+    assert d.status.running is True
+    assert d.status.dict == INSPECT
+    assert e.status == ContainerStatus()
+    assert not e._status.expired(60)
+    
+#-------------------------------------------------------------------------------
+# ContainerGroup
+
+def test_containergroup():
+    client = FakeClient(summaries=[RUNNING])
+    a = Container('ubuntu', name='a')
+    g = ContainerGroup()
+    assert len(g) == 0
+
+    g.add(a)
+    assert list(g) == [a]
+    assert g.refresh(client=client) == [a._status]
+    assert a._status.running is True
+    assert len(client.calls) == 1
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
@@ -0,0 +1,203 @@
+import gc
+import os
+import time
+import shutil
+import weakref
+import tempfile
+import threading
+from nose.tools import assert_raises
+from docker.errors import BuildError, NotFound
+from dockerman import Container, Image, ImageIndex, get_index, \
+    ensure_image, pull_image, run_all
+from dockerman.image import BUILDS, INDEXES, CONTEXT_LABEL, normalize
+from dockerman.context import StatCache
+from dockerman.testing import FakeDaemon
+
+#-------------------------------------------------------------------------------
+# Utilities
+
+def test_normalize():
+    assert normalize('ubuntu') == 'ubuntu:latest'
+    assert normalize('ubuntu:16.04') == 'ubuntu:16.04'
+    assert normalize('localhost:5000/foo') == 'localhost:5000/foo:latest'
+    assert normalize('foo@sha256:abc') == 'foo@sha256:abc'
+
+#-------------------------------------------------------------------------------
+# ImageIndex
+
+def test_imageindex():
+    with FakeDaemon(images=['ubuntu', 'alpine:3.6']) as daemon:
+        client = daemon.client()
+        index = ImageIndex(client, ttl=60)
+        assert 'ubuntu' in index
+        assert 'ubuntu:latest' in index
+        assert 'alpine:3.6' in index
+        assert 'alpine' not in index
+        assert len(index) == 4 # two tags and two ids
+        assert daemon.count('images') == 1
+
+        index.add('alpine')
+        assert 'alpine' in index
+        index.discard('ubuntu')
+        assert 'ubuntu' not in index
+        assert daemon.count('images') == 1
+
+        index.invalidate()
+        assert 'ubuntu' in index
+        assert 'alpine' not in index
+        assert daemon.count('images') == 2
+
+        assert get_index(client) is get_index(client)
+        assert get_index(client) is not index
+
+        # Indexes do not keep their client alive
+        other = daemon.client()
+        assert 'ubuntu' in get_index(other)
+        assert other in INDEXES
+        ref = weakref.ref(other)
+        del other
+        gc.collect()
+        assert ref() is None
+
+#-------------------------------------------------------------------------------
+# Pulls
+
+def test_single_flight():
+    with FakeDaemon(images=[], latency=dict(pull=0.2),
+                    registry=['alpine']) as daemon:
+        client = daemon.client()
+        results = []
+        errors = []
+
+        def pull(ref):
+            try:
+                results.append(pull_image(ref, client))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=pull, args=(ref,))
+                   for ref in ['alpine', 'alpine:latest', 'nope'] * 10]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert daemon.count('pull') == 2
+        assert len(results) == 20
+        assert results[0]['status'] == \
+            'Downloaded newer image for alpine:latest'
+        assert all(res is results[0] for res in results)
+        assert len(errors) == 10
+        assert all(isinstance(e, NotFound) for e in errors)
+
+        # Pulled images are added to the index
+        assert not ensure_image('alpine', client)
+        assert daemon.count('pull') == 2
+
+        assert_raises(NotFound, ensure_image, 'nope', client)
+        assert daemon.count('pull') == 3
+
+def test_create_pulls_once():
+    with FakeDaemon(images=[], latency=dict(pull=0.3)) as daemon:
+        client = daemon.client()
+        cs = [Container('ubuntu:16.04', name='c{}'.format(k), detach=True,
+                        client=client) for k in range(20)]
+        assert run_all(cs, max_workers=20).ok
+        assert daemon.count('pull') == 1
+        assert daemon.count('create') == 40
+        assert 'ubuntu:16.04' in daemon.images
+
+#-------------------------------------------------------------------------------
+# Image
+
+def test_image():
+    with FakeDaemon(images=['ubuntu']) as daemon:
+        client = daemon.client()
+        img = Image('alpine', client=client)
+        assert img.ref == 'alpine:latest'
+        assert img.repository == 'alpine'
+        assert img.tag == 'latest'
+        assert Image('foo@sha256:abc').tag is None
+        assert not img.exists()
+
+        events = []
+        assert img.ensure(progress=lambda ref, event: events.append(event))
+        assert len(events) == 2
+        assert img.exists()
+        assert not img.ensure()
+        assert daemon.count('images') == 1
+        assert img.inspect()['RepoTags'] == ['alpine:latest']
+
+        img.remove()
+        assert not img.exists()
+        assert_raises(NotFound, img.inspect)
+        assert img.pull()['status'].startswith('Downloaded')
+        assert daemon.count('pull') == 2
+        assert img == Image('alpine')
+
+def write(root, path, data):
+    with open(os.path.join(root, path), 'wb') as f:
+        f.write(data)
+    t = time.time() - 10
+    os.utime(os.path.join(root, path), (t, t))
+
+def test_build():
+    root = tempfile.mkdtemp()
+    try:
+        write(root, 'Dockerfile', b'FROM scratch\nCOPY app.py /\n')
+        write(root, '.dockerignore', b'*.log\n')
+        write(root, 'app.py', b'print(1)\n')
+        write(root, 'debug.log', b'x')
+        cache = StatCache()
+
+        with FakeDaemon(images=[]) as daemon:
+            client = daemon.client()
+            img = Image('myapp:1', client=client)
+            events = []
+            assert img.build(root, cache=cache, buildargs=dict(a='1'),
+                             progress=lambda ref, e: events.append(e))
+            assert len(events) == 3
+            build = daemon.builds[-1]
+            assert build['tag'] == 'myapp:1'
+            assert build['files'] == ['.dockerignore', 'Dockerfile', 'app.py']
+            assert build['buildargs'] == dict(a='1')
+            digest = build['labels'][CONTEXT_LABEL]
+            assert img.exists()
+            assert img.inspect()['Config']['Labels'][CONTEXT_LABEL] == digest
+
+            # Unchanged contexts are not rebuilt, nor inspected
+            count = daemon.count('inspect_image')
+            assert not img.build(root, cache=cache, buildargs=dict(a='1'))
+            assert daemon.count('inspect_image') == count
+            write(root, 'other.log', b'x')
+            assert not img.build(root, cache=cache, buildargs=dict(a='1'))
+            assert len(daemon.builds) == 1
+
+            # The image label is used when there is no record of a build
+            BUILDS.clear()
+            assert not img.build(root, cache=cache, buildargs=dict(a='1'))
+            assert daemon.count('inspect_image') == count + 1
+            assert len(daemon.builds) == 1
+
+            assert img.build(root, cache=cache, buildargs=dict(a='2'))
+            write(root, 'app.py', b'print(2)\n')
+            assert img.build(root, cache=cache, buildargs=dict(a='2'))
+            assert img.build(root, cache=cache, buildargs=dict(a='2'),
+                             force=True)
+            assert len(daemon.builds) == 4
+            assert len(set(b['labels'][CONTEXT_LABEL]
+                           for b in daemon.builds)) == 3
+
+            write(root, 'Dockerfile', b'RUN FAIL\n')
+            assert_raises(BuildError, img.build, root, cache=cache)
+            assert_raises(BuildError, Image('other', client=client).build,
+                          root, dockerfile='Missing', cache=cache)
+
+    finally:
+        shutil.rmtree(root)
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
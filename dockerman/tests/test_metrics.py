@@ -0,0 +1,82 @@
+import socket
+from nose.tools import assert_raises
+from docker.errors import NotFound
+from dockerman import Container, metrics
+from dockerman.utils import call, scan_port
+from dockerman.tests import FakeClient, INSPECT
+
+#-------------------------------------------------------------------------------
+# Histogram
+
+def test_histogram():
+    h = metrics.Histogram((0.1, 1.0, float('inf')))
+    for x in (0.05, 0.1, 0.5, 2):
+        h.observe(x)
+    assert h.count == 4
+    assert h.sum == 2.65
+    assert h.cumulative() == [(0.1, 2), (1.0, 3), (float('inf'), 4)]
+
+#-------------------------------------------------------------------------------
+# Instrumentation
+
+def test_instrumentation():
+    client = FakeClient(containers={'c1': INSPECT})
+    c = Container('foo', name='c1')
+    calls = []
+    pre = lambda op: calls.append(('pre', op))
+    post = lambda op, outcome, secs: calls.append(('post', op, outcome))
+
+    metrics.reset()
+    assert metrics.ENABLED is False
+    c.refresh(client=client)
+    assert metrics.snapshot() == {}
+
+    metrics.enable()
+    metrics.add_hook(pre, post)
+    try:
+        c.refresh(client=client)
+        c.pause(client=client)
+        c2 = Container('foo', name='c2')
+        c2.refresh(client=client)
+        assert_raises(NotFound, c2.inspect, client=client)
+        call('true')
+
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(1)
+        assert scan_port('127.0.0.1', sock.getsockname()[1])
+        sock.close()
+    finally:
+        metrics.disable()
+        metrics.remove_hook(pre, post)
+
+    assert metrics.ENABLED is False
+    assert calls[:4] == [('pre', 'inspect_container'),
+                         ('post', 'inspect_container', 'ok'),
+                         ('pre', 'pause'), ('post', 'pause', 'ok')]
+
+    snap = metrics.snapshot()
+    assert snap['inspect_container']['ok']['count'] == 1
+    assert snap['inspect_container']['NotFound']['count'] == 2
+    assert snap['pause']['ok']['count'] == 1
+    assert snap['call']['ok']['count'] == 1
+    assert snap['scan_port']['open']['count'] == 1
+    assert snap['pause']['ok']['buckets'][-1] == [float('inf'), 1]
+
+    text = metrics.prometheus()
+    assert '# TYPE dockerman_operations_total counter' in text
+    assert 'dockerman_operations_total{op="inspect_container",' \
+        'outcome="NotFound"} 2' in text
+    assert 'dockerman_operation_duration_seconds_bucket{le="+Inf",' \
+        'op="pause",outcome="ok"} 1' in text
+    assert 'dockerman_operation_duration_seconds_count{op="call",' \
+        'outcome="ok"} 1' in text
+
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
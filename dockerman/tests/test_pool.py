@@ -0,0 +1,144 @@
+import time
+import threading
+from nose.tools import assert_raises
+from dockerman import Container, container
+from dockerman.pool import ContainerPool, get_pool, close_pools, POOLS, \
+    CREATED, RECYCLE
+from dockerman.tests import FakeClient, INSPECT
+
+#-------------------------------------------------------------------------------
+# Utilities
+
+
+class LockedClient(FakeClient):
+    def __init__(self, *args, **kwargs):
+        super(LockedClient, self).__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+
+    def __getattribute__(self, attr):
+        value = super(LockedClient, self).__getattribute__(attr)
+        if callable(value) and not attr.startswith('_'):
+            lock = super(LockedClient, self).__getattribute__('lock')
+            def locked(*args, **kwargs):
+                with lock:
+                    return value(*args, **kwargs)
+            return locked
+        return value
+
+def ops(client):
+    return [call[0] for call in client.calls]
+
+#-------------------------------------------------------------------------------
+# ContainerPool
+
+def test_containerpool():
+    assert_raises(ValueError, ContainerPool, 'ubuntu', mode='foo')
+    assert_raises(ValueError, ContainerPool, 'ubuntu', policy='foo')
+    assert_raises(ValueError, ContainerPool, 'ubuntu', name='foo')
+
+    client = LockedClient({'*': INSPECT})
+    with ContainerPool('ubuntu', 'sleep 100', size=2, client=client) as pool:
+        assert pool.wait_filled(timeout=5)
+        assert pool.idle == 2
+        assert ops(client).count('pause') == 2
+
+        c = pool.acquire()
+        assert isinstance(c, Container)
+        assert c.detach is True
+        assert ops(client).count('unpause') == 1
+        assert pool.wait_filled(timeout=5)
+        assert ops(client).count('pause') == 3
+
+        pool.release(c)
+        assert ops(client)[-1] == 'remove_container'
+
+    assert ops(client).count('remove_container') == 3
+
+def test_containerpool_recycle():
+    client = LockedClient({'*': INSPECT})
+    pool = ContainerPool('ubuntu', size=1, mode=CREATED, policy=RECYCLE,
+                         client=client)
+    assert pool.wait_filled(timeout=5)
+    assert ops(client).count('create_container') == 1
+
+    c = pool.acquire()
+    assert ops(client)[-1] == 'start'
+    assert pool.wait_filled(timeout=5)
+    assert ops(client).count('create_container') == 2
+
+    pool.size = 2 # Make room without triggering a refill
+    pool.release(c)
+    assert ops(client)[-1] == 'pause'
+    assert pool.idle == 2
+
+    c2 = pool.acquire()
+    assert c2 is not c
+    assert ops(client)[-1] == 'start'
+    assert pool.acquire() is c
+    assert ops(client)[-1] == 'unpause'
+
+    pool.size = 0
+    pool.release(c)
+    assert ops(client)[-1] == 'remove_container'
+
+    pool.close()
+    # Everything but c2 has been removed
+    assert ops(client).count('remove_container') == \
+        ops(client).count('create_container') - 1
+
+def test_containerpool_failure():
+    class PauseFails(LockedClient):
+        def pause(self, *args, **kwargs):
+            raise RuntimeError('pause failed')
+
+    client = PauseFails({'*': INSPECT})
+    pool = ContainerPool('ubuntu', size=1, client=client)
+    try:
+        for _ in range(100):
+            if isinstance(pool.error, RuntimeError):
+                break
+            time.sleep(0.01)
+        assert str(pool.error) == 'pause failed'
+        assert pool.idle == 0
+    finally:
+        pool.close()
+    assert 'remove_container' in ops(client)
+    assert ops(client).count('remove_container') == \
+        ops(client).count('create_container')
+
+def test_container_pool():
+    client = LockedClient({'*': INSPECT})
+    pool = get_pool('ubuntu', 'sleep 10', size=1, client=client)
+    assert get_pool('ubuntu', 'sleep 10', client=client) is pool
+    assert get_pool('ubuntu', 'sleep 20', client=client) is not pool
+
+    # Pools are shared per client
+    other = LockedClient({'*': INSPECT})
+    assert get_pool('ubuntu', 'sleep 10', size=1, client=other) is not pool
+    
+    with container('ubuntu', 'sleep 10', pool=pool) as c:
+        assert c.command == 'sleep 10'
+    assert ops(client)[-1] == 'remove_container'
+
+    with container('ubuntu', 'sleep 10', pool=True, client=other) as c:
+        assert c.command == 'sleep 10'
+    assert ops(other).count('remove_container') == 1
+    assert len(POOLS) == 3
+
+    # The spec must match that of the pool
+    assert pool.matches('ubuntu', 'sleep 10', detach=True, size=3)
+    assert not pool.matches('ubuntu', 'sleep 10', tty=True)
+    assert_raises(ValueError, container('ubuntu', pool=pool).__enter__)
+    assert_raises(ValueError, container('ubuntu', 'sleep 10', tty=True,
+                                        pool=pool).__enter__)
+
+    pools = list(POOLS.values())
+    close_pools()
+    assert not POOLS
+    assert all(p._closed.is_set() for p in pools)
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
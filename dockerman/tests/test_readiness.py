@@ -0,0 +1,206 @@
+import time
+import socket
+import threading
+from nose.tools import assert_raises
+from six.moves.BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from dockerman import Container, metrics
+from dockerman.readiness import Target, ReadinessTimeout, wait_ready, \
+    TCPProbe, HTTPProbe, LogProbe, ExecProbe
+from dockerman.tests import FakeClient, INSPECT
+from dockerman.testing import FakeDaemon
+
+#-------------------------------------------------------------------------------
+# Utilities
+
+def summary(name, state='running'):
+    return {'Id': name, 'Names': ['/' + name], 'State': state,
+            'NetworkSettings': {'Networks': 
+                                {'bridge': {'IPAddress': '127.0.0.1'}}}}
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+def listen_later(port, delay, socks):
+    def target():
+        time.sleep(delay)
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('127.0.0.1', port))
+        sock.listen(5)
+        socks.append(sock)
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+#-------------------------------------------------------------------------------
+# wait_ready
+
+def test_wait_ready():
+    client = FakeClient(summaries=[summary('a'), summary('b')])
+    a = Container('ubuntu', name='a', status_ttl=60)
+    b = Container('ubuntu', name='b', status_ttl=60)
+    ports = [free_port() for k in range(3)]
+
+    # Listeners start in reverse order; waiting on the targets concurrently
+    # sees them become ready in that order, not one after the other
+    socks = []
+    threads = [listen_later(port, 0.1 + 0.2 * (2 - k), socks)
+               for k, port in enumerate(ports)]
+    ready = []
+    targets = wait_ready([(a, ports[0]), (a, ports[1]), (b, ports[2])],
+                         client=client, timeout=5, delay=0.01, max_delay=0.05,
+                         on_ready=ready.append)
+    for thread in threads:
+        thread.join()
+
+    assert all(t.ready for t in targets)
+    assert [t.port for t in ready] == ports[::-1]
+    assert all(t.attempts > 1 for t in targets)
+    # Statuses were refreshed in bulk, once
+    assert [c[0] for c in client.calls] == ['containers']
+
+    for sock in socks:
+        sock.close()
+
+def test_wait_ready_timeout():
+    client = FakeClient(summaries=[summary('a'), summary('b', 'exited')])
+    a = Container('ubuntu', name='a', status_ttl=60)
+    b = Container('ubuntu', name='b', status_ttl=60)
+    port = free_port()
+
+    assert_raises(ReadinessTimeout, wait_ready, [(a, port)], client=client,
+                  timeout=0.2)
+
+    targets = wait_ready([Target(a, port), Target(b, port)], client=client,
+                         timeout=0.2, raise_on_timeout=False)
+    assert not any(t.ready for t in targets)
+    assert targets[0].error is not None
+    assert targets[1].error is None
+    assert len([c for c in client.calls if c[0] == 'containers']) > 2
+
+#-------------------------------------------------------------------------------
+# Probes
+
+LOCAL = dict(INSPECT, NetworkSettings={'IPAddress': '127.0.0.1'})
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200 if self.path == '/health' else 503)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+def test_tcpprobe():
+    client = FakeClient({'a': LOCAL})
+    c = Container('ubuntu', name='a', status_ttl=60)
+    c.refresh(client=client)
+    port = free_port()
+
+    p = TCPProbe(port, interval=0.01, timeout=0.1)
+    assert not p.check(c)
+    assert_raises(ReadinessTimeout, c.poll, p)
+    assert_raises(ReadinessTimeout, c.poll, port, timeout=0.1)
+
+    socks = []
+    listen_later(port, 0, socks).join()
+    assert p.check(c)
+    c.poll(p)
+    c.poll(port, timeout=1)
+    socks[0].close()
+
+def test_httpprobe():
+    client = FakeClient({'a': LOCAL})
+    c = Container('ubuntu', name='a', status_ttl=60)
+    c.refresh(client=client)
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    port = server.server_address[1]
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+
+    try:
+        assert HTTPProbe(port, '/health').check(c)
+        assert not HTTPProbe(port, '/').check(c)
+        assert HTTPProbe(port, '/', status=[503]).check(c)
+        c.poll(HTTPProbe(port, '/health', timeout=1))
+        assert_raises(ReadinessTimeout, c.poll, 
+                      HTTPProbe(port, interval=0.01, timeout=0.05))
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+    assert not HTTPProbe(port, '/health').check(c)
+
+def test_logprobe():
+    with FakeDaemon(logs=[(1, b'starting\nlisten'), (1, b'ing on '),
+                          (1, b'port 80\nmore\n'), (2, b'oops\n')]) as d:
+        # Probes use the container's client
+        c = Container('ubuntu', name='a', detach=True, client=d.client())
+        c.run()
+
+        p = LogProbe(r'listening on port \d+', interval=0.01, timeout=1)
+        c.poll(p)
+        thread, _, stream = p._followers[(c.name, id(c.client))]
+        assert not thread.is_alive()
+        assert stream.closed
+        assert p.check(c)
+
+        p = LogProbe('oops', stderr=False, interval=0.01, timeout=0.1)
+        assert_raises(ReadinessTimeout, c.poll, p)
+        c.poll(LogProbe('oops', stdout=False, interval=0.01, timeout=1))
+
+        # The stream is closed on timeout
+        p = LogProbe('never', interval=0.01, timeout=0.1)
+        assert not p.check(c)
+        thread = p._followers[(c.name, id(c.client))][0]
+        assert_raises(ReadinessTimeout, c.poll, p)
+        assert p._followers == {}
+        assert not thread.is_alive()
+
+        p = LogProbe('^ready$', interval=0.01, timeout=2)
+        timer = threading.Timer(0.1, d.write_log, (c.id, 1, b'ready\n'))
+        timer.start()
+        c.poll(p)
+        timer.join()
+
+def test_execprobe():
+    client = FakeClient({'a': LOCAL})
+    c = Container('ubuntu', name='a', status_ttl=60)
+    c.refresh(client=client)
+
+    p = ExecProbe(['pg_isready'], interval=0.01, timeout=0.05)
+    c.poll(p, client=client)
+    assert client.calls[-1] == ('exec_create', 'a', ['pg_isready'])
+
+    client.exit_code = 1
+    assert_raises(ReadinessTimeout, c.poll, p, client=client)
+    assert ExecProbe('true', exit_code=1).check(c, client=client)
+
+    # Without a client argument, the container's client is used
+    c.client = client
+    assert ExecProbe('true', exit_code=1).check(c)
+    assert client.calls[-1] == ('exec_create', 'a', 'true')
+
+    # Daemon calls are measured
+    metrics.reset()
+    metrics.enable()
+    try:
+        ExecProbe('true').check(c)
+    finally:
+        metrics.disable()
+    snap = metrics.snapshot()
+    metrics.reset()
+    for op in ('exec_create', 'exec_start', 'exec_inspect'):
+        assert snap[op]['ok']['count'] == 1
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
@@ -0,0 +1,126 @@
+from nose.tools import assert_raises
+from dockerman import Container, Reconciler, reconcile, spec_hash
+from dockerman.reconcile import SCOPE_LABEL, SPEC_LABEL
+from dockerman.spec import ContainerTemplate
+from dockerman.testing import FakeDaemon
+
+def specs(n, **kwargs):
+    return [Container('ubuntu', 'sleep 1000', name='c{}'.format(k),
+                      detach=True, environment=dict(K=str(k)), **kwargs)
+            for k in range(n)]
+
+#-------------------------------------------------------------------------------
+# spec_hash
+
+def test_spec_hash():
+    a, b = specs(2)
+    assert spec_hash(a) != spec_hash(b)
+    assert spec_hash(a) == spec_hash(specs(1)[0])
+
+    h = spec_hash(a)
+    a.labels = {SCOPE_LABEL: 'x', SPEC_LABEL: h}
+    assert spec_hash(a) == h
+    a.labels = dict(a='1')
+    assert spec_hash(a) != h
+
+    tmpl = ContainerTemplate('ubuntu', 'sleep 1000', detach=True)
+    spec = tmpl.spec(name='c0', environment=dict(K='0'))
+    assert spec_hash(spec) == h
+    assert spec_hash(spec.evolve(name='c1', environment=dict(K='1'))) == \
+        spec_hash(b)
+
+#-------------------------------------------------------------------------------
+# Reconciler
+
+def test_reconciler():
+    with FakeDaemon() as daemon:
+        client = daemon.client()
+        r = Reconciler('env', client=client)
+
+        res = r.apply(specs(60))
+        assert res.ok
+        assert len(res.plan.create) == 60
+        assert set(res.results.values()) == {'create'}
+        assert daemon.count('list') == 1
+        ids = {c['Name'].lstrip('/'): cid
+               for cid, c in daemon.containers.items()}
+
+        # Unrelated containers are ignored
+        Container('ubuntu', name='other', detach=True, client=client).run()
+
+        # Nothing changed
+        res = r.apply(specs(60))
+        assert res.ok
+        assert res.plan.empty
+        assert len(res.plan.unchanged) == 60
+        assert res.results == {}
+        assert daemon.count('create') == 60 + 1
+        assert daemon.count('list') == 2
+
+        # Change 5, stop 1, drop 2 and add 1
+        cs = specs(59)[:-1] + specs(61)[-1:]
+        for c in cs[10:15]:
+            c.environment = dict(K='changed')
+        client.stop('c20')
+        daemon.requests[:] = []
+
+        plan = r.plan(cs)
+        assert plan.recreate == ['c10', 'c11', 'c12', 'c13', 'c14']
+        assert plan.start == ['c20']
+        assert plan.remove == ['c58', 'c59']
+        assert plan.create == ['c60']
+        assert len(plan.unchanged) == 52
+
+        res = reconcile(cs, 'env', client=client, max_workers=4)
+        assert res.ok
+        assert res.plan == plan
+        assert res.results == plan.changes
+        assert daemon.count('list') == 2
+        assert daemon.count('create') == 6
+        assert daemon.count('start') == 7
+        assert daemon.count('remove') == 7
+
+        names = set(c['Name'].lstrip('/')
+                    for c in daemon.containers.values())
+        assert names == set(c.name for c in cs) | {'other'}
+        for c in daemon.containers.values():
+            name = c['Name'].lstrip('/')
+            if name in ('c0', 'c20', 'c57'):
+                assert ids[name] == c['Id']
+            assert c['State']['Running']
+        assert r.plan(cs).empty
+
+        # Specs are accepted as well
+        tmpl = ContainerTemplate('ubuntu', 'sleep 1000', detach=True)
+        res = r.apply([tmpl.spec(name='c0', environment=dict(K='0')),
+                       tmpl.spec(name='s1')])
+        assert res.ok
+        assert len(res.plan.remove) == 58
+        assert res.plan.unchanged == ['c0']
+        assert res.plan.create == ['s1']
+
+        assert_raises(ValueError, r.plan, specs(1) + specs(1))
+        assert_raises(ValueError, r.plan, [Container('ubuntu', name='x')])
+        assert reconcile([], 'env', client=client).results['s1'] == 'remove'
+        assert r.actual() == {}
+
+        # Inputs are left unchanged
+        cs = specs(2)
+        assert r.apply(cs).ok
+        assert all(c.labels is None for c in cs)
+        assert all(c.refresh(client=client).running for c in cs)
+
+    # Containers with their own client are run through it
+    with FakeDaemon() as d1, FakeDaemon() as d2:
+        c1, c2 = d1.client(), d2.client()
+        cs = specs(2)
+        cs[1].client = c2
+        assert reconcile(cs, 'env', client=c1).ok
+        assert d1.count('create') == 1
+        assert d2.count('create') == 1
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
@@ -0,0 +1,102 @@
+from nose.tools import assert_raises
+from dockerman import Container, apply_all, refresh_status
+from dockerman.scheduler import Host, HostRegistry, Scheduler, \
+    SchedulingError
+from dockerman.testing import FakeDaemon
+from dockerman.tests import FakeClient
+
+#-------------------------------------------------------------------------------
+# Host
+
+def test_host():
+    h = Host('a', client=FakeClient(), max_containers=2, memory='1g',
+             cpu_shares=1024)
+    assert h.memory == 1024 ** 3
+    assert h.fits(memory=1024 ** 3)
+    assert not h.fits(memory=1024 ** 3 + 1)
+    assert h.load() == 0.5
+    assert h.load(cpu_shares=1024) == 1.0
+
+    h.placed['c1'] = (512 * 1024 ** 2, 0)
+    h.placed['c2'] = (0, 0)
+    assert h.reserved_memory == 512 * 1024 ** 2
+    assert not h.fits()
+    assert Host('b', client=FakeClient()).load() == 0
+    assert_raises(TypeError, Host, 'c', client=FakeClient(), foo=1)
+
+    # Hosts without a base_url use the configured settings
+    assert Host('d').client.settings == {}
+    assert Host('e', 'tcp://10.0.0.1:2375').client.settings == \
+        dict(base_url='tcp://10.0.0.1:2375')
+
+    h.client.summaries = [dict(Names=['/c1']), dict(Names=['/other'])]
+    h.sync()
+    assert h.external == 1
+    assert h.count == 3
+
+#-------------------------------------------------------------------------------
+# Scheduler
+
+def test_scheduler():
+    daemons = [FakeDaemon().start() for _ in range(3)]
+    try:
+        hosts = HostRegistry()
+        for i, d in enumerate(daemons):
+            hosts.register('h{}'.format(i), d.base_url, max_containers=4,
+                           memory='1g')
+        assert_raises(ValueError, hosts.register, 'h0', daemons[0].base_url)
+        assert [h.name for h in hosts] == ['h0', 'h1', 'h2']
+
+        sched = Scheduler(hosts)
+        cs = [Container('foo', 'sleep 10', detach=True) for _ in range(6)]
+        apply_all(cs, sched.run).raise_for_errors()
+        assert [h.count for h in hosts] == [2, 2, 2]
+        assert [d.count('create') for d in daemons] == [2, 2, 2]
+
+        for c in cs:
+            host = sched.host_of(c)
+            assert c.client is host.client
+            assert c.refresh().running
+            assert sched.place(c) is host
+
+        refresh_status(cs)
+        assert [d.count('list') for d in daemons] == [1, 1, 1]
+
+        # Memory reservations
+        big = Container('foo', detach=True, mem_limit='768m')
+        assert sched.place(big) is hosts['h0']
+        small = Container('foo', detach=True, mem_limit='512m')
+        assert sched.place(small) is hosts['h1']
+        assert_raises(SchedulingError, sched.place,
+                      Container('foo', mem_limit='2g'))
+
+        # Count limits
+        sched.place(Container('foo'))
+        sched.place(Container('foo'))
+        sched.place(Container('foo'))
+        assert [h.count for h in hosts] == [4, 4, 3]
+        sched.place(Container('foo'))
+        assert_raises(SchedulingError, sched.place, Container('foo'))
+
+        sched.remove(cs[0])
+        assert sched.host_of(cs[0]) is None
+        assert sched.place(Container('foo')) is hosts['h0']
+        assert len(daemons[0].containers) == 1
+
+        # Failed runs are released
+        daemons[2].stop()
+        assert sched.release(cs[5]) is hosts['h2']
+        assert_raises(Exception, sched.run, Container('foo'))
+        assert hosts['h2'].count == 3
+
+        hosts.unregister('h2')
+        assert len(hosts) == 2
+    finally:
+        for d in daemons:
+            d.stop()
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
@@ -0,0 +1,101 @@
+from nose.tools import assert_raises
+from docker.errors import NotFound
+from dockerman import Container, ContainerStatus, refresh_status, RA, CC, HC
+from dockerman.spec import CompactStatus, ContainerTemplate
+from dockerman.tests import FakeClient, INSPECT
+
+#-------------------------------------------------------------------------------
+# CompactStatus
+
+def test_compactstatus():
+    s = CompactStatus()
+    assert not hasattr(s, '__dict__')
+    assert s == ContainerStatus()
+    assert s.expired(60)
+
+    s.update(INSPECT)
+    assert s.running is True
+    assert s.id == 'abc123'
+    assert not s.expired(60)
+    assert s != CompactStatus()
+
+    s.clear()
+    assert s == CompactStatus()
+    assert not s.expired(60)
+
+#-------------------------------------------------------------------------------
+# ContainerSpec
+
+def test_containerspec():
+    kwargs = dict(tty=True, volumes=['/a:/b', '/c'], mem_limit='1g',
+                  environment=dict(A='1'), volumes_from=['foo', 'bar'])
+    t = ContainerTemplate('debian', 'python foo.py', **kwargs)
+    s = t.spec(name='foo', labels=dict(x='y'))
+    c = Container('debian', 'python foo.py', name='foo', labels=dict(x='y'),
+                  **kwargs)
+
+    assert not hasattr(s, '__dict__')
+    assert s.volumes_from == ['foo', 'bar']
+    for group in (RA, CC, HC):
+        assert s.marshal_args(group) == c.marshal_args(group)
+    assert s.marshal_args(RA) is s.marshal_args(RA)
+    assert_raises(ValueError, s.marshal_args, 'foo')
+    assert_raises(AttributeError, getattr, s, 'foo')
+
+    s2 = t.spec()
+    assert s2.name.startswith('default-')
+    assert s2.name != t.spec().name
+    assert s2.labels is None
+    assert s.evolve(tty=False).tty is False
+    assert s.evolve(tty=False).name == 'foo'
+
+    assert_raises(TypeError, t.spec, foo=1)
+    assert t.spec(cpu_shares='2').cpu_shares == 2
+
+    c2 = s.container()
+    assert isinstance(c2, Container)
+    assert c2.marshal_args(CC) == c.marshal_args(CC)
+
+def test_containerspec_status():
+    client = FakeClient({'foo': INSPECT}, [{'Id': 'bbb', 'Names': ['/bar'], 
+                                           'State': 'exited',
+                                           'NetworkSettings':
+                                           {'Networks': {}}}])
+    t = ContainerTemplate('ubuntu', status_ttl=60)
+    foo = t.spec(name='foo')
+    bar = t.spec(name='bar')
+
+    assert foo.refresh(client=client).running is True
+    assert foo.status.ip_addr == '172.17.0.2'
+    assert foo.inspect(client=client) == INSPECT
+    assert foo.container().status.running is True
+
+    refresh_status([foo, bar], client=client)
+    assert foo.status.exists is False
+    assert bar.status.exists is True
+    assert bar.status.id == 'bbb'
+    assert_raises(NotFound, bar.inspect, client=client)
+
+    # Specs use their own client, like Containers
+    other = FakeClient({'foo': INSPECT})
+    t = ContainerTemplate('ubuntu', status_ttl=60, client=other)
+    foo = t.spec(name='foo')
+    assert foo.client is other
+    assert foo.status.running is True
+    assert foo.inspect() == INSPECT
+    assert [c[0] for c in other.calls] == ['inspect_container'] * 2
+    assert foo.evolve(tty=True).client is other
+    assert foo.container().client is other
+    assert t.spec(name='foo', client=client).client is client
+    assert ContainerTemplate('ubuntu').spec().client is None
+
+    foo.client = client
+    assert foo.container().client is client
+    assert foo.marshal_args(CC) == \
+        ContainerTemplate('ubuntu').spec(name='foo').marshal_args(CC)
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
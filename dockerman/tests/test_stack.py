@@ -0,0 +1,151 @@
+import time
+from nose.tools import assert_raises
+from syn.base import Attr
+from syn.five import NUM
+from docker.errors import APIError
+from dockerman import Container, Stack, StackError, FleetError
+from dockerman.readiness import Probe
+from dockerman.testing import FakeDaemon
+
+#-------------------------------------------------------------------------------
+# Utilities
+
+
+class DelayProbe(Probe):
+    '''Ready delay seconds after the first check.'''
+    _attrs = dict(delay = Attr(NUM))
+    _opts = dict(args = ('delay',))
+
+    def check(self, container, **kwargs):
+        starts = self.__dict__.setdefault('_starts', {})
+        start = starts.setdefault(container.name, time.time())
+        return time.time() - start >= self.delay
+
+
+def make_stack(client):
+    stack = Stack()
+    def add(name, depends_on=(), ready=None, **kwargs):
+        return stack.add(Container('ubuntu', name=name, detach=True,
+                                   client=client, **kwargs),
+                         depends_on, ready)
+    add('app', ['db', 'cache'], DelayProbe(0.1, interval=0.01))
+    add('data')
+    add('db', ready=DelayProbe(0.4, interval=0.01),
+        volumes_from=['data:ro', 'external'])
+    add('cache', ready=DelayProbe(0.1, interval=0.01))
+    add('worker', ['queue'])
+    add('queue', ['cache'], DelayProbe(0.1, interval=0.01))
+    return stack
+
+#-------------------------------------------------------------------------------
+# Graph
+
+
+def test_graph():
+    stack = make_stack(None)
+    assert len(stack) == 6
+    assert 'db' in stack
+    assert stack['db'].name == 'db'
+    assert stack.dependencies('db') == {'data'}
+    assert stack.dependencies('app') == {'db', 'cache'}
+    assert stack.waves() == [['data', 'cache'], ['db', 'queue'],
+                             ['app', 'worker']]
+
+    assert_raises(StackError, stack.add, Container('ubuntu', name='db'))
+    stack.add(Container('ubuntu', name='x'), ['nope'])
+    assert_raises(StackError, stack.graph)
+
+    stack = Stack([Container('ubuntu', name='a', volumes_from=['b']),
+                   Container('ubuntu', name='b', volumes_from=['a'])])
+    assert_raises(StackError, stack.waves)
+    assert_raises(StackError, stack.run)
+
+#-------------------------------------------------------------------------------
+# Bring-up and teardown
+
+
+def test_run_remove():
+    with FakeDaemon() as daemon:
+        client = daemon.client()
+        stack = make_stack(client)
+        start = time.time()
+        assert stack.run().ok
+        elapsed = time.time() - start
+
+        # The critical path is data -> db -> app (0.5s)
+        assert elapsed >= 0.5
+        assert all(c.status.running for c in stack)
+
+        # Containers start as soon as their own dependencies are ready,
+        # not once the whole previous wave is
+        probes = stack.ready
+        db_ready = probes['db']._starts['db'] + 0.4
+        app_start = probes['app']._starts['app']
+        queue_start = probes['queue']._starts['queue']
+        assert app_start >= db_ready
+        assert queue_start < db_ready
+
+        names = {c.id: c.name for c in stack}
+        daemon.events[:] = []
+        assert stack.remove().ok
+        order = [names[e['id']] for e in daemon.events
+                 if e['Action'] == 'destroy']
+        for name, deps in stack.graph().items():
+            for dep in deps:
+                assert order.index(dep) > order.index(name)
+        assert not any(c.status.exists for c in stack)
+
+        # Missing containers are skipped
+        assert stack.remove().ok
+
+def test_failures():
+    def fail(**kwargs):
+        raise APIError('boom')
+
+    with FakeDaemon() as daemon:
+        client = daemon.client()
+        stack = make_stack(client)
+        stack['cache'].__dict__['run'] = fail
+        res = stack.run()
+        assert sorted(res.errors) == ['cache']
+        assert sorted(res.cancelled) == ['app', 'queue', 'worker']
+        assert sorted(res.results) == ['data', 'db']
+
+        # Dependencies of a container that fails to stop keep running
+        stack['db'].__dict__['stop'] = fail
+        res = stack.stop()
+        assert sorted(res.errors) == ['db']
+        assert res.cancelled == ['data']
+        assert stack['data'].status.running
+        stack.remove()
+
+        stack = make_stack(client)
+        stack['data'].__dict__['run'] = fail
+        try:
+            stack.run(fail_fast=True)
+            assert False # pragma: no cover
+        except FleetError as e:
+            assert sorted(e.result.errors) == ['data']
+            assert 'db' in e.result.cancelled
+        stack.remove()
+
+def test_readiness_timeout():
+    with FakeDaemon() as daemon:
+        client = daemon.client()
+        stack = Stack()
+        stack.add(Container('ubuntu', name='a', detach=True, client=client),
+                  ready=DelayProbe(10, interval=0.01))
+        stack.add(Container('ubuntu', name='b', detach=True, client=client),
+                  ['a'])
+        res = stack.run(timeout=0.1)
+        assert sorted(res.errors) == ['a']
+        assert res.cancelled == ['b']
+        assert stack.stop().ok
+        assert stack.start(timeout=0.1).cancelled == ['b']
+        stack.remove()
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
@@ -0,0 +1,192 @@
+import time
+import struct
+from datetime import datetime, timedelta
+from nose.tools import assert_raises
+from docker.errors import NotFound, APIError, ContainerError
+from dockerman import Container
+from dockerman.streams import STDOUT, STDERR, demux, split_lines, \
+    timestamp
+from dockerman.testing import FakeDaemon
+
+def frame(stream, data):
+    return struct.pack('>BxxxL', stream, len(data)) + data
+
+#-------------------------------------------------------------------------------
+# Parsing
+
+def test_demux():
+    data = frame(1, b'abc') + frame(2, b'') + frame(2, b'de\nf') + \
+           frame(1, b'x' * 1000)
+    expected = [(1, b'abc'), (2, b''), (2, b'de\nf'), (1, b'x' * 1000)]
+
+    assert list(demux([data])) == expected
+    assert list(demux(data[i:i + 1] for i in range(len(data)))) == expected
+    assert list(demux(data[i:i + 7] for i in range(0, len(data), 7))) \
+        == expected
+
+    # Incomplete trailing frames are dropped
+    assert list(demux([data[:-1]])) == expected[:-1]
+    assert list(demux([])) == []
+
+def test_split_lines():
+    frames = [(1, b'ab'), (2, b'err\npart'), (1, b'c\nd\n\n'), (2, b'ial'),
+              (1, b'end')]
+    assert list(split_lines(frames)) == [(2, b'err\n'), (1, b'abc\n'),
+                                         (1, b'd\n'), (1, b'\n'),
+                                         (1, b'end'), (2, b'partial')]
+
+    assert list(split_lines([(1, b'abcdefg\nhi')], max_line=3)) == \
+        [(1, b'abcdefg\n'), (1, b'hi')]
+    assert list(split_lines([(1, b'abcdefg')], max_line=3)) == \
+        [(1, b'abc'), (1, b'def'), (1, b'g')]
+
+def test_timestamp():
+    assert timestamp(5) == 5
+    assert timestamp(datetime(1970, 1, 1, 0, 1, 0, 500000)) == 60.5
+
+#-------------------------------------------------------------------------------
+# Container.logs
+
+def test_logs():
+    logs = [(1, b'one\ntw'), (2, b'oops\n'), (1, b'o\n')]
+    with FakeDaemon(logs=logs) as daemon:
+        client = daemon.client()
+        c = Container('foo', 'bar', name='c1', detach=True, client=client)
+        c.run()
+
+        assert list(c.logs()) == [(STDOUT, b'one\n'), (STDERR, b'oops\n'),
+                                  (STDOUT, b'two\n')]
+        assert list(c.logs(stderr=False)) == [(STDOUT, b'one\n'),
+                                              (STDOUT, b'two\n')]
+        assert list(c.logs(lines=False)) == logs
+        assert list(c.logs(tail=1)) == [(STDOUT, b'o\n')]
+        assert list(c.logs(since=time.time() + 60)) == []
+        assert list(c.logs(since=datetime.utcnow() - timedelta(60))) \
+            == list(c.logs())
+
+        t = Container('foo', 'bar', name='c2', tty=True, detach=True,
+                      client=client)
+        t.run()
+        # TTY output is not multiplexed, so is all reported as stdout
+        assert b''.join(data for _, data in t.logs(lines=False)) == \
+            b'one\ntwoops\no\n'
+        assert set(stream for stream, _ in t.logs()) == set([STDOUT])
+
+        # A stopped container's followed stream ends
+        c.stop()
+        assert len(list(c.logs(follow=True))) == 3
+
+        assert_raises(NotFound, Container('foo', name='c3',
+                                          client=client).logs)
+
+def test_follow():
+    with FakeDaemon() as daemon:
+        c = Container('foo', 'bar', name='c1', detach=True,
+                      client=daemon.client())
+        c.run()
+
+        stream = c.logs(follow=True)
+        it = iter(stream)
+        daemon.write_log('c1', 1, b'hello\n')
+        assert next(it) == (STDOUT, b'hello\n')
+        daemon.write_log('c1', 2, b'wor')
+        daemon.write_log('c1', 2, b'ld\n')
+        assert next(it) == (STDERR, b'world\n')
+
+        stream.close()
+        assert list(it) == []
+
+        # Output written before a follow starts is included
+        daemon.write_log('c1', 1, b'again\n')
+        with c.logs(follow=True) as stream:
+            it = iter(stream)
+            assert next(it) == (STDOUT, b'hello\n')
+            assert [next(it), next(it)] == [(STDERR, b'world\n'),
+                                            (STDOUT, b'again\n')]
+            c.stop()
+            assert list(it) == []
+
+#-------------------------------------------------------------------------------
+# Container.execute
+
+def test_execute():
+    def execs(name, cmd):
+        if cmd == ['fail']:
+            return 3, [(2, b'failed\n')]
+        return 0, [(1, b'a\nb'), (2, b'warn\n'), (1, b'\n')]
+
+    with FakeDaemon(execs=execs) as daemon:
+        c = Container('foo', 'bar', name='c1', detach=True,
+                      client=daemon.client())
+        assert_raises(APIError, c.execute, 'true')
+        c.run()
+
+        res = c.execute('true')
+        assert res.stdout == b'a\nb\n'
+        assert res.stderr == b'warn\n'
+        assert res.exit_code == 0
+        assert daemon.execs[res.exec_id]['Cmd'] == ['true']
+
+        res = getattr(c, 'exec')(['fail'], stream=True)
+        assert list(res) == [(STDERR, b'failed\n')]
+        assert res.stderr == b''
+        assert res.exit_code == 3
+
+        with c.execute('ls', stream=True, lines=False) as res:
+            assert next(res) == (STDOUT, b'a\nb')
+            assert res.exit_code == 0
+            assert res.stdout == b'\n'
+            assert res.stderr == b'warn\n'
+
+        res = c.execute('ls', stream=True, tty=True)
+        assert list(res) == [(STDOUT, b'a\n'), (STDOUT, b'bwarn\n'),
+                             (STDOUT, b'\n')]
+
+        try:
+            c.execute('fail', check=True)
+        except ContainerError as e:
+            assert e.exit_status == 3
+            assert e.stderr == b'failed\n'
+        else:
+            assert False # pragma: no cover
+
+#-------------------------------------------------------------------------------
+# Container.tail
+
+def test_tail():
+    with FakeDaemon(logs=[(1, b'old\n')]) as daemon:
+        c = Container('foo', 'bar', name='c1', detach=True,
+                      client=daemon.client())
+        c.run()
+
+        with c.tail(3) as tail:
+            assert tail.wait(1, timeout=5)
+            assert tail.lines() == [(STDOUT, b'old\n')]
+
+            for k in range(100):
+                daemon.write_log('c1', 1 + k % 2,
+                                 'line {}\n'.format(k).encode('ascii'))
+            assert tail.wait(101, timeout=5)
+            assert tail.lines() == [(STDERR, b'line 97\n'),
+                                    (STDOUT, b'line 98\n'),
+                                    (STDERR, b'line 99\n')]
+            assert tail.lines(STDOUT) == [(STDOUT, b'line 98\n')]
+            assert tail.text() == 'line 97\nline 98\nline 99\n'
+            assert tail.running
+
+        # Stopping the tail does not wait for more output
+        assert not tail.running
+        assert tail.error is None
+
+        # The tail starts with the last n lines written
+        with c.tail(2) as tail:
+            assert tail.wait(2, timeout=5)
+            assert not tail.wait(3, timeout=0.1)
+            assert tail.lines() == [(STDOUT, b'line 98\n'),
+                                    (STDERR, b'line 99\n')]
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
@@ -0,0 +1,87 @@
+import time
+import socket
+from nose.tools import assert_raises
+from docker.errors import APIError, NotFound
+from dockerman import Container, refresh_status, wait_ready
+from dockerman.testing import FakeDaemon
+
+#-------------------------------------------------------------------------------
+# FakeDaemon
+
+def test_fakedaemon():
+    logs = [(1, b'out\n'), (2, b'err\n')]
+    with FakeDaemon(images=['ubuntu'], logs=logs) as daemon:
+        client = daemon.client()
+        assert client.ping()
+
+        c = Container('ubuntu', 'sleep 10', detach=True, labels=dict(a='b'))
+        assert c.run(client=client) == c.id
+        assert c.refresh(client=client).running
+        assert c.status.ip_addr == '127.0.0.1'
+        assert_raises(APIError, c.create, client=client)
+
+        c.pause(client=client)
+        assert c.refresh(client=client).paused
+        c.unpause(client=client)
+
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(5)
+        port = sock.getsockname()[1]
+        try:
+            c.poll(port, client=client, timeout=2)
+            wait_ready([(c, port)], timeout=2, client=client)
+        finally:
+            sock.close()
+
+        assert client.logs(c.name) == b'out\nerr\n'
+        assert client.logs(c.name, stderr=False) == b'out\n'
+        stream = client.logs(c.name, stream=True, follow=True)
+        assert [next(stream), next(stream)] == [b'out\n', b'err\n']
+        daemon.write_log(c.name, 1, b'more\n')
+        assert next(stream) == b'more\n'
+        assert client.logs(c.name, tail=1) == b'more\n'
+
+        assert len(client.containers(filters=dict(label='a=b'))) == 1
+        assert len(client.containers(filters=dict(label='a=c'))) == 0
+        c2 = Container('alpine', 'true')
+        c2.run(client=client)
+        assert 'alpine:latest' in daemon.images
+        assert daemon.count('pull') == 1
+        assert len(client.containers()) == 1
+        assert len(client.containers(all=True)) == 2
+
+        refresh_status([c, c2], client=client)
+        assert c.status.running
+        assert c2.status.exists and not c2.status.running
+
+        events = client.events(since=0, until=time.time(), decode=True,
+                               filters=dict(type='container'))
+        assert [e['Action'] for e in events if e['id'] == c.id] == \
+            ['create', 'start', 'pause', 'unpause']
+
+        c.remove(client=client)
+        assert not c.refresh(client=client).exists
+        assert_raises(NotFound, client.inspect_container, c.name)
+
+    assert daemon.path is None
+
+def test_latency():
+    with FakeDaemon(latency={'inspect': 0.2}) as daemon:
+        client = daemon.client()
+        c = Container('ubuntu', 'sleep 10', detach=True)
+
+        # Only the given endpoint is delayed
+        start = time.time()
+        c.create(client=client)
+        assert time.time() - start < 0.2
+
+        start = time.time()
+        c.refresh(client=client)
+        assert time.time() - start >= 0.2
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
@@ -0,0 +1,97 @@
+import os
+import json
+import socket
+import tempfile
+from nose.tools import assert_raises
+from dockerman import Container, ExecProbe, run_all, wait_ready, tracing
+from dockerman.tracing import Tracer
+from dockerman.tests import FakeClient, INSPECT
+
+#-------------------------------------------------------------------------------
+# Tracer
+
+def test_tracer():
+    client = FakeClient(containers={'*': dict(INSPECT, NetworkSettings=dict(
+        IPAddress='127.0.0.1'))})
+    c = Container('foo', name='c1', detach=True)
+
+    assert tracing.TRACER is None
+    with Tracer() as tracer:
+        assert tracing.TRACER is tracer
+        assert_raises(RuntimeError, Tracer().start)
+
+        c.run(client=client)
+        c.poll(ExecProbe('true'), client=client)
+        run_all([Container('foo', name='c{}'.format(i), detach=True)
+                 for i in range(2, 4)], client=client)
+
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(1)
+        try:
+            wait_ready([(c, sock.getsockname()[1])], client=client)
+        finally:
+            sock.close()
+
+    assert tracing.TRACER is None
+    c.run(client=client)
+    assert len(tracer.spans('run')) == 3
+
+    run = tracer.spans('run')[0]
+    assert run['cat'] == 'container'
+    assert run['args'] == dict(container='c1')
+    for name in ('create', 'marshal', 'create_container', 'start'):
+        s = [s for s in tracer.spans(name) if s['args']['container'] == 'c1'][0]
+        assert s['tid'] == run['tid']
+        assert run['ts'] <= s['ts']
+        assert s['ts'] + s['dur'] <= run['ts'] + run['dur']
+
+    op = tracer.spans('create_container')[0]
+    assert op['cat'] == 'op'
+    assert op['args'] == dict(container='c1', outcome='ok')
+
+    check = tracer.spans('check', 'probe')[0]
+    assert check['args'] == dict(container='c1', probe='ExecProbe',
+                                 attempt=1)
+
+    connect = tracer.spans('connect', 'probe')[0]
+    assert connect['args']['outcome'] == 'ready'
+    assert connect['tid'] in tracer.tracks.values()
+
+    fleet = tracer.spans(cat='fleet')
+    assert fleet[0]['args'] == dict(op='run', containers=2)
+
+    chrome = tracer.to_chrome()
+    names = [e['args']['name'] for e in chrome['traceEvents']
+             if e['ph'] == 'M' and e['name'] == 'thread_name']
+    assert 'c1:{}'.format(connect['args']['port']) in names
+    assert len([e for e in chrome['traceEvents'] if e['ph'] == 'X']) == \
+        len(tracer.events)
+
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        tracer.dump(path)
+        with open(path) as f:
+            assert json.load(f) == json.loads(json.dumps(chrome))
+    finally:
+        os.remove(path)
+
+def test_span_errors():
+    assert tracing.span('foo') is tracing.NULL_SPAN
+    with Tracer() as tracer:
+        try:
+            with tracing.span('outer', container='c1'):
+                with tracing.span('inner'):
+                    raise ValueError()
+        except ValueError:
+            pass
+
+    inner = tracer.spans('inner')[0]
+    assert inner['args'] == dict(container='c1', error='ValueError')
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
@@ -0,0 +1,107 @@
+import threading
+from dockerman import Container
+from dockerman.tracker import StatusTracker, is_exited
+from dockerman.tests import FakeClient, INSPECT
+
+#-------------------------------------------------------------------------------
+# Events
+
+def event(action, name):
+    return {'Type': 'container', 'Action': action, 'status': action,
+            'Actor': {'ID': 'abc123', 'Attributes': {'name': name}}}
+
+#-------------------------------------------------------------------------------
+# StatusTracker
+
+def test_statustracker_handle():
+    client = FakeClient({'foo': INSPECT})
+    c = Container('ubuntu', name='foo')
+    other = Container('ubuntu', name='bar')
+    t = StatusTracker([c], client=client)
+    assert c in t
+    assert other not in t
+
+    called = []
+    t.on(c, is_exited, called.append)
+
+    t.handle(event('create', 'foo'))
+    assert c._status.exists is True
+    assert c._status.running is False
+    assert called == [c]
+
+    t.handle(event('start', 'foo'))
+    assert c._status.running is True
+    assert c._status.ip_addr == '172.17.0.2'
+    assert t.wait_running(c, timeout=0)
+
+    t.on(c, is_exited, called.append)
+    t.handle(event('pause', 'foo'))
+    assert c._status.paused is True
+    assert not t.wait_running(c, timeout=0.01)
+
+    t.handle(event('unpause', 'foo'))
+    t.handle(event('die', 'foo'))
+    assert c._status.running is False
+    assert t.wait_exited(c, timeout=0)
+    assert called == [c, c]
+
+    t.handle(event('destroy', 'foo'))
+    assert c._status.exists is False
+    assert t.wait_removed(c, timeout=0)
+
+    t.handle(event('start', 'bar'))
+    assert other._status.exists is False
+
+    # Containers are inspected without holding the lock
+    free = []
+    def try_lock():
+        if t._cond.acquire(False):
+            t._cond.release()
+            free.append(True)
+        else:
+            free.append(False) # pragma: no cover
+
+    inspect = client.inspect_container
+    def inspect_container(name):
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+        return inspect(name)
+
+    client.inspect_container = inspect_container
+    t.handle(event('restart', 'foo'))
+    assert free == [True]
+    assert c._status.running is True
+
+def test_statustracker_thread():
+    summary = {'Id': 'abc123', 'Names': ['/foo'], 'State': 'running',
+               'NetworkSettings': {'Networks': {}}}
+    client = FakeClient({'foo': INSPECT}, [summary], [event('die', 'foo')])
+    c = Container('ubuntu', name='foo', status_ttl=0)
+    t = StatusTracker(client=client, interval=0.01)
+    t.register(c)
+
+    with t:
+        assert t.running
+        assert c._status.tracked
+        assert t.wait_exited(c, timeout=5)
+        assert c.status.running is False
+        assert not [call for call in client.calls 
+                    if call[0] == 'inspect_container']
+
+        t.unregister(c)
+        assert c not in t
+        assert not c._status.tracked
+        t.register(c)
+        assert c._status.tracked
+        assert c._status.running is True
+
+    assert not t.running
+    assert not c._status.tracked
+    assert t.error is None
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__': # pragma: no cover
+    from syn.base_utils import run_all_tests
+    run_all_tests(globals(), verbose=True, print_errors=False)
@@ -1,3 +1,5 @@
+import socket
+from nose.tools import assert_raises
 import dockerman.utils as du
 
 #-------------------------------------------------------------------------------
@@ -22,6 +24,33 @@ def test_dictify_strings():
     assert du.dictify_strings(['a = b', 'c = d'], sep='=', empty=False) == \
         dict(a='b', c='d')
 
+#-------------------------------------------------------------------------------
+# Network utilities
+
+def test_scan_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    assert not du.scan_port('127.0.0.1', port)
+    assert du.port_state('127.0.0.1', port) == 'unreachable'
+
+    sock.listen(1)
+    assert du.scan_port('127.0.0.1', port)
+    assert du.port_state('127.0.0.1', port) == 'open'
+    sock.close()
+
+    # Failures other than a refused connection are raised by scan_port()
+    def connect(sock, address):
+        raise socket.timeout('timed out')
+
+    orig = socket.socket.connect
+    socket.socket.connect = connect
+    try:
+        assert_raises(socket.timeout, du.scan_port, '127.0.0.1', port)
+        assert du.port_state('127.0.0.1', port) == 'timeout'
+    finally:
+        socket.socket.connect = orig
+
 #-------------------------------------------------------------------------------
 
 if __name__ == '__main__': # pragma: no cover
@@ -0,0 +1,230 @@
+'''Span tracing of container operations.
+
+While a Tracer is active, Container operations (marshal, create, start,
+inspect, poll, ...), the daemon calls they make and each probe attempt are
+recorded as nested spans, labelled with the container name.  Traces export
+to the Chrome trace-event format, which can be opened in chrome://tracing
+or Perfetto.  Usage::
+
+    with Tracer() as tracer:
+        run_all(containers)
+    tracer.dump('trace.json')
+
+Daemon calls are picked up through the metrics hooks.  When no tracer is
+active, traced calls cost a single check.
+'''
+import os
+import json
+import time
+import threading
+from functools import wraps
+
+from . import metrics
+
+#-------------------------------------------------------------------------------
+# Active tracer
+
+TRACER = None
+
+def span(name, cat='container', **args):
+    '''Context manager recording a span on the active tracer, if any.'''
+    if TRACER is None:
+        return NULL_SPAN
+    return TRACER.span(name, cat, **args)
+
+def record(name, start, end, cat='container', **args):
+    '''Record a completed span on the active tracer, if any.'''
+    if TRACER is not None:
+        TRACER.record(name, start, end, cat, **args)
+
+def traced(name):
+    '''Decorator for Container methods, recording each call as a span
+    labelled with the container name.
+    '''
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if TRACER is None:
+                return func(self, *args, **kwargs)
+            with TRACER.span(name, 'container', container=self.name):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+#-------------------------------------------------------------------------------
+# Spans
+
+
+class NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+NULL_SPAN = NullSpan()
+
+
+class Span(object):
+    __slots__ = ('tracer', 'name', 'cat', 'args', 'start')
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.tracer._push(self)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.time()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer._pop(self, end)
+
+#-------------------------------------------------------------------------------
+# Tracer
+
+
+class Tracer(object):
+    '''Collects spans from all threads while active (see start() and
+    stop(), or use as a context manager).
+
+    Spans are nested per thread; a span without a container label inherits
+    that of its parent.  Span categories are 'container' (Container
+    operations), 'op' (daemon calls and other metrics operations), 'probe'
+    (readiness probe attempts) and 'fleet' (parallel operations).  Spans
+    recorded with a ``track`` argument (e.g. the attempts of a multiplexed
+    readiness wait) are shown on a separate timeline row per track.
+    '''
+    def __init__(self):
+        self.pid = os.getpid()
+        self.epoch = time.time()
+        self.events = []
+        self.threads = {}
+        self.tracks = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        global TRACER
+        if TRACER is not None and TRACER is not self:
+            raise RuntimeError('Another tracer is already active')
+        TRACER = self
+        metrics.add_hook(self._pre, self._post)
+        return self
+
+    def stop(self):
+        global TRACER
+        metrics.remove_hook(self._pre, self._post)
+        if TRACER is self:
+            TRACER = None
+
+    # Recording
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _tid(self):
+        thread = threading.current_thread()
+        tid = thread.ident
+        if tid not in self.threads:
+            with self._lock:
+                self.threads[tid] = thread.name
+        return tid
+
+    def span(self, name, cat='container', **args):
+        return Span(self, name, cat, args)
+
+    def _push(self, span):
+        stack = self._stack()
+        if stack and 'container' not in span.args and \
+           'container' in stack[-1].args:
+            span.args['container'] = stack[-1].args['container']
+        stack.append(span)
+
+    def _pop(self, span, end):
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        self._add(span.name, span.cat, span.start, end, span.args,
+                  self._tid())
+
+    def record(self, name, start, end, cat='container', **args):
+        track = args.pop('track', None)
+        if track is None:
+            tid = self._tid()
+        else:
+            with self._lock:
+                if track not in self.tracks:
+                    self.tracks[track] = -(len(self.tracks) + 1)
+                tid = self.tracks[track]
+        self._add(name, cat, start, end, args, tid)
+
+    def _add(self, name, cat, start, end, args, tid):
+        event = dict(name=name, cat=cat, ph='X', pid=self.pid, tid=tid,
+                     ts=(start - self.epoch) * 1e6,
+                     dur=(end - start) * 1e6, args=args)
+        with self._lock:
+            self.events.append(event)
+
+    # Metrics hooks
+
+    def _pre(self, op):
+        self.span(op, 'op').__enter__()
+
+    def _post(self, op, outcome, seconds):
+        stack = self._stack()
+        if stack and stack[-1].name == op:
+            span = stack[-1]
+            span.args['outcome'] = outcome
+            span.__exit__(None, None, None)
+
+    # Export
+
+    def spans(self, name=None, cat=None):
+        '''Return the recorded span events, optionally only those with the
+        given name and/or category.
+        '''
+        with self._lock:
+            return [e for e in self.events
+                    if (name is None or e['name'] == name)
+                    and (cat is None or e['cat'] == cat)]
+
+    def to_chrome(self):
+        '''Return the trace as a Chrome trace-event format dict.'''
+        with self._lock:
+            events = sorted(self.events, key=lambda e: e['ts'])
+            names = list(self.threads.items())
+            names += [(tid, track) for track, tid in self.tracks.items()]
+
+        meta = [dict(name='thread_name', ph='M', pid=self.pid, tid=tid,
+                     args=dict(name=name)) for tid, name in names]
+        meta.append(dict(name='process_name', ph='M', pid=self.pid, tid=0,
+                         args=dict(name='dockerman')))
+        return dict(traceEvents=meta + events, displayTimeUnit='ms')
+
+    def dump(self, path):
+        '''Write the trace to path in the Chrome trace-event format.'''
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome(), f)
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('Tracer', 'span', 'record', 'traced')
+
+#-------------------------------------------------------------------------------
@@ -0,0 +1,234 @@
+'''Event-driven container status tracking.
+'''
+import time
+import threading
+
+from .base import get_client
+from .group import refresh_status
+from .metrics import measure
+
+#-------------------------------------------------------------------------------
+# Predicates
+
+def is_running(status):
+    return status.running and not status.paused
+
+def is_exited(status):
+    return status.exists and not status.running
+
+def is_removed(status):
+    return not status.exists
+
+#-------------------------------------------------------------------------------
+# StatusTracker
+
+
+class StatusTracker(object):
+    '''Keeps the status of registered containers current by consuming the
+    daemon's event stream in a background thread.
+
+    The stream is read in windows of ``interval`` seconds so that the thread
+    can notice stop() without having to interrupt a blocking read.
+    '''
+    def __init__(self, containers=(), **kwargs):
+        self.client = get_client(kwargs.get('client'))
+        self.interval = kwargs.get('interval', 1)
+        self.error = None
+
+        self._by_name = {}
+        self._callbacks = []
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        for c in containers:
+            self.register(c)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __contains__(self, container):
+        return self._by_name.get(container.name) is container
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def register(self, container):
+        with self._cond:
+            self._by_name[container.name] = container
+        if self.running:
+            refresh_status([container], client=self.client)
+            container._status.tracked = True
+
+    def unregister(self, container):
+        with self._cond:
+            if self._by_name.get(container.name) is container:
+                del self._by_name[container.name]
+            self._callbacks = [cb for cb in self._callbacks
+                               if cb[0] is not container]
+        container._status.tracked = False
+        container._status.invalidate()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopped.clear()
+        since = self._sync()
+        self._thread = threading.Thread(target=self._consume, args=(since,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._set_tracked(False)
+
+    #-----------------------------------------------------------
+
+    def _set_tracked(self, tracked):
+        with self._cond:
+            for c in self._by_name.values():
+                c._status.tracked = tracked
+                if not tracked:
+                    c._status.invalidate()
+
+    def _sync(self):
+        since = int(time.time())
+        with self._cond:
+            containers = list(self._by_name.values())
+        refresh_status(containers, client=self.client)
+        self._set_tracked(True)
+        return since
+
+    def _consume(self, since):
+        while not self._stopped.is_set():
+            until = int(time.time()) + self.interval
+            try:
+                events = self.client.events(since=since, until=until,
+                                            decode=True,
+                                            filters=dict(type='container'))
+                for event in events:
+                    self.handle(event)
+                since = until
+                self.error = None
+
+            except Exception as e:
+                self.error = e
+                self._set_tracked(False)
+                if self._stopped.wait(self.interval):
+                    break
+                try:
+                    since = self._sync()
+                except Exception as e:
+                    self.error = e
+
+    def handle(self, event):
+        '''Apply a single decoded container event.'''
+        action = event.get('Action', event.get('status', ''))
+        actor = event.get('Actor', {})
+        name = actor.get('Attributes', {}).get('name')
+        cid = actor.get('ID', event.get('id'))
+
+        with self._cond:
+            c = self._by_name.get(name)
+        if c is None:
+            return
+
+        if action in ('start', 'restart'):
+            # Inspected without holding the lock, so that waiters and the
+            # events of other containers are not held up by the daemon
+            from docker.errors import NotFound
+            try:
+                info = measure('inspect_container',
+                               self.client.inspect_container, name)
+            except NotFound:
+                info = None
+
+        with self._cond:
+            if self._by_name.get(name) is not c:
+                return
+            status = c._status
+
+            if action == 'create':
+                status.exists = True
+                status.id = cid
+            elif action in ('start', 'restart'):
+                if info is None:
+                    status.clear()
+                else:
+                    status.update(info)
+            elif action == 'die':
+                status.running = False
+                status.paused = False
+                status.ip_addr = ''
+            elif action == 'pause':
+                status.paused = True
+            elif action == 'unpause':
+                status.paused = False
+            elif action == 'destroy':
+                status.clear()
+            else:
+                return
+
+            status.timestamp = time.time()
+            self._cond.notify_all()
+            self._fire(c)
+
+    def _fire(self, container):
+        remaining = []
+        for cb in self._callbacks:
+            c, predicate, callback = cb
+            if c is container and predicate(c._status):
+                callback(c)
+            else:
+                remaining.append(cb)
+        self._callbacks = remaining
+
+    #-----------------------------------------------------------
+
+    def on(self, container, predicate, callback):
+        '''Call callback(container) once, as soon as predicate(status) holds.
+        '''
+        with self._cond:
+            if predicate(container._status):
+                callback(container)
+            else:
+                self._callbacks.append((container, predicate, callback))
+
+    def wait(self, container, predicate, timeout=None):
+        '''Block until predicate(status) holds.  Returns False on timeout.
+        '''
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while not predicate(container._status):
+                if deadline is None:
+                    self._cond.wait(self.interval)
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def wait_running(self, container, timeout=None):
+        return self.wait(container, is_running, timeout)
+
+    def wait_exited(self, container, timeout=None):
+        return self.wait(container, is_exited, timeout)
+
+    def wait_removed(self, container, timeout=None):
+        return self.wait(container, is_removed, timeout)
+
+#-------------------------------------------------------------------------------
+# __all__
+
+__all__ = ('StatusTracker', 'is_running', 'is_exited', 'is_removed')
+
+#-------------------------------------------------------------------------------
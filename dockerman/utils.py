@@ -1,10 +1,11 @@
+import errno
 import shlex
 import socket
 from subprocess import Popen, PIPE
 from syn.five import STR
 
-from docker.errors import NotFound
-from .base import CLIENT
+from .base import get_client
+from .metrics import instrument, measure
 
 #-------------------------------------------------------------------------------
 # Argument processors
@@ -35,6 +36,7 @@ def dictify_strings(obj=None, empty=True, sep=None):
 #-------------------------------------------------------------------------------
 # Process utilities
 
+@instrument('call')
 def call(s):
     proc = Popen(shlex.split(s), stdout=PIPE, stderr=PIPE)
     (out, err) = proc.communicate()
@@ -43,15 +45,48 @@ def call(s):
 #-------------------------------------------------------------------------------
 # Network utilities
 
-def scan_port(addr, port):
+# Connect errors that mean "not (yet) reachable" rather than a local fault
+UNREACHABLE = frozenset([errno.ECONNREFUSED, errno.ECONNRESET, 
+                         errno.ECONNABORTED, errno.EHOSTUNREACH, 
+                         errno.ENETUNREACH, errno.EHOSTDOWN, errno.ETIMEDOUT])
+
+def _connect(addr, port, timeout):
     sock = socket.socket()
     try:
-        sock.settimeout(1)
+        sock.settimeout(timeout)
         sock.connect((addr, port))
+    finally:
         sock.close()
+
+@instrument('scan_port', classify=lambda outcome: outcome)
+def port_state(addr, port, timeout=1):
+    '''Return 'open' if port accepts connections, 'timeout' if connecting
+    times out, or 'unreachable' for the connect errors in UNREACHABLE.
+    Other socket errors are raised.
+    '''
+    try:
+        _connect(addr, port, timeout)
+        return 'open'
+    except socket.timeout:
+        return 'timeout'
+    except socket.error as e:
+        if e.errno in UNREACHABLE:
+            return 'unreachable'
+        else:
+            raise e
+
+@instrument('scan_port',
+            classify=lambda live: 'open' if live else 'unreachable')
+def scan_port(addr, port, timeout=1):
+    '''Return True if port accepts connections, or False if the connection
+    is refused.  Any other failure (e.g. a timeout) raises socket.error;
+    see port_state() for a classification of all of them.
+    '''
+    try:
+        _connect(addr, port, timeout)
         return True
     except socket.error as e:
-        if e.errno == 111:  # Connection refused
+        if e.errno == errno.ECONNREFUSED:
             return False
         else:
             raise e
@@ -59,9 +94,12 @@ def scan_port(addr, port):
 #-------------------------------------------------------------------------------
 # Docker utilities
 
-def container_exists(name, client=CLIENT):
+def container_exists(name, client=None):
+    from docker.errors import NotFound
+
+    client = get_client(client)
     try:
-        client.inspect_container(name)
+        measure('inspect_container', client.inspect_container, name)
         return True
     except NotFound:
         return False
@@ -71,7 +109,7 @@ def container_exists(name, client=CLIENT):
 
 __all__ = ('join', 'split', 'dictify_strings', 
            'call', 
-           'scan_port',
+           'scan_port', 'port_state', 'UNREACHABLE',
            'container_exists')
 
 #-------------------------------------------------------------------------------
@@ -1,4 +1,9 @@
+import sys
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
+
+# Modules using Python 3 only syntax, left out of Python 2 builds
+PY3_MODULES = ['aio']
 
 def read(fpath):
     with open(fpath, 'r') as f:
@@ -10,6 +15,14 @@ def requirements(fpath):
 def version(fpath):
     return read(fpath).strip()
 
+class BuildPy(build_py):
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info[0] < 3:
+            modules = [m for m in modules if not (m[0] == 'dockerman' and
+                                                  m[1] in PY3_MODULES)]
+        return modules
+
 setup(
     name = 'dockerman',
     version = version('version.txt'),
@@ -19,6 +32,7 @@ setup(
     long_description = read('README.rst'),
     url = 'https://github.com/mbodenhamer/dockerman',
     packages = find_packages(),
+    cmdclass = dict(build_py=BuildPy),
     install_requires = requirements('requirements.in'),
     entry_points = {
         'console_scripts': [